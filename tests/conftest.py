@@ -0,0 +1,5 @@
+"""测试直接导入仓库根目录下的模块（与 python 批量运行.py 等脚本的运行方式相同）"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
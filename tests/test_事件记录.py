@@ -0,0 +1,45 @@
+"""事件记录与模拟结果一致：出生减去死亡恰好是最后一帧的个体，记录不改变模拟本身"""
+import numpy as np
+import pytest
+
+from 批量运行 import make_environment, run
+from 事件记录 import BIRTH, DEATH, EATEN, GRAZE, HUNT, EventLog
+from 统计 import SPECIES
+from test_确定性 import snapshot
+
+
+def recorded_run(engine, directory, ticks=100):
+    env = make_environment(engine, 1100, 600, seed=4)
+    env.add_individuals(n_predators=10, n_prey=50, n_plants=200, n_obstacles=10)
+    if directory is not None:
+        env.enable_recording(directory, frame_every=ticks - 1)  # 最后一帧（tick-1）也写位置
+    run(env, ticks, stop_on_extinction=False)
+    if directory is not None:
+        env.disable_recording()
+    return env
+
+
+@pytest.mark.parametrize("engine", ["objects", "arrays"])
+def test_births_minus_deaths_give_last_frame(engine, tmp_path):
+    directory = str(tmp_path / "log")
+    env = recorded_run(engine, directory)
+    log = EventLog(directory)
+    born, died = log.events(kind=BIRTH), log.events(kind=DEATH)
+    assert np.unique(died["subject"]).size == died.size  # 每个个体至多死一次
+    frame = log.frame(env.tick - 1)
+    for code, name in enumerate(SPECIES):
+        alive = np.setdiff1d(born["subject"][born["species"] == code], died["subject"])
+        ids = getattr(frame, name).id
+        assert len(ids) == len(getattr(env, name))
+        assert np.array_equal(np.sort(ids), alive), name
+    hunts = log.events(kind=HUNT)
+    eaten_prey = died[(died["species"] == SPECIES.index("prey")) & (died["cause"] == EATEN)]
+    assert hunts.size > 0 and np.array_equal(np.sort(hunts["other"]), np.sort(eaten_prey["subject"]))
+    assert log.events(kind=GRAZE).size > 0
+
+
+def test_recording_does_not_change_array_run(tmp_path):
+    expected = snapshot(recorded_run("arrays", None))
+    actual = snapshot(recorded_run("arrays", str(tmp_path / "log")))
+    for key in expected:
+        assert np.array_equal(expected[key], actual[key], equal_nan=True), key
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from 分块并行 import TiledWorld, min_tile_side, to_rows
+from 基因与状态 import ENERGY_PARAMS
+from 数组引擎 import SpeciesArrays
+
+
+def border_world(workers=0):
+    """400x400、2x2分块：捕食者紧贴x=200的分块边界左侧，猎物在右侧，所有接触都跨块"""
+    world = TiledWorld(400, 400, tiles=(2, 2), workers=workers, seed=3)
+    world.add_individuals(n_predators=60, n_prey=60, n_plants=0, n_obstacles=0)
+    rng = np.random.default_rng(0)
+    for name, x0 in (("predators", 199.0), ("prey", 200.05)):
+        species = getattr(world, name)
+        rows = to_rows(species)
+        rows[:, 0] = x0 + rng.uniform(0, 0.9, len(rows))
+        rows[:, 1] = rng.uniform(150, 250, len(rows))  # 也跨过y=200的边界
+        world._distribute(name, rows)
+    world._cache = {}
+    return world
+
+
+def test_border_contacts_conserve_prey_and_energy(monkeypatch):
+    monkeypatch.setitem(ENERGY_PARAMS, "reproduce_energy", 1e9)  # 不繁殖，数量只因捕食变化
+    world = border_world()
+    try:
+        total_kills = 0
+        for _ in range(3):
+            n_predators, n_prey = len(world.predators), len(world.prey)
+            energy = world.predators.energy.sum()
+            world.update()
+            kills = world.contacts["kills"]
+            total_kills += kills
+            assert len(world.prey) == n_prey - kills  # 每只被吃的猎物恰好移除一次
+            assert len(world.predators) == n_predators
+            expected = energy + kills * ENERGY_PARAMS["hunt_gain"] - n_predators * ENERGY_PARAMS["metabolism"]
+            assert world.predators.energy.sum() == pytest.approx(expected)
+        assert total_kills > 0
+    finally:
+        world.close()
+
+
+def test_result_does_not_depend_on_worker_count():
+    results = []
+    for workers in (0, 2):
+        world = border_world(workers)
+        try:
+            for _ in range(5):
+                world.update()
+            results.append([getattr(world, name).energy.copy() for name in ("predators", "prey")])
+        finally:
+            world.close()
+    for a, b in zip(*results):
+        assert np.array_equal(a, b)
+
+
+def test_tiles_merge_instead_of_failing():
+    world = TiledWorld(400, 400, tiles=(8, 8), workers=0, seed=1)
+    world.add_individuals(n_predators=10, n_prey=50, n_plants=70, n_obstacles=3)
+    try:
+        assert not world.grid.fits(min_tile_side(world.drift, world.sight))
+        total = sum(len(getattr(world, name)) for name in ("predators", "prey", "plants"))
+        with pytest.warns(RuntimeWarning, match="合并"):
+            world.update()
+        assert world.grid.fits(min_tile_side(world.drift, world.sight))
+        assert 1 <= world.grid.nx < 8 and world.grid.nx == world.grid.ny
+        assert total > 0 and len(world.prey) > 0
+    finally:
+        world.close()
+
+
+def test_batch_run_releases_tiles_when_interrupted(monkeypatch, tmp_path):
+    import 批量运行
+
+    worlds = []
+
+    def interrupted(env, max_ticks, stop_on_extinction=True):
+        worlds.append(env)
+        env.update()
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(批量运行, "run", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        批量运行.main(["--engine", "tiled", "--tiles", "2x2", "--workers", "0", "--width", "400",
+                   "--height", "400", "--ticks", "5", "--output", str(tmp_path / "stats.json")])
+    world, = worlds
+    assert world._shm == {} and world._pool is None  # 共享内存和进程池都已释放
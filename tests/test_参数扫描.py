@@ -0,0 +1,19 @@
+import pytest
+
+from 参数扫描 import check_configs, run_one
+
+
+def test_ensemble_rejects_other_engines():
+    check_configs([{"engine": "arrays"}], ensemble=True)
+    for engine in ("objects", "tiled"):
+        with pytest.raises(ValueError):
+            check_configs([{"engine": engine}], ensemble=True)
+    with pytest.raises(ValueError):
+        check_configs([{"engine": "gpu"}])
+
+
+def test_tiled_job_runs_in_process():
+    config = {"engine": "tiled", "width": 1100, "height": 600, "ticks": 5, "n_predators": 10,
+              "n_prey": 50, "n_plants": 70, "n_obstacles": 10, "energy": {}, "genes": {}}
+    row = run_one((0, 0, 3, config))
+    assert row["ticks"] == 5
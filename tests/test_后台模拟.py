@@ -0,0 +1,26 @@
+"""后台模拟进程异常退出时主进程能察觉、拿到traceback，共享内存不会遗留"""
+from multiprocessing import shared_memory
+
+import pytest
+
+from 后台模拟 import SimulationWorker, WorkerError
+
+
+def test_setup_error_is_forwarded_with_traceback():
+    worker = SimulationWorker(populations={"n_predators": 5, "n_prey": 10, "n_plants": 10, "n_bogus": 1})
+    with pytest.raises(WorkerError, match="n_bogus"):
+        worker.start()
+    assert not worker.is_alive()
+
+
+def test_killed_worker_is_reported_and_its_memory_unlinked():
+    with SimulationWorker(width=300, height=200, seed=1) as worker:
+        while worker.latest() is None:
+            pass
+        name = worker._block.name
+        worker._process.kill()
+        worker._process.join()
+        with pytest.raises(WorkerError, match="exitcode"):
+            worker.latest()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
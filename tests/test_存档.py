@@ -0,0 +1,36 @@
+"""从存档恢复后逐位一致地继续运行，统计缓冲区也接着存档前的历史"""
+import numpy as np
+import pytest
+
+from 存档 import load_checkpoint, save_checkpoint
+from 批量运行 import make_environment, run
+from test_确定性 import snapshot
+
+
+@pytest.mark.parametrize("engine", ["objects", "arrays"])
+def test_resume_matches_uninterrupted_run(engine, tmp_path):
+    path = str(tmp_path / "run.npz")
+    env = make_environment(engine, 1100, 600, seed=5)
+    env.add_individuals(n_predators=10, n_prey=50, n_plants=200, n_obstacles=10)
+    run(env, 120, stop_on_extinction=False)
+    save_checkpoint(env, path)
+    run(env, 150, stop_on_extinction=False)
+
+    resumed = load_checkpoint(path)
+    assert resumed.tick == 120
+    run(resumed, 150, stop_on_extinction=False)
+    assert resumed.tick == env.tick
+    expected, actual = snapshot(env), snapshot(resumed)
+    for key in expected:
+        assert np.array_equal(expected[key], actual[key], equal_nan=True), key
+    for name in env.stats.keys():
+        assert np.array_equal(env.stats[name], resumed.stats[name]), name
+
+
+def test_autosave_writes_every_n_ticks(tmp_path):
+    path = str(tmp_path / "auto.npz")
+    env = make_environment("objects", 1100, 600, seed=2)
+    env.add_individuals(n_predators=5, n_prey=20, n_plants=30, n_obstacles=3)
+    env.enable_autosave(path, every=25)
+    run(env, 60, stop_on_extinction=False)
+    assert load_checkpoint(path).tick == 50
@@ -0,0 +1,63 @@
+import os
+
+import pytest
+
+pygame = pytest.importorskip("pygame")
+
+from 渲染 import Camera, Renderer
+from 环境 import Environment
+
+
+@pytest.fixture
+def screen():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    yield pygame.display.set_mode((1100, 600))
+    pygame.display.quit()
+
+
+def test_renderer_matches_environment_draw(screen):
+    """批量渲染与Environment.draw逐像素一致（包括岩石压在动物之上、植物压在岩石之上）"""
+    env = Environment(1100, 600, seed=3)
+    env.add_individuals(n_predators=100, n_prey=500, n_plants=700, n_obstacles=40)
+    for _ in range(5):
+        env.update()
+    env.draw(screen)
+    expected = pygame.surfarray.array3d(screen).copy()
+    Renderer(screen).draw(env)
+    assert (pygame.surfarray.array3d(screen) == expected).all()
+    Renderer(screen).draw(env, Camera((1100, 600), (1100, 600)))
+    assert (pygame.surfarray.array3d(screen) == expected).all()
+
+
+def test_camera_reuses_rock_layer_until_view_changes(screen, monkeypatch):
+    import 渲染
+
+    env = Environment(3000, 2000, seed=3)
+    env.add_individuals(n_predators=50, n_prey=200, n_plants=300, n_obstacles=60)
+    camera = Camera((1100, 600), (3000, 2000), zoom=1.5)
+    camera.pan(400, 300)
+    calls = []
+    draw_rocks = 渲染.draw_rocks
+    monkeypatch.setattr(渲染, "draw_rocks", lambda *args: calls.append(1) or draw_rocks(*args))
+    renderer = Renderer(screen)
+    renderer.draw(env, camera)
+    first = pygame.surfarray.array3d(screen).copy()
+    renderer.draw(env, camera)
+    assert len(calls) == 1  # 镜头没动：只贴缓存的图层
+    assert (pygame.surfarray.array3d(screen) == first).all()
+    camera.pan(50, 0)
+    renderer.draw(env, camera)
+    assert len(calls) == 2
+    # 缓存图层与直接在屏幕上画岩石的结果逐像素一致
+    screen.fill((0, 0, 0))
+    env_view = camera.view()
+    for name in ("predators", "prey"):
+        xs, ys = 渲染.visible(env, name, env_view)
+        renderer._draw_sprites(name, *camera.to_screen(xs, ys))
+    draw_rocks(screen, renderer._visible_rocks(env, env_view), camera)
+    xs, ys = 渲染.visible(env, "plants", env_view)
+    renderer._draw_sprites("plants", *camera.to_screen(xs, ys))
+    expected = pygame.surfarray.array3d(screen).copy()
+    renderer.draw(env, camera)
+    assert (pygame.surfarray.array3d(screen) == expected).all()
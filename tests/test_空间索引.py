@@ -0,0 +1,112 @@
+import math
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+import 编译内核
+import 空间索引
+from 基因与状态 import ENERGY_PARAMS
+from 环境 import Environment
+
+MODULES = [空间索引, 编译内核]
+Point = namedtuple("Point", ["x", "y"])
+
+
+def serial_graze(ax, ay, bx, by, energy, bite, radius, a_group=None, b_group=None):
+    """逐个遍历a：每个a在b的列表里找第一个半径内、还没被吃光的（基线的捕获/取食规则）"""
+    bites = [0] * len(bx)
+    eaten = []
+    for a in range(len(ax)):
+        for b in range(len(bx)):
+            if a_group is not None and a_group[a] != b_group[b]:
+                continue
+            if math.hypot(bx[b] - ax[a], by[b] - ay[a]) < radius and energy[b] - bite * bites[b] > 0:
+                bites[b] += 1
+                eaten.append((a, b))
+                break
+    return eaten
+
+
+def crowd(seed, n_a, n_b, span=4.0, groups=1):
+    rng = np.random.default_rng(seed)
+    ax, ay = rng.uniform(0, span, n_a), rng.uniform(0, span, n_a)
+    bx, by = rng.uniform(0, span, n_b), rng.uniform(0, span, n_b)
+    return ax, ay, bx, by, rng.integers(0, groups, n_a), rng.integers(0, groups, n_b)
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_counter_example(module):
+    """h0可达{0}，h1可达{0, 1}，h2可达{1}：按顺序h0吃0、h1吃1，h2落空"""
+    ax, ay = np.array([0.0, 0.5, 1.0]), np.zeros(3)
+    bx, by = np.array([0.2, 0.9]), np.zeros(2)
+    hunter, caught = module.match_within(ax, ay, bx, by, 0.45)
+    assert hunter.tolist() == [0, 1] and caught.tolist() == [0, 1]
+
+
+@pytest.mark.parametrize("module", MODULES)
+@pytest.mark.parametrize("seed", range(5))
+def test_match_within_is_serial(module, seed):
+    ax, ay, bx, by, a_group, b_group = crowd(seed, 60, 50, groups=3)
+    for groups in ({}, {"a_group": a_group, "b_group": b_group}):
+        expected = serial_graze(ax, ay, bx, by, np.ones(len(bx)), 1.0, 1.0, **groups)
+        hunter, caught = module.match_within(ax, ay, bx, by, 1.0, **groups)
+        assert list(zip(hunter.tolist(), caught.tolist())) == expected
+
+
+@pytest.mark.parametrize("module", MODULES)
+@pytest.mark.parametrize("seed", range(5))
+def test_graze_within_is_serial(module, seed):
+    ax, ay, bx, by, _, _ = crowd(seed, 80, 30)
+    energy = np.random.default_rng(seed).uniform(-5, 60, len(bx))
+    expected = sorted(serial_graze(ax, ay, bx, by, energy, 15.0, 1.0), key=lambda pair: (pair[1], pair[0]))
+    eater, food = module.graze_within(ax, ay, bx, by, energy, 15.0, 1.0)
+    assert list(zip(eater.tolist(), food.tolist())) == expected
+
+
+def test_object_grazing_falls_back_to_next_plant():
+    """对象模型：植物按列表顺序选（不是网格顺序），被前面的猎物吃光后换下一株"""
+    env = Environment(100, 100, seed=0)
+    env.add_individuals(n_predators=0, n_prey=6, n_plants=2, n_obstacles=0)
+    # 植物1在左边的格子里（网格查询先找到它），但列表顺序是植物0优先
+    for plant, x in zip(env.plants, (50.2, 49.8)):
+        plant.x, plant.y = x, 50.0
+    env.rebuild_plant_schedule()
+    for prey in env.prey:
+        prey.x, prey.y = 50.0, 50.0
+    bite = ENERGY_PARAMS["graze_bite"]
+    first, second = env.plants
+    servings = math.ceil(first.energy / bite)  # 植物0能被啃的口数
+    second_energy = second.energy
+    before = [prey.energy for prey in env.prey]
+    env._resolve_grazing(env.prey)
+    assert [prey.energy - e for prey, e in zip(env.prey, before)] == [ENERGY_PARAMS["graze_gain"]] * 6
+    assert first.dead and not second.dead
+    assert second.energy == second_energy - bite * (6 - servings)
+
+
+def test_grid_counts_distance_evaluations():
+    rng = np.random.default_rng(3)
+    points = [Point(x, y) for x, y in zip(rng.uniform(0, 100, 300), rng.uniform(0, 100, 300))]
+    grid = 空间索引.SpatialGrid(cell_size=10.0)
+    grid.build(points)
+    expected = 0
+    for x, y in [(5.0, 5.0), (50.0, 50.0), (95.0, 20.0)]:
+        grid.nearest(x, y, 12.0)
+        # 查询半径覆盖到的格子里的个体都要算一次距离
+        expected += sum(1 for p in points
+                        if int((x - 12) // 10) <= int(p.x // 10) <= int((x + 12) // 10)
+                        and int((y - 12) // 10) <= int(p.y // 10) <= int((y + 12) // 10))
+    assert grid.queries == 3 and grid.checks == expected
+
+
+def test_object_engine_profiles_spatial_work():
+    env = Environment(1100, 600, seed=1)
+    env.add_individuals(n_predators=10, n_prey=50, n_plants=70, n_obstacles=10)
+    profiler = env.enable_profiling()
+    for _ in range(20):
+        env.update()
+    counters = profiler.averages()["counters"]
+    # 每个捕食者一次找猎物的查询，每只被捕食者至少一次找威胁的查询
+    assert counters["spatial_queries"] >= counters["predators_processed"] + counters["prey_processed"]
+    assert counters["distance_checks"] > 0
@@ -0,0 +1,48 @@
+"""有界的种群统计：环形缓冲区只保留最近capacity帧，写盘的数据块按时间拼回完整历史"""
+import shutil
+
+import numpy as np
+import pytest
+
+from 统计 import PopulationStats, load_chunks
+
+
+class Counts:
+    """只有各物种数量的假环境"""
+
+    def __init__(self, n):
+        self.predators = [None] * n
+        self.prey = [None] * (2 * n)
+        self.plants = []
+
+
+def test_ring_buffer_keeps_latest_rows():
+    stats = PopulationStats(capacity=8)
+    for n in range(20):
+        stats.record(Counts(n))
+    assert len(stats) == 8
+    assert stats["tick"].tolist() == list(range(12, 20))
+    assert stats["prey"].tolist() == [2 * n for n in range(12, 20)]
+    assert stats.latest("predators") == 19
+
+
+def test_chunks_on_disk_cover_whole_history(tmp_path):
+    stats = PopulationStats(capacity=8, chunk_size=5, output_dir=str(tmp_path))
+    for n in range(23):
+        stats.record(Counts(n))
+    stats.close()
+    history = load_chunks(str(tmp_path))
+    assert history["tick"].tolist() == list(range(23))
+    assert np.array_equal(history["predators"], np.arange(23))
+
+
+def test_failed_write_raises_instead_of_hanging(tmp_path):
+    directory = str(tmp_path / "stats")
+    stats = PopulationStats(capacity=8, chunk_size=2, output_dir=directory)
+    shutil.rmtree(directory)  # 之后每个数据块都写不进去
+    with pytest.raises(FileNotFoundError):
+        for n in range(40):
+            stats.record(Counts(n))
+    with pytest.raises(FileNotFoundError):
+        stats.close()
+    stats.close()  # 写盘线程已经清理，再关不会出错
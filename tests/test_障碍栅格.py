@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import 编译内核
+from 基因与状态 import Rock
+from 障碍栅格 import ObstacleMap
+
+
+def brute_force(rocks, x, y, radius):
+    """按列表顺序逐块检测（基线的碰撞规则）"""
+    for i, rock in enumerate(rocks):
+        if rock.collides_with(x, y, radius):
+            return i
+    return -1
+
+
+def crowded_world(seed):
+    """互相重叠、挨得很近的岩石，以及查询点"""
+    rng = np.random.default_rng(seed)
+    rocks = [Rock(x=float(x), y=float(y), radius=int(r))
+             for x, y, r in zip(rng.uniform(50, 250, 40), rng.uniform(50, 150, 40), rng.integers(3, 30, 40))]
+    xs = rng.uniform(0, 300, 4000)
+    ys = rng.uniform(0, 200, 4000)
+    xs[:3] = np.nan
+    return rocks, xs, ys
+
+
+@pytest.mark.parametrize("cell_size", [None, 3.7])
+@pytest.mark.parametrize("radius", [4, 20, 60])
+def test_first_collision_is_first_rock_in_list_order(cell_size, radius):
+    rocks, xs, ys = crowded_world(1)
+    obstacle_map = ObstacleMap(rocks, 300, 200, clearance=20, border=10, cell_size=cell_size)
+    expected = np.array([brute_force(rocks, x, y, radius) for x, y in zip(xs, ys)])
+    assert (expected >= 0).any() and (expected < 0).any()
+    assert (obstacle_map.first_collision_many(xs, ys, radius) == expected).all()
+    scalar = [obstacle_map.first_collision(x, y, radius) for x, y in zip(xs, ys)]
+    assert [rocks.index(obs) if obs is not None else -1 for obs in scalar] == expected.tolist()
+    assert (编译内核.first_collision_many(obstacle_map, xs, ys, radius) == expected).all()
+
+
+@pytest.mark.parametrize("radius", [4, 60])
+def test_checks_count_rocks_actually_tested(radius):
+    rocks, xs, ys = crowded_world(2)
+    obstacle_map = ObstacleMap(rocks, 300, 200, clearance=20, border=10)
+    for x, y in zip(xs, ys):
+        obstacle_map.first_collision(x, y, radius)
+    scalar = obstacle_map.checks
+    assert 0 < scalar <= len(xs) * len(rocks)
+    if radius == 4:  # 查表能排除远离岩石的点，检测次数远少于逐块检测
+        assert scalar < len(xs) * len(rocks) / 10
+    obstacle_map.checks = 0
+    编译内核.first_collision_many(obstacle_map, xs, ys, radius)
+    assert obstacle_map.checks == scalar  # 两者都在碰到第一块时停下
+    obstacle_map.checks = 0
+    obstacle_map.first_collision_many(xs, ys, radius)
+    assert obstacle_map.checks >= scalar  # 向量化版本检测每个点的全部候选
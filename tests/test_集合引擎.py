@@ -0,0 +1,44 @@
+"""集合引擎：岩石碰撞与逐块检查一致，不支持的功能调用时报错"""
+import numpy as np
+import pytest
+
+from 集合引擎 import EnsembleEnvironment
+
+
+def test_collision_takes_first_rock_in_list_order():
+    ens = EnsembleEnvironment(3, width=200, height=150, seed=1)
+    ens.add_individuals(n_predators=0, n_prey=400, n_plants=0, n_obstacles=12)
+    prey = ens.prey
+    hit, rock_x, rock_y = ens._collide(prey, prey.x, prey.y)
+    expected = {}
+    for i, (x, y, w) in enumerate(zip(prey.x, prey.y, prey.world)):
+        for k in range(ens.rock_r.shape[1]):  # 逐块按列表顺序检查，取第一块
+            if np.hypot(ens.rock_x[w, k] - x, ens.rock_y[w, k] - y) < ens.rock_r[w, k] + prey.radius:
+                expected[i] = (ens.rock_x[w, k], ens.rock_y[w, k])
+                break
+    assert len(expected) > 0
+    assert hit.tolist() == sorted(expected)
+    assert list(zip(rock_x.tolist(), rock_y.tolist())) == [expected[i] for i in hit.tolist()]
+
+
+@pytest.mark.parametrize("method, args", [("enable_autosave", ("ens.pkl",)),
+                                          ("enable_governor", ()),
+                                          ("enable_recording", ("events",))])
+def test_unsupported_features_raise(method, args, tmp_path):
+    ens = EnsembleEnvironment(2, width=200, height=150, seed=1)
+    ens.add_individuals(n_predators=3, n_prey=10, n_plants=40, n_obstacles=2)
+    with pytest.raises(NotImplementedError, match=method):
+        getattr(ens, method)(*(str(tmp_path / arg) for arg in args))
+    assert ens.autosave is None and ens.governor is None and ens.recorder is None
+    assert list(tmp_path.iterdir()) == []
+    for _ in range(5):
+        ens.update()
+
+
+def test_no_single_world_obstacle_map_or_stats():
+    ens = EnsembleEnvironment(4, width=200, height=150, seed=1)
+    assert ens.obstacle_map is None
+    ens.add_individuals(n_predators=3, n_prey=10, n_plants=5, n_obstacles=2)
+    ens.update()
+    assert ens.obstacle_map is None
+    assert ens.stats["prey"].shape == (1, 4)
@@ -1,29 +1,129 @@
+import argparse
+import time
+
 import pygame
 from 环境 import Environment
+from 渲染 import Renderer, Camera
+from 帧预算 import parse_capacity
+
+SCREEN_SIZE = (1100, 600)
+POPULATIONS = {"n_predators": 10, "n_prey": 50, "n_plants": 70, "n_obstacles": 10}  # 窗口大小的世界里的初始数量
+
+def world_size(text):
+    """解析 --world 的 "宽x高" """
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"世界大小应为 宽x高，例如 20000x12000：{text}")
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(f"世界大小必须为正：{text}")
+    return width, height
+
+def capacity_spec(text):
+    try:
+        return parse_capacity(text)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(str(exc))
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="捕食者-被捕食者进化模拟")
+    parser.add_argument("--engine", choices=("objects", "arrays"), default="objects")
+    parser.add_argument("--render", choices=("sprites", "pixels", "classic"), default="sprites",
+                        help="sprites/pixels为批量渲染，classic为Environment.draw逐个绘制")
+    parser.add_argument("--ticks-per-frame", type=int, default=None,
+                        help="每显示一帧推进的模拟帧数（跳帧，默认1）；--background时为上限，默认0即不限")
+    parser.add_argument("--background", action="store_true",
+                        help="模拟在后台进程全速运行，窗口只按帧率显示最新快照")
+    parser.add_argument("--fps", type=int, default=30, help="显示帧率上限，0为不限")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--profile", action="store_true", help="显示各阶段耗时和计数器（运行中按P切换）")
+    parser.add_argument("--world", type=world_size, default=SCREEN_SIZE,
+                        help="世界大小 宽x高，与窗口无关（默认与窗口相同）；滚轮/+-缩放，方向键或右键拖动平移，Home看全图")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="每帧耗时预算：持续超出时依次降低绘制频率、拥挤物种休眠、按承载量剔除")
+    parser.add_argument("--capacity", type=capacity_spec, default=None,
+                        help="剔除级使用的承载量，如plants=20000,prey=8000（没给的物种按耗时估算）")
+    parser.add_argument("--budget-log", default=None, help="降级日志追加写入的JSON Lines文件")
+    for name, default in POPULATIONS.items():
+        parser.add_argument("--" + name[2:], type=int, default=None,
+                            help=f"初始{name[2:]}数量（默认{default}，按世界面积相对窗口的倍数放大）")
+    args = parser.parse_args(argv)
+    if args.background and (args.render == "classic" or args.profile):
+        parser.error("--background时环境在后台进程里，不支持classic绘制和--profile")
+    if args.background and args.budget_ms is not None:
+        parser.error("--background时窗口不会被模拟卡住，--budget-ms只用于同步模式")
+    if args.render == "classic" and args.world != SCREEN_SIZE:
+        parser.error("classic绘制不支持镜头，--world必须与窗口大小相同")
+    scale = args.world[0] * args.world[1] / (SCREEN_SIZE[0] * SCREEN_SIZE[1])
+    args.populations = {name: getattr(args, name[2:]) if getattr(args, name[2:]) is not None
+                        else round(default * scale)
+                        for name, default in POPULATIONS.items()}
+    if args.ticks_per_frame is None:
+        args.ticks_per_frame = 0 if args.background else 1
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
     pygame.init()
-    width, height = 1100, 600
-    screen = pygame.display.set_mode((width, height))
+    screen = pygame.display.set_mode(SCREEN_SIZE)
     pygame.display.set_caption("捕食者-被捕食者进化模拟")
     clock = pygame.time.Clock()
+    width, height = args.world  # 世界大小，窗口通过镜头只显示其中一块
+    camera = Camera(SCREEN_SIZE, args.world)
+    
+    if args.background:
+        run_background(args, screen, clock, camera)
+        pygame.quit()
+        return
     
-    env = Environment(width, height)
-    env.add_individuals(n_predators=10, n_prey=50,n_plants=70)  # 初始数量
+    if args.engine == "arrays":
+        from 数组引擎 import ArrayEnvironment
+        env = ArrayEnvironment(width, height, seed=args.seed)
+    else:
+        env = Environment(width, height, seed=args.seed)
+    env.add_individuals(**args.populations)  # 初始数量
+    renderer = Renderer(screen, mode=args.render)
+    if args.profile:
+        env.enable_profiling()
+    governor = None
+    if args.budget_ms is not None:
+        governor = env.enable_governor(args.budget_ms, capacity=args.capacity,
+                                       log_path=args.budget_log, echo=print)
     
     running = True
     font = pygame.font.SysFont(None, 36)
+    small_font = pygame.font.SysFont(None, 22)
     
     while running:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_p:
+                # 切换探针：关闭时update()几乎没有额外开销
+                if env.profiler is None:
+                    env.enable_profiling()
+                else:
+                    env.disable_profiling()
+            else:
+                camera.handle_event(event)
+        camera.update(pygame.key.get_pressed(), clock.get_time() / 1000)
+        
+        # 更新环境（跳帧：每显示一帧推进ticks_per_frame次模拟）
+        for _ in range(args.ticks_per_frame):
+            env.update()
         
-        # 更新环境
-        env.update()
+        # 超出帧预算时降低绘制频率：跳过的显示帧只处理事件
+        if governor is not None and not governor.should_render():
+            clock.tick(args.fps)
+            continue
+        draw_start = time.perf_counter()
         
         # 绘制
-        env.draw(screen)
+        if args.render == "classic":
+            env.draw(screen)
+        else:
+            renderer.draw(env, camera)
+            draw_camera_status(screen, small_font, camera)
         
         # 显示种群数量
         pred_text = font.render(f"predators: {len(env.predators)}", True, (255, 0, 0))
@@ -33,10 +133,72 @@ def main():
         screen.blit(prey_text, (10, 50))
         screen.blit(plant_text, (10, 70))
         
+        # 探针叠加层：最近30帧的各阶段平均耗时和计数器
+        if env.profiler is not None:
+            for i, line in enumerate(env.profiler.lines()):
+                screen.blit(small_font.render(line, True, (200, 200, 200)), (10, 100 + 16 * i))
+        
+        if governor is not None:
+            screen.blit(small_font.render(f"budget: {governor.report()['stage']}", True, (200, 200, 200)),
+                        (10, SCREEN_SIZE[1] - 20))
+        
         pygame.display.flip()
-        clock.tick(30)  # 30帧/秒
+        if governor is not None:
+            governor.record_render(time.perf_counter() - draw_start)
+        clock.tick(args.fps)  # 默认30帧/秒
     
+    if governor is not None:
+        env.disable_governor()
     pygame.quit()
 
+def draw_camera_status(screen, small_font, camera):
+    """左上角显示镜头位置和缩放"""
+    x0, y0, x1, y1 = camera.view()
+    status = f"view ({x0:.0f}, {y0:.0f}) - ({x1:.0f}, {y1:.0f})  zoom {camera.zoom:.2f}"
+    if camera.heatmap:
+        status += "  density"
+    screen.blit(small_font.render(status, True, (200, 200, 200)), (10, 10))
+
+def run_background(args, screen, clock, camera):
+    """后台模式：模拟在工作进程里推进，这里只处理窗口事件、取最新快照绘制"""
+    from 后台模拟 import SimulationWorker
+    
+    renderer = Renderer(screen, mode=args.render)
+    font = pygame.font.SysFont(None, 36)
+    small_font = pygame.font.SysFont(None, 22)
+    limit = f"{args.ticks_per_frame}" if args.ticks_per_frame > 0 else "unlimited"
+    rates = []  # 最近若干显示帧的 (时间, 模拟帧号)，用于显示实际速率
+    populations = dict(args.populations)
+    n_obstacles = populations.pop("n_obstacles")
+    width, height = args.world
+    with SimulationWorker(args.engine, width, height, seed=args.seed, populations=populations,
+                          n_obstacles=n_obstacles, ticks_per_frame=args.ticks_per_frame) as worker:
+        running = True
+        while running:  # 工作进程异常退出时worker.latest()抛出WorkerError，带着它的traceback
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                else:
+                    camera.handle_event(event)
+            camera.update(pygame.key.get_pressed(), clock.get_time() / 1000)
+            
+            frame = worker.latest()
+            if frame is not None:
+                renderer.draw(frame, camera)
+                draw_camera_status(screen, small_font, camera)
+                screen.blit(font.render(f"predators: {len(frame.predators)}", True, (255, 0, 0)), (10, 30))
+                screen.blit(font.render(f"prey: {len(frame.prey)}", True, (0, 0, 255)), (10, 50))
+                screen.blit(font.render(f"plants: {len(frame.plants)}", True, (0, 255, 0)), (10, 70))
+                rates = (rates + [(time.perf_counter(), frame.tick)])[-30:]
+                if len(rates) > 1:
+                    (t0, tick0), (t1, tick1) = rates[0], rates[-1]
+                    per_frame = (tick1 - tick0) / (len(rates) - 1)
+                    per_second = (tick1 - tick0) / (t1 - t0) if t1 > t0 else 0.0
+                    status = f"tick {frame.tick}  ticks/frame: {per_frame:.1f} (limit {limit})  sim ticks/s: {per_second:.0f}"
+                    screen.blit(small_font.render(status, True, (200, 200, 200)), (10, 100))
+                pygame.display.flip()
+            clock.tick(args.fps)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,402 @@
+"""事件与轨迹记录：模拟运行时把出生（父代编号和基因）、死亡（原因）、捕食、取食事件
+和定期的位置帧追加写进定长记录的二进制文件，事后用内存映射读取，不必重跑模拟。
+读取任意帧区间只映射需要的部分，返回的NumPy数组直接指向映射的文件（零拷贝），
+也可以按原来的pygame绘制路径回放。
+
+记录目录里的文件：
+    meta.json     世界大小、障碍物、基因名、记录格式
+    events.bin    EVENT_DTYPE，按帧追加
+    genes.bin     GENES_DTYPE，每个出生事件一条
+    frames.bin    FRAME_DTYPE，每个位置帧依次是捕食者、被捕食者、植物
+    frames.idx    INDEX_DTYPE，每个位置帧一条（帧号、起始行、各物种数量）
+
+用法示例：
+    env.enable_recording("run_log", frame_every=10)
+    ...
+    log = EventLog("run_log")
+    log.events(100, 200, kind=HUNT)       # 第100~199帧的捕食事件
+    log.frame(150).prey["x"]              # 第150帧（或之前最近一个位置帧）被捕食者的x坐标
+    python 事件记录.py run_log --start 100 --stop 500   # 在pygame窗口里回放
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from 基因与状态 import GENE_PARAMS, Predator, Prey, Plant, Rock
+from 统计 import SPECIES
+
+FORMAT_VERSION = 1
+
+# 事件类型
+BIRTH, DEATH, HUNT, GRAZE = 1, 2, 3, 4
+# 死亡原因
+EATEN, STARVED, OUT_OF_BOUNDS, CULLED = 1, 2, 3, 4  # CULLED为帧预算调度的承载量剔除
+
+SPECIES_CODES = {Predator: 0, Prey: 1, Plant: 2}  # 与统计.SPECIES顺序一致
+
+# subject/other的含义：出生为(后代, 父代，初始个体为-1)，死亡为(死者, -1)，
+# 捕食为(捕食者, 猎物)，取食为(被捕食者, 植物)；x/y为subject当时的位置
+EVENT_DTYPE = np.dtype([("tick", "<i8"), ("subject", "<i8"), ("other", "<i8"), ("x", "<f4"), ("y", "<f4"),
+                        ("kind", "u1"), ("species", "u1"), ("cause", "u1"), ("pad", "u1")])
+GENES_DTYPE = np.dtype([("tick", "<i8"), ("id", "<i8"), ("genes", "<f8", (len(GENE_PARAMS),))])
+FRAME_DTYPE = np.dtype([("id", "<i8"), ("x", "<f4"), ("y", "<f4"), ("energy", "<f4")])
+INDEX_DTYPE = np.dtype([("tick", "<i8"), ("start", "<i8"), ("counts", "<i8", (len(SPECIES),))])
+
+FILES = {"events": ("events.bin", EVENT_DTYPE), "genes": ("genes.bin", GENES_DTYPE),
+         "frames": ("frames.bin", FRAME_DTYPE), "index": ("frames.idx", INDEX_DTYPE)}
+
+
+class EventRecorder:
+    """挂在Environment上的记录器（Environment.enable_recording创建）。
+    个体没有编号字段，记录器按对象分配编号，个体死亡时释放；
+    事件先攒在列表里，每帧结束时整批追加写盘"""
+
+    def __init__(self, directory, env, frame_every=10):
+        self.directory = directory
+        self.frame_every = frame_every
+        self._ids = {}  # 个体 -> 编号
+        self._next_id = 0
+        self._tick = env.tick
+        self._events = []
+        self._genes = []
+        os.makedirs(directory, exist_ok=True)
+        self._files = {name: open(os.path.join(directory, filename), "wb")
+                       for name, (filename, _) in FILES.items()}
+        self._frame_rows = 0  # frames.bin里已写的行数
+        meta = {
+            "version": FORMAT_VERSION,
+            "width": env.width,
+            "height": env.height,
+            "start_tick": env.tick,
+            "frame_every": frame_every,
+            "obstacles": [[rock.x, rock.y, rock.radius] for rock in env.obstacles],
+            "gene_params": list(GENE_PARAMS),
+            "species": list(SPECIES),
+            "dtypes": {name: dtype.descr for name, (_, dtype) in FILES.items()},
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        self._start(env)
+
+    def _start(self, env):
+        """开始记录时已经存在的个体记为父代-1的出生"""
+        for name in SPECIES:
+            for ind in getattr(env, name):
+                self.birth(ind, None)
+
+    def _id(self, ind):
+        uid = self._ids.get(ind)
+        if uid is None:
+            uid = self._ids[ind] = self._next_id
+            self._next_id += 1
+        return uid
+
+    def _event(self, kind, ind, other, cause=0):
+        self._events.append((self._tick, self._id(ind), other, ind.x, ind.y,
+                             kind, SPECIES_CODES[type(ind)], cause, 0))
+
+    def birth(self, child, parent):
+        self._event(BIRTH, child, -1 if parent is None else self._id(parent))
+        self._genes.append((self._tick, self._ids[child], tuple(child.genes)))
+
+    def births(self, children, parents):
+        for child, parent in zip(children, parents):
+            self.birth(child, parent)
+
+    def death(self, ind, cause):
+        self._event(DEATH, ind, -1, cause)
+        del self._ids[ind]
+
+    def hunt(self, predator, prey):
+        self._event(HUNT, predator, self._id(prey))
+
+    def graze(self, prey, plant):
+        self._event(GRAZE, prey, self._id(plant))
+
+    def sweep(self, env):
+        """帧末压缩前调用：记录饿死或出界的动物（被吃掉的已在remove_individual里记录）"""
+        for species in (env.predators, env.prey):
+            for ind in species:
+                if not ind.dead and not env.is_alive(ind):
+                    self.death(ind, STARVED if ind.energy <= 0 else OUT_OF_BOUNDS)
+
+    def end_tick(self, env):
+        """一帧结束：写出本帧的事件，到了间隔再写一个位置帧，下一帧的事件记到env.tick + 1"""
+        self._flush()
+        if env.tick % self.frame_every == 0:
+            self._write_frame(env)
+        for f in self._files.values():
+            f.flush()  # 让同时打开的EventLog能读到完整的帧
+        self._tick = env.tick + 1
+
+    def _flush(self):
+        if self._events:
+            np.array(self._events, dtype=EVENT_DTYPE).tofile(self._files["events"])
+            self._events = []
+        if self._genes:
+            np.array(self._genes, dtype=GENES_DTYPE).tofile(self._files["genes"])
+            self._genes = []
+
+    def _write_frame(self, env):
+        counts = []
+        for name in SPECIES:
+            species = getattr(env, name)
+            rows = np.empty(len(species), dtype=FRAME_DTYPE)
+            rows["id"] = [self._id(ind) for ind in species]
+            rows["x"] = [ind.x for ind in species]
+            rows["y"] = [ind.y for ind in species]
+            rows["energy"] = [ind.energy for ind in species]
+            rows.tofile(self._files["frames"])
+            counts.append(len(rows))
+        np.array([(env.tick, self._frame_rows, counts)], dtype=INDEX_DTYPE).tofile(self._files["index"])
+        self._frame_rows += sum(counts)
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+
+
+class ArrayEventRecorder(EventRecorder):
+    """结构数组引擎（ArrayEnvironment.enable_recording创建）的记录器，文件格式与EventRecorder相同。
+    数组的行没有固定身份，记录器给每个物种维护一条与行对齐的编号数组：
+    引擎压缩、捕食、取食和繁殖时调用对应的钩子，事件整批生成"""
+
+    def _start(self, env):
+        self.ids = {}
+        for name in SPECIES:
+            species = getattr(env, name)
+            self.ids[name] = self._new_ids(len(species))
+            self._add(BIRTH, name, species, np.arange(len(species)), -1)
+            self._genes_of(self.ids[name], species.genes)
+
+    def _new_ids(self, n):
+        ids = np.arange(self._next_id, self._next_id + n, dtype=np.int64)
+        self._next_id += n
+        return ids
+
+    @staticmethod
+    def _name(env, species):
+        return next(name for name in SPECIES if getattr(env, name) is species)
+
+    def _add(self, kind, name, species, rows, other, cause=0):
+        """物种name里下标为rows的个体各一条事件（other、cause可以是数组）"""
+        events = np.zeros(rows.size, dtype=EVENT_DTYPE)
+        events["tick"] = self._tick
+        events["subject"] = self.ids[name][rows]
+        events["other"] = other
+        events["x"] = species.x[rows]
+        events["y"] = species.y[rows]
+        events["kind"] = kind
+        events["species"] = SPECIES.index(name)
+        events["cause"] = cause
+        self._events.append(events)
+
+    def _genes_of(self, ids, genes):
+        rows = np.empty(ids.size, dtype=GENES_DTYPE)
+        rows["tick"] = self._tick
+        rows["id"] = ids
+        rows["genes"] = genes
+        self._genes.append(rows)
+
+    def keep(self, env, species, mask, cause=None):
+        """species.keep(mask)之前调用：记录被移除个体的死亡并压缩编号。
+        cause为None时按能量区分饿死和出界（与sweep一致）"""
+        name = self._name(env, species)
+        gone = np.flatnonzero(~mask)
+        if gone.size:
+            if cause is None:
+                cause = np.where(species.energy[gone] <= 0, STARVED, OUT_OF_BOUNDS)
+            self._add(DEATH, name, species, gone, -1, cause)
+            self.ids[name] = self.ids[name][mask]
+
+    def hunt(self, env, hunter, caught):
+        """hunter[i]吃掉了caught[i]（猎物随后由引擎按EATEN压缩掉）"""
+        self._add(HUNT, "predators", env.predators, hunter, self.ids["prey"][caught])
+
+    def graze(self, env, eater, plant):
+        self._add(GRAZE, "prey", env.prey, eater, self.ids["plants"][plant])
+
+    def births(self, env, species, parents):
+        """species.add之后调用：末尾的parents.size行是parents的后代"""
+        name = self._name(env, species)
+        n = parents.size
+        ids = self._new_ids(n)
+        parent_ids = self.ids[name][parents]
+        self.ids[name] = np.concatenate([self.ids[name], ids])
+        self._add(BIRTH, name, species, np.arange(len(species) - n, len(species)), parent_ids)
+        self._genes_of(ids, species.genes[len(species) - n:])
+
+    def sweep(self, env):
+        """死亡在压缩数组时已经记录"""
+
+    def _flush(self):
+        for name, chunks in (("events", self._events), ("genes", self._genes)):
+            if chunks:
+                np.concatenate(chunks).tofile(self._files[name])
+                chunks.clear()
+
+    def _write_frame(self, env):
+        counts = []
+        for name in SPECIES:
+            species = getattr(env, name)
+            rows = np.empty(len(species), dtype=FRAME_DTYPE)
+            rows["id"] = self.ids[name]
+            rows["x"] = species.x
+            rows["y"] = species.y
+            rows["energy"] = species.energy
+            rows.tofile(self._files["frames"])
+            counts.append(len(rows))
+        np.array([(env.tick, self._frame_rows, counts)], dtype=INDEX_DTYPE).tofile(self._files["index"])
+        self._frame_rows += sum(counts)
+
+
+class FrameSpecies:
+    """位置帧里一个物种的记录：id/x/y/energy都是映射文件上的视图（不拷贝）"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.id = rows["id"]
+        self.x = rows["x"]
+        self.y = rows["y"]
+        self.energy = rows["energy"]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, column):
+        return self.rows[column]
+
+
+class Frame:
+    """一个位置帧，属性与Environment相同（predators/prey/plants/obstacles/width/height），
+    可以直接交给Renderer.draw绘制"""
+
+    def __init__(self, tick, species, obstacles, width, height):
+        self.tick = tick
+        self.predators, self.prey, self.plants = species
+        self.obstacles = obstacles
+        self.width = width
+        self.height = height
+
+
+class EventLog:
+    """记录目录的只读视图：每个文件用np.memmap映射，按帧号二分查找区间，
+    只有实际访问到的页才会从磁盘读入。记录仍在进行时可以调用refresh()看到新追加的内容"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        self.obstacles = [Rock(x=x, y=y, radius=int(r)) for x, y, r in self.meta["obstacles"]]
+        self.refresh()
+
+    def refresh(self):
+        for name, (filename, dtype) in FILES.items():
+            setattr(self, "_" + name, self._map(os.path.join(self.directory, filename), dtype))
+
+    @staticmethod
+    def _map(path, dtype):
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        n = size // dtype.itemsize  # 忽略写到一半的尾部记录
+        if n == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(n,))
+
+    @staticmethod
+    def _range(records, start, stop):
+        ticks = records["tick"]
+        lo = 0 if start is None else np.searchsorted(ticks, start, side="left")
+        hi = len(records) if stop is None else np.searchsorted(ticks, stop, side="left")
+        return records[lo:hi]
+
+    def events(self, start=None, stop=None, kind=None):
+        """[start, stop)帧内的事件。不按类型筛选时返回映射视图；按kind筛选会拷贝出结果"""
+        records = self._range(self._events, start, stop)
+        if kind is not None:
+            records = records[records["kind"] == kind]
+        return records
+
+    def births(self, start=None, stop=None):
+        """[start, stop)帧内出生个体的基因记录（映射视图）"""
+        return self._range(self._genes, start, stop)
+
+    def ancestry(self, uid):
+        """个体的祖先编号列表（由近及远），初始个体的祖先列表为空"""
+        born = self.events(kind=BIRTH)
+        parent_of = dict(zip(born["subject"].tolist(), born["other"].tolist()))
+        result = []
+        parent = parent_of.get(uid, -1)
+        while parent != -1:
+            result.append(parent)
+            parent = parent_of.get(parent, -1)
+        return result
+
+    @property
+    def frame_ticks(self):
+        return self._index["tick"]
+
+    def frame(self, tick):
+        """帧号不超过tick的最近一个位置帧"""
+        i = np.searchsorted(self._index["tick"], tick, side="right") - 1
+        if i < 0:
+            raise IndexError(f"第{tick}帧之前没有位置帧")
+        return self._frame_at(i)
+
+    def frames(self, start=None, stop=None):
+        """依次产生[start, stop)帧内的所有位置帧"""
+        ticks = self._index["tick"]
+        lo = 0 if start is None else np.searchsorted(ticks, start, side="left")
+        hi = len(ticks) if stop is None else np.searchsorted(ticks, stop, side="left")
+        for i in range(lo, hi):
+            yield self._frame_at(i)
+
+    def _frame_at(self, i):
+        entry = self._index[i]
+        offset = int(entry["start"])
+        species = []
+        for count in entry["counts"].tolist():
+            species.append(FrameSpecies(self._frames[offset:offset + count]))
+            offset += count
+        return Frame(int(entry["tick"]), species, self.obstacles, self.meta["width"], self.meta["height"])
+
+
+def replay(log, start=None, stop=None, mode="sprites", fps=30):
+    """在pygame窗口里按位置帧回放[start, stop)区间（与实时运行相同的Renderer绘制路径）"""
+    import pygame
+    from 渲染 import Renderer
+
+    pygame.init()
+    screen = pygame.display.set_mode((int(log.meta["width"]), int(log.meta["height"])))
+    pygame.display.set_caption("回放")
+    renderer = Renderer(screen, mode=mode)
+    font = pygame.font.SysFont(None, 28)
+    clock = pygame.time.Clock()
+    try:
+        for frame in log.frames(start, stop):
+            if any(event.type == pygame.QUIT for event in pygame.event.get()):
+                break
+            renderer.draw(frame)
+            screen.blit(font.render(f"tick {frame.tick}", True, (200, 200, 200)), (10, 10))
+            pygame.display.flip()
+            clock.tick(fps)
+    finally:
+        pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放事件记录里的位置帧")
+    parser.add_argument("directory")
+    parser.add_argument("--start", type=int, default=None)
+    parser.add_argument("--stop", type=int, default=None)
+    parser.add_argument("--render", choices=("sprites", "pixels"), default="sprites")
+    parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args(argv)
+    replay(EventLog(args.directory), args.start, args.stop, args.render, args.fps)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,486 @@
+"""分块并行：把一个大世界切成 nx × ny 个矩形分块，由进程池并行推进。
+
+每个物种的状态按行（x, y, vx, vy, 能量, 年龄, 基因...）存放在共享内存里，
+分成前后两份缓冲区，每块各占一段区域。区域只是存放位置：每帧开始时各块从自己及周围8块的区域里
+按位置认领本块拥有的个体，推进后写回自己的区域，所以跨块移动不需要额外搬运。
+
+每帧分三轮，轮与轮之间由协调进程同步：
+  1. 各块的植物生长播种，本块的捕食者移动、代谢，猎物（本块及halo内的“幽灵”）只读；
+     各块报告捕获距离内的 (捕食者, 猎物) 候选配对；
+  2. 协调进程把所有块的候选配对合起来，按全局顺序（区域编号、区域内行号）逐个认领
+     （空间索引.serial_claims），给捕食者加能量、把被吃的猎物标记为死亡；
+     各块的猎物再移动、代谢，捕食者和植物只读，报告取食候选，协调进程同样统一结算；
+  3. 各块清理死亡个体，本块的捕食者和被捕食者繁殖。
+幽灵个体只读不写，每次接触只在协调进程里结算一次：每只猎物至多被吃一次，
+捕食者得到的能量与被吃掉的猎物数严格对应，跨块边界也一样。
+
+halo宽度按当前种群的最大感知/取食范围加一个阶段内的最大位移动态计算；
+分块边长不够（基因变异使感知范围不断增大）时自动合并分块（最少1x1）并给出警告，不会中途报错。
+每块每轮的随机数由 (种子, 帧, 分块, 轮) 决定，结果与工作进程数无关、可复现；
+随机流和全局顺序与单个ArrayEnvironment不同，两者是统计等价而非逐位一致。
+
+用法示例：
+    world = TiledWorld(8000, 6000, tiles=(4, 4), workers=4, seed=0)
+    world.add_individuals(n_predators=20000, n_prey=100000, n_plants=140000, n_obstacles=1000)
+    for _ in range(1000):
+        world.update()
+    world.close()
+"""
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from 基因与状态 import ENERGY_PARAMS, GENE_PARAMS, GENE_RANGES, Prey, Rock
+from 数组引擎 import ArrayEnvironment, SpeciesArrays
+from 随机数 import make_rng
+from 空间索引 import pairs_within, serial_claims
+from 统计 import PopulationStats
+
+SPECIES = ("predators", "prey", "plants")
+# 与ArrayEnvironment中各物种的设置一致
+LAYOUT = {
+    "predators": {"radius": 11, "factor": 1.5},
+    "prey": {"radius": 5},
+    "plants": {"radius": 5, "energy_key": "plant_initial_energy"},
+}
+N_COLUMNS = 6 + len(GENE_PARAMS)  # x, y, vx, vy, energy, age + 基因
+ENERGY = 4  # 能量所在的列
+SEED_RANGE = 50  # 植物播种点离母株的最大距离（与Plant.update一致）
+CONTACT = 1.0  # 捕获和取食的距离
+
+
+class TileGrid:
+    """分块的几何：位置到分块编号的映射、每块的边界和相邻分块"""
+
+    def __init__(self, width, height, nx, ny):
+        self.width = width
+        self.height = height
+        self.nx = nx
+        self.ny = ny
+        self.tile_width = width / nx
+        self.tile_height = height / ny
+
+    def __len__(self):
+        return self.nx * self.ny
+
+    def index(self, x, y):
+        """每个位置所属的分块编号（世界外的位置归入最近的边缘分块，nan归入第0块）"""
+        col = np.clip(np.floor(np.nan_to_num(x / self.tile_width)), 0, self.nx - 1).astype(np.int64)
+        row = np.clip(np.floor(np.nan_to_num(y / self.tile_height)), 0, self.ny - 1).astype(np.int64)
+        return row * self.nx + col
+
+    def bounds(self, k):
+        row, col = divmod(k, self.nx)
+        return (col * self.tile_width, row * self.tile_height,
+                (col + 1) * self.tile_width, (row + 1) * self.tile_height)
+
+    def neighbors(self, k):
+        """第k块及其周围（至多8块）的编号"""
+        row, col = divmod(k, self.nx)
+        return [r * self.nx + c
+                for r in range(max(row - 1, 0), min(row + 2, self.ny))
+                for c in range(max(col - 1, 0), min(col + 2, self.nx))]
+
+    def fits(self, need):
+        """分块边长是否都不小于need（只有一块的方向不受限制）"""
+        return ((self.nx == 1 or self.tile_width >= need)
+                and (self.ny == 1 or self.tile_height >= need))
+
+
+def to_rows(species, mask=None):
+    """把物种数组打包成 (个体数, N_COLUMNS) 的行"""
+    columns = [species.x, species.y, species.vx, species.vy, species.energy, species.age, species.genes]
+    if mask is not None:
+        columns = [c[mask] for c in columns]
+    return np.column_stack(columns).reshape(-1, N_COLUMNS)
+
+
+def from_rows(rows, species):
+    """把行解包到species（SpeciesArrays或其派生类）中，返回species"""
+    species.x = rows[:, 0].copy()
+    species.y = rows[:, 1].copy()
+    species.vx = rows[:, 2].copy()
+    species.vy = rows[:, 3].copy()
+    species.energy = rows[:, 4].copy()
+    species.age = rows[:, 5].astype(np.int64)
+    species.genes = rows[:, 6:].copy()
+    return species
+
+
+def reach(predators, prey):
+    """(一个阶段内个体的最大位移, 最大的感知/取食范围)。位移包括按速度前进、
+    追击或逃跑的一步、碰撞后的推离和出生时的偏移"""
+    step, sight = 0.0, Prey.eating_range
+    for sp in (predators, prey):
+        if len(sp):
+            step = max(step, float((sp.max_speed * np.maximum(sp.aggression, 1.0)).max()))
+            sight = max(sight, float(sp.perception.max()))
+    return 2 * step + 3, sight
+
+
+def halo_width(drift, sight):
+    """幽灵个体的范围：阶段开始时在本块外drift以内的个体，移动后还能被看到或接触到"""
+    return drift + sight + CONTACT
+
+
+def min_tile_side(drift, sight):
+    """分块边长的下限：不相邻分块的个体不会进入彼此的halo，播种点也只落在相邻分块"""
+    return halo_width(drift, sight) + max(drift, SEED_RANGE)
+
+
+# ---- 工作进程 ----
+
+_worker = {}  # 本进程的局部环境和已打开的共享内存
+
+
+def _init_worker(width, height, obstacles, energy_params, gene_ranges):
+    """工作进程初始化：同步参数，建好带完整障碍物栅格的局部环境"""
+    ENERGY_PARAMS.clear()
+    ENERGY_PARAMS.update(energy_params)
+    GENE_RANGES.clear()
+    GENE_RANGES.update(gene_ranges)
+    env = ArrayEnvironment(width, height)
+    env.obstacles = [Rock(x=x, y=y, radius=r) for x, y, r in obstacles]
+    env.rebuild_obstacle_map()
+    _worker["env"] = env
+    _worker["buffers"] = {}
+
+
+def _attach(name, shm_name, shape):
+    """打开（并缓存）某物种的共享内存缓冲区；协调进程扩容后名字改变，重新打开"""
+    cached = _worker["buffers"].get(name)
+    if cached is None or cached[0].name != shm_name:
+        if cached is not None:
+            cached[0].close()
+        shm = shared_memory.SharedMemory(name=shm_name)
+        cached = (shm, np.ndarray(shape, dtype=float, buffer=shm.buf))
+        _worker["buffers"][name] = cached
+    return cached[1]
+
+
+def _read(ctx, name, buffer, regions):
+    """读出若干区域里某物种的行，返回 (行, 所在区域, 区域内行号)"""
+    data = _attach(name, *ctx["buffers"][name])
+    sizes = [ctx["counts"][buffer][name][j] for j in regions]
+    rows = np.concatenate([data[buffer, j, :n] for j, n in zip(regions, sizes)])
+    region = np.repeat(np.asarray(regions, dtype=np.int64), sizes)
+    index = np.concatenate([np.arange(n) for n in sizes])
+    return rows, region, index
+
+
+def _owned(ctx, k, name, buffer):
+    """本块按位置拥有的个体（从周围各块的区域里认领）"""
+    grid = ctx["grid"]
+    rows, _, _ = _read(ctx, name, buffer, grid.neighbors(k))
+    rows = rows[grid.index(rows[:, 0], rows[:, 1]) == k]
+    return from_rows(rows, SpeciesArrays(**LAYOUT[name]))
+
+
+def _ghosts(ctx, k, name, buffer):
+    """本块及halo内的存活个体（只读），以及它们在缓冲区里的地址 (区域, 行号)"""
+    grid = ctx["grid"]
+    rows, region, index = _read(ctx, name, buffer, grid.neighbors(k))
+    x0, y0, x1, y1 = grid.bounds(k)
+    halo = ctx["halo"]
+    x, y = rows[:, 0], rows[:, 1]
+    near = (x >= x0 - halo) & (x < x1 + halo) & (y >= y0 - halo) & (y < y1 + halo)
+    species = from_rows(rows[near], SpeciesArrays(**LAYOUT[name]))
+    alive = _worker["env"]._alive_mask(species)
+    species.keep(alive)
+    return species, region[near][alive], index[near][alive]
+
+
+def _write(ctx, k, name, species):
+    """把本块推进后的个体写进后缓冲区里本块的区域，返回个数"""
+    data = _attach(name, *ctx["buffers"][name])
+    rows = to_rows(species)
+    data[1 - ctx["front"], k, :len(rows)] = rows
+    return len(rows)
+
+
+def _round_env(ctx, k, round_):
+    env = _worker["env"]
+    env.rng, env.random = make_rng([ctx["entropy"], ctx["tick"], k, round_])
+    return env
+
+
+def _tile_predators(task):
+    """第一轮：植物生长播种，本块的捕食者移动、代谢；返回写回的个数和捕获候选
+    (捕食者在本块区域里的行号, 猎物所在区域, 猎物行号)"""
+    k, ctx = task
+    env = _round_env(ctx, k, 0)
+    front = ctx["front"]
+    env.plants = _owned(ctx, k, "plants", front)
+    env._update_plants()
+    env.predators = _owned(ctx, k, "predators", front)
+    env.prey, prey_region, prey_index = _ghosts(ctx, k, "prey", front)
+    env._move_predators()
+    env._metabolize(env.predators)
+    hunter, caught, _ = pairs_within(env.predators.x, env.predators.y, env.prey.x, env.prey.y, CONTACT)
+    written = {name: _write(ctx, k, name, getattr(env, name)) for name in ("predators", "plants")}
+    return written, (hunter, prey_region[caught], prey_index[caught])
+
+
+def _tile_prey(task):
+    """第二轮：本块的猎物（已结算捕获）移动、代谢，返回写回的个数和取食候选
+    (猎物在本块区域里的行号, 植物所在区域, 植物行号)"""
+    k, ctx = task
+    env = _round_env(ctx, k, 1)
+    back = 1 - ctx["front"]
+    env.prey = _owned(ctx, k, "prey", ctx["front"])
+    env._drop_dead(env.prey)  # 被吃掉的猎物能量已清零
+    env.predators, _, _ = _ghosts(ctx, k, "predators", back)
+    env.plants, plant_region, plant_index = _ghosts(ctx, k, "plants", back)
+    env._move_prey(any_predators=ctx["any_predators"])
+    env._metabolize(env.prey)
+    eater, food, _ = pairs_within(env.prey.x, env.prey.y, env.plants.x, env.plants.y, CONTACT)
+    written = {"prey": _write(ctx, k, "prey", env.prey)}
+    return written, (eater, plant_region[food], plant_index[food])
+
+
+def _tile_births(task):
+    """第三轮：本块区域里的个体清理死亡、繁殖，原地写回；返回个数和本块个体的 (位移, 视野)"""
+    k, ctx = task
+    env = _round_env(ctx, k, 2)
+    back = 1 - ctx["front"]
+    for name in SPECIES:
+        data = _attach(name, *ctx["buffers"][name])
+        rows = data[back, k, :ctx["counts"][back][name][k]]
+        setattr(env, name, from_rows(rows, SpeciesArrays(**LAYOUT[name])))
+    env._update_births()
+    written = {name: _write(ctx, k, name, getattr(env, name)) for name in SPECIES}
+    return written, reach(env.predators, env.prey)
+
+
+# ---- 协调进程 ----
+
+class TiledWorld:
+    """分块并行的大世界：接口与Environment相近（add_individuals、update、stats、
+    predators/prey/plants），适合远大于窗口、数十万个体的无界面运行。
+    workers=0时在当前进程内依次推进各块（便于调试）。
+    contacts为上一帧统一结算的捕获数和取食口数"""
+
+    def __init__(self, width=8000, height=6000, tiles=(2, 2), workers=None, seed=None):
+        self.width = width
+        self.height = height
+        self.grid = TileGrid(width, height, *tiles)
+        self.workers = os.cpu_count() if workers is None else workers
+        self.seed = seed
+        self.entropy = np.random.SeedSequence(seed).entropy  # 各块随机流的公共种子
+        self.obstacles = []
+        self.stats = PopulationStats()
+        self.tick = 0
+        self.drift = 0.0  # 一个阶段内的最大位移
+        self.sight = Prey.eating_range  # 最大的感知/取食范围
+        self.front = 0  # 当前状态所在的缓冲区（0或1）
+        self.counts = {name: np.zeros(len(self.grid), dtype=np.int64) for name in SPECIES}
+        self.contacts = {"kills": 0, "grazes": 0}
+        self._shm = {}  # 物种 -> SharedMemory
+        self._data = {}  # 物种 -> (2, 分块数, 容量, N_COLUMNS) 的视图
+        self._pool = None
+        self._cache = {}  # 本帧合并出的物种数组
+
+    @property
+    def halo(self):
+        return halo_width(self.drift, self.sight)
+
+    def add_individuals(self, n_predators=20, n_prey=50, n_plants=0, n_obstacles=10):
+        """初始化个体和障碍物（分布与ArrayEnvironment一致），按位置分发到各块"""
+        env = ArrayEnvironment(self.width, self.height, seed=self.seed)
+        env.add_individuals(n_predators, n_prey, n_plants, n_obstacles)
+        self.obstacles = env.obstacles
+        self.obstacle_map = env.obstacle_map
+        for name in SPECIES:
+            self._distribute(name, to_rows(getattr(env, name)))
+        self.drift, self.sight = reach(env.predators, env.prey)
+        self._cache = {}
+        self._start_pool()
+
+    def _distribute(self, name, rows):
+        """按位置把行分发到各块的区域（前缓冲区），重新分配共享内存"""
+        tile = self.grid.index(rows[:, 0], rows[:, 1])
+        order = np.argsort(tile, kind="stable")
+        counts = np.bincount(tile, minlength=len(self.grid))
+        if name in self._data:
+            self._release(name)
+        self._allocate(name, max(1024, 2 * int(counts.max(initial=0))))
+        rows = rows[order]
+        starts = np.r_[0, np.cumsum(counts)]
+        for k in range(len(self.grid)):
+            self._data[name][self.front, k, :counts[k]] = rows[starts[k]:starts[k + 1]]
+        self.counts[name] = counts
+
+    def _allocate(self, name, capacity):
+        """（重新）分配某物种的共享内存，保留当前前缓冲区的数据"""
+        shape = (2, len(self.grid), capacity, N_COLUMNS)
+        shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * 8)
+        data = np.ndarray(shape, dtype=float, buffer=shm.buf)
+        if name in self._data:
+            old = self._data[name][self.front]
+            for k, n in enumerate(self.counts[name].tolist()):
+                data[self.front, k, :n] = old[k, :n]
+            del old  # 释放视图后才能关闭旧的共享内存
+            self._release(name)
+        self._shm[name] = shm
+        self._data[name] = data
+
+    def _release(self, name):
+        del self._data[name]
+        shm = self._shm.pop(name)
+        shm.close()
+        shm.unlink()
+
+    def _start_pool(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        args = (self.width, self.height, [(o.x, o.y, o.radius) for o in self.obstacles],
+                dict(ENERGY_PARAMS), dict(GENE_RANGES))
+        if self.workers > 0:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=args)
+        else:
+            _init_worker(*args)
+
+    def _fit_tiles(self):
+        """分块边长小于min_tile_side时合并分块（最少1x1），不中途报错"""
+        need = min_tile_side(self.drift, self.sight)
+        if self.grid.fits(need):
+            return
+        grid = self.grid
+        nx = grid.nx if grid.nx == 1 or grid.tile_width >= need else max(1, int(self.width // need))
+        ny = grid.ny if grid.ny == 1 or grid.tile_height >= need else max(1, int(self.height // need))
+        warnings.warn(f"第{self.tick}帧：分块边长小于{need:.1f}（halo {self.halo:.1f}），"
+                      f"分块由{grid.nx}x{grid.ny}合并为{nx}x{ny}", RuntimeWarning, stacklevel=3)
+        rows = {name: self._front_rows(name) for name in SPECIES}
+        self.grid = TileGrid(self.width, self.height, nx, ny)
+        for name in SPECIES:
+            self._distribute(name, rows[name])
+        self._cache = {}
+
+    def _ensure_capacity(self):
+        """每块一帧后至多是拥有个体数的两倍（每个体至多一个后代），不够时扩容"""
+        for name in SPECIES:
+            rows = self._front_rows(name)
+            owned = np.bincount(self.grid.index(rows[:, 0], rows[:, 1]), minlength=len(self.grid))
+            need = 2 * int(owned.max(initial=0))
+            if need > self._data[name].shape[2]:
+                self._allocate(name, need + need // 2)
+
+    def _front_rows(self, name):
+        return self._rows(name, self.front, self.counts[name])
+
+    def _rows(self, name, buffer, counts):
+        data = self._data[name][buffer]
+        return np.concatenate([data[k, :n] for k, n in enumerate(counts.tolist())])
+
+    def _map(self, func, ctx):
+        tasks = [(k, ctx) for k in range(len(self.grid))]
+        if self._pool is not None:
+            return list(self._pool.map(func, tasks))
+        return [func(task) for task in tasks]
+
+    def update(self):
+        """所有分块并行推进一帧（三轮，接触在轮间统一结算）"""
+        self._fit_tiles()
+        self._ensure_capacity()
+        front, back = self.front, 1 - self.front
+        counts = {front: {name: self.counts[name].tolist() for name in SPECIES},
+                  back: {name: [0] * len(self.grid) for name in SPECIES}}
+        ctx = {"tick": self.tick, "entropy": self.entropy, "front": front, "counts": counts,
+               "buffers": {name: (self._shm[name].name, self._data[name].shape) for name in SPECIES},
+               "grid": self.grid, "halo": self.halo}
+
+        results = self._map(_tile_predators, ctx)
+        self._collect(counts[back], results)
+        kills = self._resolve("predators", back, "prey", front, counts, results, 1.0, ENERGY_PARAMS["hunt_gain"])
+
+        predators = self._rows("predators", back, np.array(counts[back]["predators"]))
+        ctx["any_predators"] = bool(((predators[:, ENERGY] > 0)
+                                     & (predators[:, 0] >= 0) & (predators[:, 0] <= self.width)
+                                     & (predators[:, 1] >= 0) & (predators[:, 1] <= self.height)).any())
+        results = self._map(_tile_prey, ctx)
+        self._collect(counts[back], results)
+        grazes = self._resolve("prey", back, "plants", back, counts, results,
+                               ENERGY_PARAMS["graze_bite"], ENERGY_PARAMS["graze_gain"])
+
+        results = self._map(_tile_births, ctx)
+        for name in SPECIES:
+            self.counts[name] = np.array([written[name] for written, _ in results], dtype=np.int64)
+        self.drift = max(drift for _, (drift, _) in results)
+        self.sight = max(sight for _, (_, sight) in results)
+        self.front = back
+        self.contacts = {"kills": kills, "grazes": grazes}
+        self._cache = {}
+
+        self.stats.record(self)
+        self.tick += 1
+
+    @staticmethod
+    def _collect(counts, results):
+        for k, (written, _) in enumerate(results):
+            for name, n in written.items():
+                counts[name][k] = n
+
+    def _resolve(self, eater, eater_buffer, food, food_buffer, counts, results, bite, gain):
+        """把各块报告的候选配对按全局顺序（区域编号、区域内行号）逐个认领：
+        吃到的一方能量加gain，被吃的一方每口减bite（猎物的energy为1、bite为1，即被吃掉）。
+        返回认领的次数"""
+        a_offsets = np.r_[0, np.cumsum(counts[eater_buffer][eater])]
+        b_offsets = np.r_[0, np.cumsum(counts[food_buffer][food])]
+        a = np.concatenate([a_offsets[k] + rows for k, (_, (rows, _, _)) in enumerate(results)])
+        b = np.concatenate([b_offsets[region] + rows for _, (_, region, rows) in results])
+        if a.size == 0:
+            return 0
+        a_unique, a_idx = np.unique(a, return_inverse=True)
+        b_unique, b_idx = np.unique(b, return_inverse=True)
+        b_region = np.searchsorted(b_offsets, b_unique, side="right") - 1
+        b_row = b_unique - b_offsets[b_region]
+        food_data = self._data[food][food_buffer]
+        energy = food_data[b_region, b_row, ENERGY] if food == "plants" else np.ones(b_unique.size)
+        a_idx, b_idx = serial_claims(a_idx, b_idx, energy, bite, a_unique.size)
+        a_claimed = a_unique[a_idx]
+        a_region = np.searchsorted(a_offsets, a_claimed, side="right") - 1
+        self._data[eater][eater_buffer][a_region, a_claimed - a_offsets[a_region], ENERGY] += gain
+        if food == "plants":
+            np.subtract.at(energy, b_idx, bite)  # 同一株按认领顺序逐口减少（与ArrayEnvironment相同）
+            food_data[b_region, b_row, ENERGY] = energy
+        else:
+            food_data[b_region[b_idx], b_row[b_idx], ENERGY] = 0.0  # 被吃掉的猎物能量清零，之后当作死亡
+        return int(a_idx.size)
+
+    def _species(self, name):
+        """把各块的当前个体合并成一个SpeciesArrays（每帧至多合并一次）"""
+        if name not in self._cache:
+            self._cache[name] = from_rows(self._front_rows(name), SpeciesArrays(**LAYOUT[name]))
+        return self._cache[name]
+
+    @property
+    def predators(self):
+        return self._species("predators")
+
+    @property
+    def prey(self):
+        return self._species("prey")
+
+    @property
+    def plants(self):
+        return self._species("plants")
+
+    def close(self):
+        """关闭进程池并释放共享内存（之后仍可读取最后一帧的predators等）"""
+        for name in SPECIES:
+            if name in self._data:
+                self._species(name)
+                self._release(name)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,237 @@
+"""参数扫描与重复实验：把多组配置 × 多个随机种子的独立运行分发到进程池，
+每跑完一次就把摘要（灭绝帧、最终数量、平均基因）追加到同一张CSV结果表
+
+配置文件为JSON，例如：
+    {
+        "base": {"ticks": 2000, "engine": "arrays"},
+        "grid": {"n_predators": [5, 10, 20], "energy.metabolism": [0.2, 0.3]},
+        "replicates": 20,
+        "seed": 42
+    }
+也可以用 "configs": [{...}, {...}] 直接列出配置。带点号的键表示嵌套参数：
+"energy.<名字>" 覆盖ENERGY_PARAMS，"genes.<基因>" 覆盖GENE_RANGES（取值为[下限, 上限]）。
+
+"engine"可取objects/arrays/tiled（命令行--engine覆盖所有配置）；tiled在每个任务里按分块依次推进，
+不再嵌套进程池。--ensemble只支持arrays引擎的配置（集合引擎的规则与arrays引擎相同），其他组合直接报错。
+
+用法：
+    python 参数扫描.py sweep.json --workers 8 --output results.csv
+    python 参数扫描.py sweep.json --ensemble   # 同一配置的所有重复实验放进一个集合引擎一起推进
+"""
+import argparse
+import copy
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from 基因与状态 import ENERGY_PARAMS, GENE_PARAMS, GENE_RANGES
+from 批量运行 import ENGINES, make_environment, run, summarize
+
+# 单次运行的默认配置
+DEFAULT_CONFIG = {
+    "engine": "objects",
+    "width": 1100,
+    "height": 600,
+    "ticks": 1000,
+    "n_predators": 10,
+    "n_prey": 50,
+    "n_plants": 70,
+    "n_obstacles": 10,
+    "energy": {},
+    "genes": {},
+}
+
+# 进程池里的工作进程会被复用，每次运行前先恢复模块级参数的默认值
+_DEFAULT_ENERGY = dict(ENERGY_PARAMS)
+_DEFAULT_GENES = dict(GENE_RANGES)
+
+RESULT_COLUMNS = (
+    ["config", "replicate", "seed", "ticks", "extinction_tick", "predators", "prey", "plants"]
+    + [f"{name}_{param}" for name in ("predators", "prey") for param in GENE_PARAMS]
+    + ["elapsed", "params"]
+)
+
+
+def _set_nested(config, key, value):
+    """把 "energy.metabolism" 这样的点号键写进嵌套字典"""
+    *parents, last = key.split(".")
+    target = config
+    for name in parents:
+        target = target.setdefault(name, {})
+    target[last] = value
+
+
+def build_config(overrides):
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    for key, value in overrides.items():
+        _set_nested(config, key, value)
+    return config
+
+
+def expand_grid(grid, base=None):
+    """笛卡尔积展开参数网格，返回完整配置列表"""
+    keys = list(grid)
+    configs = []
+    for values in itertools.product(*(grid[key] for key in keys)):
+        overrides = dict(base or {})
+        overrides.update(zip(keys, values))
+        configs.append(build_config(overrides))
+    return configs
+
+
+def run_seed(base_seed, config_index, replicate):
+    """由(基础种子, 配置序号, 重复序号)确定性地派生单次运行的种子，与调度顺序无关"""
+    return int(np.random.SeedSequence([base_seed, config_index, replicate]).generate_state(1)[0])
+
+
+def apply_config(config):
+    """把配置里的能量常数和基因范围写入模块级参数（在工作进程内调用）"""
+    ENERGY_PARAMS.clear()
+    ENERGY_PARAMS.update(_DEFAULT_ENERGY)
+    ENERGY_PARAMS.update(config["energy"])
+    GENE_RANGES.clear()
+    GENE_RANGES.update(_DEFAULT_GENES)
+    GENE_RANGES.update({param: tuple(bounds) for param, bounds in config["genes"].items()})
+
+
+def check_configs(configs, ensemble=False):
+    """检查引擎与运行方式的组合，不支持时抛出ValueError（不静默改用别的引擎）"""
+    for i, config in enumerate(configs):
+        engine = config["engine"]
+        if engine not in ENGINES:
+            raise ValueError(f"配置{i}: 未知引擎 {engine}（可选 {'/'.join(ENGINES)}）")
+        if ensemble and engine != "arrays":
+            raise ValueError(f"配置{i}: --ensemble只支持arrays引擎（集合引擎的规则与arrays相同），"
+                             f"该配置为{engine}；可用 --engine arrays 覆盖")
+
+
+def run_one(job):
+    """工作进程入口：跑一次完整模拟并返回一行结果"""
+    config_index, replicate, seed, config = job
+    apply_config(config)
+    begin = time.perf_counter()
+    # 扫描已经每个任务占一个进程，tiled引擎在本进程内依次推进各块（workers=0），不再嵌套进程池
+    options = {"workers": 0} if config["engine"] == "tiled" else {}
+    env = make_environment(config["engine"], config["width"], config["height"], seed=seed, **options)
+    try:
+        env.add_individuals(n_predators=config["n_predators"], n_prey=config["n_prey"],
+                            n_plants=config["n_plants"], n_obstacles=config["n_obstacles"])
+        ticks = run(env, config["ticks"])
+        row = summarize(env, ticks)
+    finally:
+        if hasattr(env, "close"):
+            env.close()  # 分块引擎：释放共享内存（close之后仍可读取最后一帧）
+    row.update(config=config_index, replicate=replicate, seed=seed,
+               elapsed=round(time.perf_counter() - begin, 4),
+               params=json.dumps(config, sort_keys=True, ensure_ascii=False))
+    return row
+
+
+def run_ensemble(job):
+    """工作进程入口（--ensemble）：一个配置的全部重复实验作为集合引擎里的各个世界一起推进。
+    世界灭绝时记下它当时的摘要并移除其个体，与run_one的提前停止一致。
+    只用于arrays引擎的配置（由check_configs检查）。返回结果行的列表"""
+    from 集合引擎 import EnsembleEnvironment
+
+    config_index, replicates, seeds, config = job
+    apply_config(config)
+    begin = time.perf_counter()
+    env = EnsembleEnvironment(len(seeds), config["width"], config["height"], seeds=seeds)
+    env.add_individuals(n_predators=config["n_predators"], n_prey=config["n_prey"],
+                        n_plants=config["n_plants"], n_obstacles=config["n_obstacles"])
+    summaries = [None] * len(seeds)
+    done = np.zeros(len(seeds), dtype=bool)
+    for _ in range(config["ticks"]):
+        env.update()
+        ended = env.extinct() & ~done
+        if ended.any():
+            for k, summary in zip(np.flatnonzero(ended).tolist(), env.summaries(np.flatnonzero(ended))):
+                summaries[k] = summary
+            env.retire(ended)
+            done |= ended
+            if done.all():
+                break
+    for k, summary in zip(np.flatnonzero(~done).tolist(), env.summaries(np.flatnonzero(~done))):
+        summaries[k] = summary
+    elapsed = round((time.perf_counter() - begin) / len(seeds), 4)  # 平均到每个世界
+    params = json.dumps(config, sort_keys=True, ensure_ascii=False)
+    for summary, replicate, seed in zip(summaries, replicates, seeds):
+        summary.update(config=config_index, replicate=replicate, seed=seed, elapsed=elapsed, params=params)
+    return summaries
+
+
+def sweep(configs, replicates=1, base_seed=0, workers=None, output="results.csv", ensemble=False):
+    """把 配置数 × 重复次数 个独立运行分发到进程池，结果边完成边写入output。
+    ensemble为True时每个配置是一个任务，其重复实验在同一个集合引擎里批量推进"""
+    check_configs(configs, ensemble)
+    if ensemble:
+        jobs = [(i, list(range(replicates)), [run_seed(base_seed, i, r) for r in range(replicates)], config)
+                for i, config in enumerate(configs)]
+        entry = run_ensemble
+    else:
+        jobs = [(i, r, run_seed(base_seed, i, r), config)
+                for i, config in enumerate(configs) for r in range(replicates)]
+        entry = run_one
+    with open(output, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = [pool.submit(entry, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                result = future.result()
+                writer.writerows(result if ensemble else [result])
+                f.flush()
+                print(f"\r{done}/{len(jobs)}", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return len(configs) * replicates
+
+
+def load_spec(path):
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    base = spec.get("base", {})
+    if "configs" in spec:
+        configs = [build_config({**base, **overrides}) for overrides in spec["configs"]]
+    else:
+        configs = expand_grid(spec.get("grid", {}), base)
+    return configs, spec.get("replicates", 1), spec.get("seed", 0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行参数扫描与重复实验")
+    parser.add_argument("spec", help="扫描配置JSON文件")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认全部CPU核）")
+    parser.add_argument("--replicates", type=int, default=None, help="覆盖配置文件中的重复次数")
+    parser.add_argument("--seed", type=int, default=None, help="覆盖配置文件中的基础种子")
+    parser.add_argument("--output", default="results.csv")
+    parser.add_argument("--engine", choices=ENGINES, default=None, help="覆盖所有配置的engine")
+    parser.add_argument("--ensemble", action="store_true",
+                        help="每个配置的重复实验放进一个集合引擎批量推进（仅arrays引擎，见集合引擎.py）")
+    args = parser.parse_args(argv)
+
+    configs, replicates, base_seed = load_spec(args.spec)
+    if args.engine is not None:
+        for config in configs:
+            config["engine"] = args.engine
+    try:
+        check_configs(configs, args.ensemble)
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.replicates is not None:
+        replicates = args.replicates
+    if args.seed is not None:
+        base_seed = args.seed
+    begin = time.perf_counter()
+    n = sweep(configs, replicates, base_seed, args.workers, args.output, args.ensemble)
+    print(f"{n} runs in {time.perf_counter() - begin:.1f}s -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""后台模拟：Environment在单独的进程里全速推进，把各物种的坐标写进共享内存里的双缓冲快照，
+pygame主循环只按显示帧率取最新的快照绘制。慢的update()不再卡住窗口事件处理，
+显示的clock.tick也不再给模拟限速。
+
+双缓冲协议：工作进程总是写后缓冲，写完后持锁把前后缓冲对调并递增序号；
+主进程持锁把前缓冲拷出来（很快），所以两边不会同时读写同一块缓冲。
+个体数超过容量时工作进程换一块更大的共享内存（代号加一），主进程看到新代号再重新打开。
+
+工作进程出错时把traceback发回主进程，主进程在等待启动和每次取快照时检查进程是否还活着，
+异常退出则抛出WorkerError（带工作进程的traceback）；关闭时由主进程兜底删除共享内存，
+工作进程被强制结束或崩溃时也不会留下残块。
+"""
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from 基因与状态 import Rock
+from 事件记录 import Frame
+from 统计 import SPECIES
+
+# 共享头部各字段的下标
+GENERATION, CAPACITY, FRONT, SEQ, TICK = range(5)
+COUNTS = slice(5, 5 + len(SPECIES))
+HEADER_SIZE = 5 + len(SPECIES)
+
+
+def _xy(species):
+    """一个物种的坐标，兼容对象列表和结构数组（结构数组里尚未清理的nan个体不要）"""
+    if hasattr(species, "x"):
+        finite = np.isfinite(species.x) & np.isfinite(species.y)
+        return species.x[finite], species.y[finite]
+    n = len(species)
+    return (np.fromiter((ind.x for ind in species), dtype=float, count=n),
+            np.fromiter((ind.y for ind in species), dtype=float, count=n))
+
+
+def _block_name(prefix, generation):
+    return f"{prefix}_{generation}"
+
+
+class WorkerError(RuntimeError):
+    """后台模拟进程异常退出（消息里带工作进程的traceback）"""
+
+
+def _run(prefix, header, consumed, allowed, progress, stop, meta, errors, config):
+    """工作进程入口：出错时把traceback发回主进程再退出"""
+    try:
+        _simulate(prefix, header, consumed, allowed, progress, stop, meta, config)
+    except BaseException:
+        errors.put(traceback.format_exc())
+        raise
+
+
+def _simulate(prefix, header, consumed, allowed, progress, stop, meta, config):
+    """建环境，循环推进并在主进程取走上一份快照后发布新快照"""
+    from 批量运行 import make_environment
+
+    block = None
+    back = 0
+    dirty = True  # 有还没发布的新状态
+    try:
+        env = make_environment(config["engine"], config["width"], config["height"], seed=config["seed"])
+        env.add_individuals(**config["populations"])
+        meta.put({"width": env.width, "height": env.height,
+                  "obstacles": [[rock.x, rock.y, rock.radius] for rock in env.obstacles]})
+        while not stop.is_set():
+            limit = allowed.value
+            if limit < 0 or env.tick < limit:
+                env.update()
+                progress.value = env.tick
+                dirty = True
+            if dirty and consumed.value == header[SEQ]:
+                block, back = _publish(env, prefix, header, block, back)
+                dirty = False
+            elif 0 <= limit <= env.tick:
+                time.sleep(0.001)  # 已达到主进程允许的帧数，等下一显示帧
+    finally:
+        if block is not None:
+            block.close()
+            block.unlink()
+
+
+def _publish(env, prefix, header, block, back):
+    """把当前坐标写进后缓冲，然后持锁对调前后缓冲。返回 (共享内存块, 新的后缓冲下标)"""
+    coords = [_xy(getattr(env, name)) for name in SPECIES]
+    total = sum(len(xs) for xs, _ in coords)
+    capacity = header[CAPACITY]
+    old = None
+    if block is None or total > capacity:
+        # 换一块更大的共享内存：两个缓冲，每个capacity行 (x, y)
+        capacity = max(2 * total, 1024)
+        generation = header[GENERATION] + 1
+        old = block
+        block = shared_memory.SharedMemory(name=_block_name(prefix, generation), create=True,
+                                           size=2 * capacity * 2 * 4)
+    else:
+        generation = header[GENERATION]
+    buffers = np.ndarray((2, capacity, 2), dtype=np.float32, buffer=block.buf)
+    offset = 0
+    for xs, ys in coords:
+        buffers[back, offset:offset + len(xs), 0] = xs
+        buffers[back, offset:offset + len(xs), 1] = ys
+        offset += len(xs)
+    del buffers
+    with header.get_lock():
+        header[GENERATION] = generation
+        header[CAPACITY] = capacity
+        header[FRONT] = back
+        header[SEQ] += 1
+        header[TICK] = env.tick
+        header[COUNTS] = [len(xs) for xs, _ in coords]
+    if old is not None:
+        # 主进程只会在持锁时打开头部记录的代号，发布之后旧块就不会再被打开了
+        old.close()
+        old.unlink()
+    return block, 1 - back
+
+
+class PositionArrays:
+    """快照里一个物种的坐标（x、y为数组），可以直接交给渲染.positions"""
+
+    def __init__(self, xy):
+        self.x = xy[:, 0]
+        self.y = xy[:, 1]
+
+    def __len__(self):
+        return len(self.x)
+
+
+class SimulationWorker:
+    """在后台进程里运行的模拟。ticks_per_frame为每个显示帧最多推进的模拟帧数，0为不限（全速）。
+
+    用法：
+        with SimulationWorker(width=1100, height=600, seed=1) as worker:
+            frame = worker.latest()   # 事件记录.Frame：predators/prey/plants/obstacles/width/height
+    """
+
+    def __init__(self, engine="objects", width=1100, height=600, seed=None,
+                 populations=None, n_obstacles=10, ticks_per_frame=0):
+        self.config = {
+            "engine": engine, "width": width, "height": height, "seed": seed,
+            "populations": dict(populations or {"n_predators": 10, "n_prey": 50, "n_plants": 70},
+                                n_obstacles=n_obstacles),
+        }
+        self.ticks_per_frame = ticks_per_frame
+        # spawn：工作进程不继承主进程的pygame/显示状态
+        self._ctx = multiprocessing.get_context("spawn")
+        self._prefix = f"popsim_{os.getpid()}_{id(self):x}"
+        self._header = self._ctx.Array("q", HEADER_SIZE)  # 自带锁
+        self._consumed = self._ctx.Value("q", 0, lock=False)  # 主进程取走的最新序号
+        self._allowed = self._ctx.Value("q", -1, lock=False)  # 工作进程可推进到的帧，-1为不限
+        self._progress = self._ctx.Value("q", 0, lock=False)  # 工作进程当前的帧
+        self._stop = self._ctx.Event()
+        self._meta = self._ctx.Queue()
+        self._errors = self._ctx.Queue()  # 工作进程出错时的traceback
+        self._process = None
+        self._block = None
+        self._generation = 0
+        self.world = None  # 工作进程建好环境后发回的世界大小和障碍物
+
+    def start(self, timeout=60):
+        self._allowed.value = self.ticks_per_frame if self.ticks_per_frame > 0 else -1
+        self._process = self._ctx.Process(
+            target=_run, daemon=True,
+            args=(self._prefix, self._header, self._consumed, self._allowed, self._progress,
+                  self._stop, self._meta, self._errors, self.config))
+        self._process.start()
+        deadline = time.monotonic() + timeout
+        while self.world is None:
+            # 分段等待：建环境时工作进程就出错退出的话不必等到超时
+            try:
+                self.world = self._meta.get(timeout=0.1)
+            except queue.Empty:
+                if not self._process.is_alive():
+                    error = self._failure()
+                    self.close()  # __enter__抛出时不会调用__exit__
+                    raise error from None
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise TimeoutError(f"后台模拟进程{timeout}秒内没有建好环境") from None
+        self._obstacles = [Rock(x=x, y=y, radius=int(r)) for x, y, r in self.world["obstacles"]]
+        return self
+
+    def latest(self):
+        """最新发布的快照（拷贝出来的，之后工作进程怎么写都不影响它）；还没有快照时返回None。
+        每个显示帧调用一次：ticks_per_frame限速时，同时允许工作进程再推进ticks_per_frame帧。
+        工作进程已经异常退出时抛出WorkerError"""
+        if not self._process.is_alive():
+            raise self._failure()
+        header = self._header
+        with header.get_lock():
+            values = header[:]
+            if values[SEQ] == 0:
+                return None
+            if values[GENERATION] != self._generation:
+                if self._block is not None:
+                    self._block.close()
+                self._block = shared_memory.SharedMemory(name=_block_name(self._prefix, values[GENERATION]))
+                self._generation = values[GENERATION]
+            counts = values[COUNTS]
+            buffers = np.ndarray((2, values[CAPACITY], 2), dtype=np.float32, buffer=self._block.buf)
+            data = buffers[values[FRONT], :sum(counts)].copy()
+            del buffers
+        self._consumed.value = values[SEQ]
+        if self.ticks_per_frame > 0:
+            # 额度不累积：工作进程跟不上时不会在之后一口气补跑
+            allowed = self._allowed.value
+            base = self._progress.value if allowed < 0 else min(allowed, self._progress.value)
+            self._allowed.value = base + self.ticks_per_frame
+        species = []
+        offset = 0
+        for count in counts:
+            species.append(PositionArrays(data[offset:offset + count]))
+            offset += count
+        return Frame(values[TICK], species, self._obstacles, self.world["width"], self.world["height"])
+
+    def set_ticks_per_frame(self, n):
+        """运行中修改每显示帧最多推进的模拟帧数（0为不限）"""
+        self.ticks_per_frame = n
+        if n <= 0:
+            self._allowed.value = -1
+
+    def is_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def _failure(self):
+        """工作进程已退出：带上它发回的traceback（被信号杀死时没有）"""
+        try:
+            trace = self._errors.get(timeout=1)
+        except queue.Empty:
+            trace = None
+        message = f"后台模拟进程意外退出（exitcode {self._process.exitcode}）"
+        return WorkerError(message + ("\n" + trace if trace else ""))
+
+    def close(self):
+        try:
+            if self._process is not None:
+                self._stop.set()
+                self._process.join(timeout=10)
+                if self._process.is_alive():
+                    self._process.terminate()
+                    self._process.join()
+                self._process = None
+        finally:
+            if self._block is not None:
+                self._block.close()
+                self._block = None
+            self._unlink_blocks()
+
+    def _unlink_blocks(self):
+        """删除工作进程没来得及删除的共享内存：当前代号的块，以及被结束时可能刚建好、还没发布的下一块"""
+        generation = self._header[GENERATION]
+        for name in (_block_name(self._prefix, generation), _block_name(self._prefix, generation + 1)):
+            try:
+                block = shared_memory.SharedMemory(name=name)
+            except FileNotFoundError:
+                continue  # 工作进程正常退出时已经删除
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
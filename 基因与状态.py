@@ -1,5 +1,9 @@
+import math
+from array import array
+
 import numpy as np
-import random
+
+from 随机数 import default_stream
 
 # 基因参数示例（可扩展）
 GENE_PARAMS = [
@@ -9,43 +13,111 @@ GENE_PARAMS = [
     "reproduction_rate"# 繁殖所需能量阈值的比例
 ]
 
+# 基因数组中各参数的下标
+MAX_SPEED, PERCEPTION, AGGRESSION, REPRODUCTION_RATE = range(len(GENE_PARAMS))
+
+# 初始随机基因的取值范围（与GENE_PARAMS顺序一致）
+GENE_RANGES = {
+    "max_speed": (1.2, 2),
+    "perception": (10.0, 15.0),
+    "aggression": (0.5, 2.0),
+    "reproduction_rate": (0.5, 2.0),
+}
+
+# 能量相关常数（两种引擎共用，参数扫描时可整体调整）
+ENERGY_PARAMS = {
+    "initial_energy": 100,          # 动物初始能量
+    "metabolism": 0.2,              # 每帧基础代谢消耗
+    "reproduce_energy": 200,        # 动物繁殖所需能量
+    "hunt_gain": 100,               # 捕获一只猎物获得的能量
+    "graze_gain": 20,               # 吃一口植物获得的能量
+    "graze_bite": 15,               # 植物每被吃一口损失的能量
+    "plant_initial_energy": 50,     # 植物初始能量
+    "plant_growth": 0.1,            # 植物每帧光合作用增加的能量
+    "plant_max_energy": 100,        # 植物能量上限
+    "plant_reproduce_energy": 80,   # 植物繁殖所需能量
+}
+
 class Individual:
-    def __init__(self, x, y, genes=None, is_predator=False):
+    # __slots__：不再为每个个体分配__dict__；基因是按GENE_PARAMS顺序排列的定长float数组
+    __slots__ = ("x", "y", "vx", "vy", "energy", "age", "dead", "genes")
+    is_predator = False  # 是否是捕食者（同类个体相同，放在类上）
+    clamp_to_world = False  # 随机移动后是否把位置限制在世界范围内（被捕食者的_random_move会）
+    radius = 5  # 默认碰撞半径（可调整）
+    energy_key = "initial_energy"  # 新个体初始能量在ENERGY_PARAMS中的键
+
+    def __init__(self, x, y, genes=None, rng=None, mutate=True):
+        # rng为随机流（RandomStream），通常是所在Environment的env.random
+        # genes为按GENE_PARAMS顺序的基因序列（array('d')、列表或NumPy行均可）
+        rng = rng or default_stream
         self.x = x  # 位置x
         self.y = y  # 位置y
-        self.energy = 100  # 初始能量
-        self.is_predator = is_predator  # 是否是捕食者
+        self.energy = ENERGY_PARAMS[self.energy_key]  # 初始能量
         self.age = 0  # 年龄（可选，用于自然死亡）
-        self.radius = 5  # 默认碰撞半径（可调整）
-        if genes and "radius" in genes:
-            self.radius = genes["radius"]
+        self.dead = False  # 本帧内被吃掉等死亡标记（帧末统一移除）
         
         # 基因：若未指定则随机生成，否则继承（带变异）
         if genes is None:
-            self.genes = {"max_speed": random.uniform(1.2, 2),  
-                    "perception": random.uniform(10.0, 15.0),  
-                    "aggression": random.uniform(0.5, 2.0),
-                    "reproduction_rate": random.uniform(0.5, 2.0)}
+            self.genes = array("d", [rng.uniform(*GENE_RANGES[param]) for param in GENE_PARAMS])
+        elif mutate:
+            self.genes = self.mutate(genes, rng)  # 继承并变异
         else:
-            self.genes = self.mutate(genes)  # 继承并变异
-        
-        # 计算实际属性（由基因决定）
-        self.max_speed = self.genes["max_speed"] * (1.5 if is_predator else 1.0)  # 捕食者更快
-        self.perception = self.genes["perception"] * (1.5 if is_predator else 1.0)  # 捕食者感知更远
-        self.aggression = self.genes["aggression"]
-        self.vx = random.uniform(-self.max_speed/2, self.max_speed/2)
-        self.vy = random.uniform(-self.max_speed/2, self.max_speed/2)
-        #self.velocity = np.array([self.vx, self.vy])
-    def mutate(self, genes):
-        """基因变异：小概率调整参数"""
-        mutated = genes.copy()
-        for param in mutated:
-            if random.random() < 0.05:  # 5%变异概率
-                mutated[param] *= random.uniform(0.8, 1.2)  # 参数波动±20%
+            self.genes = array("d", genes)  # 已经批量生成/变异过的基因
+        
+        max_speed = self.max_speed
+        self.vx = rng.uniform(-max_speed/2, max_speed/2)
+        self.vy = rng.uniform(-max_speed/2, max_speed/2)
+
+    # 实际属性由基因决定，按需计算而不在每个个体上另存一份
+    @property
+    def max_speed(self):
+        return self.genes[MAX_SPEED] * (1.5 if self.is_predator else 1.0)  # 捕食者更快
+
+    @property
+    def perception(self):
+        return self.genes[PERCEPTION] * (1.5 if self.is_predator else 1.0)  # 捕食者感知更远
+
+    @property
+    def aggression(self):
+        return self.genes[AGGRESSION]
+
+    @classmethod
+    def spawn(cls, xs, ys, genes, rng):
+        """整批创建个体：xs/ys为坐标数组，genes为 (个体数, 基因数) 矩阵（原样使用，
+        不再变异），rng为NumPy Generator，初速度一次抽样。跳过__init__逐个抽随机数"""
+        half = genes[:, MAX_SPEED] * (1.5 if cls.is_predator else 1.0) / 2
+        vxs = rng.uniform(-half, half)
+        vys = rng.uniform(-half, half)
+        energy = ENERGY_PARAMS[cls.energy_key]
+        # 整个基因矩阵先转成一个array('d')，每个个体切一段（比逐行构造快）
+        flat = array("d")
+        flat.frombytes(np.ascontiguousarray(genes, dtype=float).tobytes())
+        k = len(GENE_PARAMS)
+        individuals = []
+        for i, (x, y, vx, vy) in enumerate(zip(xs.tolist(), ys.tolist(), vxs.tolist(), vys.tolist())):
+            ind = cls.__new__(cls)
+            ind.x = x
+            ind.y = y
+            ind.vx = vx
+            ind.vy = vy
+            ind.energy = energy
+            ind.age = 0
+            ind.dead = False
+            ind.genes = flat[i * k:(i + 1) * k]
+            individuals.append(ind)
+        return individuals
+
+    def mutate(self, genes, rng=None):
+        """基因变异：小概率调整参数，返回新的基因数组"""
+        rng = rng or default_stream
+        mutated = array("d", genes)
+        for i in range(len(mutated)):
+            if rng.random() < 0.05:  # 5%变异概率
+                mutated[i] *= rng.uniform(0.8, 1.2)  # 参数波动±20%
         return mutated
     
-    def move(self, environment):
-        """根据环境决策移动（需子类实现）"""
+    def move(self, environment, *views):
+        """根据环境和本阶段的存活快照决策移动（需子类实现）"""
         
         raise NotImplementedError
     
@@ -53,42 +125,59 @@ class Individual:
     
     def update(self):
         """更新状态（消耗能量、年龄增长）"""
-        self.energy -= 0.2  # 基础代谢消耗
+        self.energy -= ENERGY_PARAMS["metabolism"]  # 基础代谢消耗
         self.age += 1
     
     def can_reproduce(self):
         """是否满足繁殖条件（能量足够）"""
-        return self.energy > 200  # 示例阈值
+        return self.energy > ENERGY_PARAMS["reproduce_energy"]
+    
+    def coast(self, environment):
+        """低细节更新（见细节层次.py）：感知范围内没有其他个体时走的就是_random_move分支，
+        这里照旧做触墙反弹、障碍物碰撞和两次位移，只是不逐帧随机转向、不查邻域，全部标量运算"""
+        radius = self.radius
+        width, height = environment.width, environment.height
+        if self.x - radius < 0 or self.x + radius > width:
+            self.vx = -self.vx
+        if self.y - radius < 0 or self.y + radius > height:
+            self.vy = -self.vy
+        self.x = min(max(self.x, radius), width - radius)
+        self.y = min(max(self.y, radius), height - radius)
+        self.handle_collision(environment)
+        self.x += self.vx
+        self.y += self.vy
+        if self.clamp_to_world:
+            self.x = min(max(self.x, 0), width)
+            self.y = min(max(self.y, 0), height)
+    
+    def turn(self, angle):
+        """速度方向旋转angle弧度（速率不变）"""
+        c, s = math.cos(angle), math.sin(angle)
+        self.vx, self.vy = self.vx * c - self.vy * s, self.vx * s + self.vy * c
     
     
     
 class Predator(Individual):
-    def __init__(self, x, y, genes=None):
-        super().__init__(x, y, genes, is_predator=True)
-        self.radius = 11  # 稍大的碰撞半径
+    __slots__ = ()
+    is_predator = True
+    radius = 11  # 稍大的碰撞半径
     
-    def move(self, environment):
-        """决策：向最近的被捕食者移动"""
+    def move(self, environment, prey):
+        """决策：向最近的被捕食者移动（prey为本阶段猎物快照）"""
         self._check_wall_collision(environment)
         self.handle_collision(environment)
-        prey_list = [p for p in environment.prey if environment.is_alive(p)]
-        if not prey_list:
-            # 没有猎物时随机移动
-            self._random_move(environment)
-            return
-        
-        # 找到最近的猎物
-        target = min(prey_list, key=lambda p: np.hypot(self.x - p.x, self.y - p.y))
+        # 找到感知范围内最近的猎物（空间索引只检查附近的格子）
+        target, _ = prey.nearest(self.x, self.y, self.perception)
        
-        dx = target.x - self.x
-        dy = target.y - self.y
-        dist = np.hypot(dx, dy)
-       
-        if dist < self.perception:
+        if target is not None:
+            dx = target.x - self.x
+            dy = target.y - self.y
+            dist = np.hypot(dx, dy)
+            
             # 向猎物移动（速度受攻击性影响）
             # ✅ 1. 控制转向幅度：每帧最多转max_turn弧度（约5.7度，可调整）
             max_turn = 0.1  # 转向灵活度：值越小越“执着”当前方向，值越大越容易转向
-            angle_change = random.uniform(-max_turn, max_turn)
+            angle_change = environment.random.uniform(-max_turn, max_turn)
             
             # ✅ 2. 将当前速度转换为极坐标（角度+速率）
             current_angle = np.arctan2(self.vy, self.vx)  # 当前运动方向（弧度）
@@ -132,29 +221,26 @@ class Predator(Individual):
         """
         处理与单个障碍物的碰撞反弹
         """
-        self.velocity = np.array([self.vx, self.vy]) # 当前速率
         # 计算个体中心与障碍物中心的相对位置
         dx = next_pos[0] - obstacle.x
         dy = next_pos[1] - obstacle.y
-        distance = np.hypot(dx, dy)
-        
-        # # 计算法线方向（从障碍物指向个体）
-       
-        normal = np.array([-dx, -dy]) / distance
+        distance = math.hypot(dx, dy)
         
-        # 计算切线方向（垂直于法线）
-        tangent = np.array([-normal[1], normal[0]])
+        # 计算法线方向（标量运算，不再为每次反弹分配NumPy数组）
+        nx = -dx / distance
+        ny = -dy / distance
         
-        # 分解速度为法线和切线方向的分量
-        v_normal = np.dot(self.velocity, normal) * normal
-        v_tangent = np.dot(self.velocity, tangent) * tangent
+        # 分解速度：法线分量v_n·n，切线方向为(-ny, nx)
+        v_n = self.vx * nx + self.vy * ny
+        v_t = -self.vx * ny + self.vy * nx
         
-        # # 反弹：法线分量反向，切线分量保留（摩擦力可忽略）
-        self.vx, self.vy = v_tangent - v_normal
+        # 反弹：法线分量反向，切线分量保留（摩擦力可忽略）
+        self.vx = -v_t * ny - v_n * nx
+        self.vy = v_t * nx - v_n * ny
         
         # 调整位置防止穿透
-        self.x = next_pos[0] - normal[0] * self.radius * 0.1
-        self.y = next_pos[1] - normal[1] * self.radius * 0.1
+        self.x = next_pos[0] - nx * self.radius * 0.1
+        self.y = next_pos[1] - ny * self.radius * 0.1
 
     def handle_collision(self, environment):
         next_x = self.x + self.vx
@@ -162,11 +248,8 @@ class Predator(Individual):
         
         # 检查是否与障碍物碰撞
         
-        collided_obs = None
-        for obs in environment.obstacles:
-            if obs.collides_with(next_x, next_y, self.radius):
-                collided_obs = obs
-                break
+        # 查预先栅格化的障碍物距离场，O(1)
+        collided_obs = environment.obstacle_map.first_collision(next_x, next_y, self.radius)
         
         if collided_obs:
             self._handle_obstacle_collision(environment, collided_obs, (next_x, next_y))
@@ -185,7 +268,7 @@ class Predator(Individual):
         """平滑的随机运动：保持惯性，仅小幅度调整方向"""
         # ✅ 1. 控制转向幅度：每帧最多转max_turn弧度（约5.7度，可调整）
         max_turn = 0.1  # 转向灵活度：值越小越“执着”当前方向，值越大越容易转向
-        angle_change = random.uniform(-max_turn, max_turn)
+        angle_change = environment.random.uniform(-max_turn, max_turn)
         
         # ✅ 2. 将当前速度转换为极坐标（角度+速率）
         current_angle = np.arctan2(self.vy, self.vx)  # 当前运动方向（弧度）
@@ -207,51 +290,42 @@ class Predator(Individual):
        
         
     
-    def check_hunt(self, environment):
-        """检查是否捕获猎物"""
-        for prey in environment.prey[:]:  # 遍历副本避免修改原列表
-            if environment.is_alive(prey):
-                dist = np.hypot(self.x - prey.x, self.y - prey.y)
-                if dist < 1.0:  # 捕获距离
-                    self.energy += 100  # 获得能量
-                    environment.remove_individual(prey)
-                    return
-    def reproduce(self):
+    def reproduce(self, rng=None):
         """繁殖后代（返回新个体）"""
+        rng = rng or default_stream
         self.energy /= 2  # 繁殖消耗能量
         return Predator(
-            x=self.x + random.uniform(-1, 1),  # 后代出生在附近
-            y=self.y + random.uniform(-1, 1),
-            genes=self.genes
+            x=self.x + rng.uniform(-1, 1),  # 后代出生在附近
+            y=self.y + rng.uniform(-1, 1),
+            genes=self.genes,
+            rng=rng
         )
 
 
 class Prey(Individual):
-    def __init__(self, x, y, genes=None):
-        super().__init__(x, y, genes, is_predator=False)
-        self.eating_range = self.genes.get("eat_range", 15.0)  # 能检测到植物的范围
-        self.plant_seek_aggression = self.genes.get("seek_plant", 1.1)  # 寻找植物的积极性
+    __slots__ = ()
+    clamp_to_world = True
+    eating_range = 15.0  # 能检测到植物的范围
+    plant_seek_aggression = 1.1  # 寻找植物的积极性
     
-    def move(self, environment):
-        """决策：逃避最近的捕食者"""
+    def move(self, environment, predators, plants):
+        """决策：逃避最近的捕食者（predators为本阶段快照，plants为常驻的植物索引）"""
         self._check_wall_collision(environment)
         self.handle_collision(environment)
-        predators = [p for p in environment.predators if environment.is_alive(p)]
-        plants = [p for p in environment.plants if environment.is_alive(p)]
-        if not predators:
+        if not len(predators):
             # 没有捕食者时随机移动（或寻找食物，可扩展）
             self._random_move(environment)
             return
         
-        # 找到最近的捕食者和食物
-        threat = min(predators, key=lambda p: np.hypot(self.x - p.x, self.y - p.y))
-        dx = self.x - threat.x
-        dy = self.y - threat.y
-        dist = np.hypot(dx, dy)
-        
+        # 找到感知范围内最近的捕食者
+        threat, _ = predators.nearest(self.x, self.y, self.perception)
         
 
-        if dist < self.perception:
+        if threat is not None:
+            dx = self.x - threat.x
+            dy = self.y - threat.y
+            dist = np.hypot(dx, dy)
+
             # 关键修正：检查距离是否过小
             if dist < 1e-6:
                 self._random_move(environment)  # 随机移动代替逃跑
@@ -259,7 +333,7 @@ class Prey(Individual):
                 # 向猎物移动（速度受攻击性影响）
                 # ✅ 1. 控制转向幅度：每帧最多转max_turn弧度（约5.7度，可调整）
                 max_turn = 0.1  # 转向灵活度：值越小越“执着”当前方向，值越大越容易转向
-                angle_change = random.uniform(-max_turn, max_turn)
+                angle_change = environment.random.uniform(-max_turn, max_turn)
                 
                 # ✅ 2. 将当前速度转换为极坐标（角度+速率）
                 current_angle = np.arctan2(self.vy, self.vx)  # 当前运动方向（弧度）
@@ -285,11 +359,11 @@ class Prey(Individual):
                 # self.y = np.clip(self.y, 0, environment.height)
                 
         else:
-            target_plant = min(plants, key=lambda p: np.hypot(self.x - p.x, self.y - p.y))
-            dx = target_plant.x - self.x
-            dy = target_plant.y - self.y
-            dist = np.hypot(dx, dy)
-            if dist < self.eating_range:
+            target_plant, _ = plants.nearest(self.x, self.y, self.eating_range)
+            if target_plant is not None:
+                dx = target_plant.x - self.x
+                dy = target_plant.y - self.y
+                dist = np.hypot(dx, dy)
                 # if dist < 1e-6:
                 #     self._random_move(environment)  # 随机移动代替逃跑
                 #else:
@@ -340,11 +414,8 @@ class Prey(Individual):
         
         # 检查是否与障碍物碰撞
         
-        collided_obs = None
-        for obs in environment.obstacles:
-            if obs.collides_with(next_x, next_y, self.radius):
-                collided_obs = obs
-                break
+        # 查预先栅格化的障碍物距离场，O(1)
+        collided_obs = environment.obstacle_map.first_collision(next_x, next_y, self.radius)
         
         if collided_obs:
             self._handle_obstacle_collision(environment, collided_obs, (next_x, next_y))
@@ -359,29 +430,26 @@ class Prey(Individual):
         """
         处理与单个障碍物的碰撞反弹
         """
-        self.velocity = np.array([self.vx, self.vy]) # 当前速率
         # 计算个体中心与障碍物中心的相对位置
         dx = next_pos[0] - obstacle.x
         dy = next_pos[1] - obstacle.y
-        distance = np.hypot(dx, dy)
-        
-        # # 计算法线方向（从障碍物指向个体）
-       
-        normal = np.array([-dx, -dy]) / distance
+        distance = math.hypot(dx, dy)
         
-        # 计算切线方向（垂直于法线）
-        tangent = np.array([-normal[1], normal[0]])
+        # 计算法线方向（标量运算，不再为每次反弹分配NumPy数组）
+        nx = -dx / distance
+        ny = -dy / distance
         
-        # 分解速度为法线和切线方向的分量
-        v_normal = np.dot(self.velocity, normal) * normal
-        v_tangent = np.dot(self.velocity, tangent) * tangent
+        # 分解速度：法线分量v_n·n，切线方向为(-ny, nx)
+        v_n = self.vx * nx + self.vy * ny
+        v_t = -self.vx * ny + self.vy * nx
         
-        # # 反弹：法线分量反向，切线分量保留（摩擦力可忽略）
-        self.vx, self.vy = v_tangent - v_normal
+        # 反弹：法线分量反向，切线分量保留（摩擦力可忽略）
+        self.vx = -v_t * ny - v_n * nx
+        self.vy = v_t * nx - v_n * ny
         
         # 调整位置防止穿透
-        self.x = next_pos[0] - normal[0] * self.radius * 0.1
-        self.y = next_pos[1] - normal[1] * self.radius * 0.1
+        self.x = next_pos[0] - nx * self.radius * 0.1
+        self.y = next_pos[1] - ny * self.radius * 0.1
 
    
     
@@ -389,7 +457,7 @@ class Prey(Individual):
         """平滑的随机运动：保持惯性，仅小幅度调整方向"""
         # ✅ 1. 控制转向幅度：每帧最多转max_turn弧度（约5.7度，可调整）
         max_turn = 0.1  # 转向灵活度：值越小越“执着”当前方向，值越大越容易转向
-        angle_change = random.uniform(-max_turn, max_turn)
+        angle_change = environment.random.uniform(-max_turn, max_turn)
         
         # ✅ 2. 将当前速度转换为极坐标（角度+速率）
         current_angle = np.arctan2(self.vy, self.vx)  # 当前运动方向（弧度）
@@ -423,66 +491,74 @@ class Prey(Individual):
         self.y = np.clip(self.y, 0, environment.height)
 
     
-    def eat_plants(self, environment):
-        """吃植物：获取能量，植物死亡"""
-        for plant in environment.plants[:]:
-            if environment.is_alive(plant):
-                dist = np.hypot(self.x - plant.x, self.y - plant.y)
-                if dist < 1.0:  # 吃的距离
-                    # 被捕食者获得能量
-                    self.energy += 20
-                    # 植物被吃，能量耗尽死亡
-                    if plant.be_eaten(amount=15):
-                        environment.plants.remove(plant)
-                    break  # 一次只吃一个植物，避免重复计算
-    def reproduce(self):
+    def reproduce(self, rng=None):
         """繁殖后代（返回新个体）"""
+        rng = rng or default_stream
         self.energy /= 2  # 繁殖消耗能量
         return Prey(
-            x=self.x + random.uniform(-1, 1),  # 后代出生在附近
-            y=self.y + random.uniform(-1, 1),
-            genes=self.genes)
+            x=self.x + rng.uniform(-1, 1),  # 后代出生在附近
+            y=self.y + rng.uniform(-1, 1),
+            genes=self.genes,
+            rng=rng)
 
 class Plant(Individual):  # 继承自Individual基类
-    def __init__(self, x, y, genes=None):
-        super().__init__(x, y, genes, is_predator=False)
-        # 植物特有属性：能量、最大能量、繁殖阈值
-        self.energy = 50  # 初始能量
-        self.max_energy = 100  # 能量上限（避免无限增长）
-        self.reproduction_threshold = self.genes.get("repro_thresh", 80)  # 繁殖所需能量阈值
-    
-    def update(self,environment):
-        """植物每帧更新：光合作用增加能量，超过阈值则繁殖"""
-        # 光合作用：缓慢增加能量（模拟吸收阳光）
-        self.energy = min(self.energy + 0.1, self.max_energy)
-        self.min_obstacle_distance = 20
-        self.border_buffer = 10
-        
-        # 能量达标时繁殖：分裂为两个个体（父代能量减半，后代继承基因）
+    # 植物不动，能量只随时间线性增长：_energy为touched那一帧结算时的能量，
+    # 当前能量按clock（植物调度器，见植物调度.py）的帧数解析计算，不必每帧逐株累加
+    __slots__ = ("_energy", "touched", "wake", "clock")
+    min_obstacle_distance = 20  # 播种点与岩石表面的最小距离
+    border_buffer = 10  # 播种点与世界边界的最小距离
+    energy_key = "plant_initial_energy"  # 植物初始能量
+
+    def __init__(self, x, y, genes=None, rng=None, mutate=True, clock=None):
+        self.clock = clock  # 没有调度器时能量不增长
+        self.wake = None  # 调度器里排定的唤醒帧
+        super().__init__(x, y, genes, rng, mutate)
+
+    # 植物特有属性：最大能量、繁殖阈值（同种植物相同，直接读能量常数）
+    @property
+    def max_energy(self):
+        return ENERGY_PARAMS["plant_max_energy"]  # 能量上限（避免无限增长）
+
+    @property
+    def reproduction_threshold(self):
+        return ENERGY_PARAMS["plant_reproduce_energy"]  # 繁殖所需能量阈值
+
+    @property
+    def energy(self):
+        """当前能量：上次结算的能量 + 光合作用增长（不超过上限）"""
+        clock = self.clock
+        if clock is None or clock.now == self.touched:
+            return self._energy
+        return min(self._energy + ENERGY_PARAMS["plant_growth"] * (clock.now - self.touched), self.max_energy)
+
+    @energy.setter
+    def energy(self, value):
+        # 赋值即在当前帧结算
+        self._energy = value
+        self.touched = self.clock.now if self.clock is not None else 0
+
+    def ready_tick(self):
+        """能量达到繁殖阈值、需要被唤醒的帧（不早于下一帧），永远达不到时返回None"""
+        growth = ENERGY_PARAMS["plant_growth"]
+        threshold = self.reproduction_threshold
+        if self._energy >= threshold:
+            steps = 0
+        elif growth <= 0 or self.max_energy < threshold:
+            return None
+        else:
+            steps = math.ceil((threshold - self._energy) / growth)
+            while self._energy + growth * steps < threshold:  # 浮点舍入时往后补一帧
+                steps += 1
+        return max(self.touched + steps, self.clock.now + 1)
+
+    def update(self, environment):
+        """植物被调度器唤醒时调用：能量达标则繁殖（分裂为两个个体，父代能量减半，后代继承基因）"""
         if self.energy >= self.reproduction_threshold:
             self.energy /= 2  # 繁殖消耗父代能量
-            for _ in range(100):
-                dx = random.uniform(-50, 50)
-                dy = random.uniform(-50, 50)
-                new_x = self.x + dx
-                new_y = self.y + dy
-                
-                # 边界检查
-                if (new_x < self.border_buffer or
-                    new_x > environment.width - self.border_buffer or
-                    new_y < self.border_buffer or
-                    new_y > environment.height - self.border_buffer):
-                    continue
-                
-                # 障碍物检查
-                collision = False
-                for obs in environment.obstacles:
-                    dist = np.hypot(new_x - obs.x, new_y - obs.y)
-                    if dist < obs.radius + self.min_obstacle_distance:
-                        collision = True
-                        break
-                if not collision:
-                    return Plant(new_x, new_y, genes=self.genes)
+            # 直接在周围±50范围内的空闲格子（已排除边界缓冲和岩石附近）里抽样
+            spot = environment.obstacle_map.sample_free_near(self.x, self.y, 50, environment.random)
+            if spot is not None:
+                return Plant(spot[0], spot[1], genes=self.genes, rng=environment.random, clock=self.clock)
         return None
     
     def be_eaten(self, amount=10):
@@ -0,0 +1,160 @@
+"""完整模拟状态的存档与恢复：每个物种按列（位置、速度、能量、年龄、基因矩阵）
+存成NumPy数组写进一个未压缩的NPZ文件，连同障碍物、统计缓冲区、随机数状态
+和能量/基因参数，恢复后可以从存档那一帧逐位一致地继续运行"""
+import json
+import os
+
+import numpy as np
+
+from 基因与状态 import ENERGY_PARAMS, GENE_RANGES, Predator, Prey, Plant, Rock
+from 统计 import PopulationStats, energy_vector, gene_matrix
+
+SPECIES_CLASSES = {"predators": Predator, "prey": Prey, "plants": Plant}
+FORMAT_VERSION = 1
+
+
+def _species_columns(species):
+    """把一个物种整理成列：结构数组直接取，对象列表逐列收集"""
+    if hasattr(species, "genes"):
+        return {"x": species.x, "y": species.y, "vx": species.vx, "vy": species.vy,
+                "energy": species.energy, "age": species.age, "genes": species.genes}
+    n = len(species)
+    return {
+        "x": np.fromiter((ind.x for ind in species), dtype=float, count=n),
+        "y": np.fromiter((ind.y for ind in species), dtype=float, count=n),
+        "vx": np.fromiter((ind.vx for ind in species), dtype=float, count=n),
+        "vy": np.fromiter((ind.vy for ind in species), dtype=float, count=n),
+        "energy": energy_vector(species),
+        "age": np.fromiter((ind.age for ind in species), dtype=np.int64, count=n),
+        "genes": gene_matrix(species),
+    }
+
+
+def save_checkpoint(env, path):
+    """把env的完整状态写到path（先写临时文件再替换，写到一半崩溃不会损坏旧存档）"""
+    arrays = {}
+    for name in SPECIES_CLASSES:
+        for column, values in _species_columns(getattr(env, name)).items():
+            arrays[f"{name}.{column}"] = np.asarray(values)
+    arrays["obstacles"] = np.array([[obs.x, obs.y, obs.radius] for obs in env.obstacles],
+                                   dtype=float).reshape(-1, 3)
+    stats = env.stats
+    arrays["stats.rows"] = stats._rows(stats.ticks - len(stats), stats.ticks)
+    arrays["random.buffer"] = np.asarray(env.random._buffer, dtype=float)
+    engine = "arrays" if hasattr(env.predators, "genes") else "objects"
+    if engine == "objects":
+        # 植物能量是按帧数解析计算的：存上次结算的能量和帧，恢复后逐位一致
+        arrays["plants.base_energy"] = np.fromiter((p._energy for p in env.plants), dtype=float,
+                                                   count=len(env.plants))
+        arrays["plants.touched"] = np.fromiter((p.touched for p in env.plants), dtype=np.int64,
+                                               count=len(env.plants))
+    meta = {
+        "version": FORMAT_VERSION,
+        "engine": engine,
+        "width": env.width,
+        "height": env.height,
+        "tick": env.tick,
+        "plant_clock": env.plant_schedule.now,
+        "stats": {"ticks": stats.ticks, "capacity": stats.capacity, "columns": stats.columns,
+                  "track_genes": stats.track_genes, "track_energy": stats.track_energy,
+                  "energy_bins": stats.energy_bins.tolist()},
+        "rng": env.rng.bit_generator.state,
+        "random_pos": env.random._pos,
+        "energy_params": dict(ENERGY_PARAMS),
+        "gene_ranges": {param: list(bounds) for param, bounds in GENE_RANGES.items()},
+    }
+    arrays["meta"] = np.array(json.dumps(meta))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, env=None):
+    """从存档恢复。env为None时按存档里的引擎类型新建环境；
+    给定env时在其上恢复（保留它的统计输出设置）。返回恢复后的环境"""
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    meta = json.loads(str(arrays["meta"]))
+
+    # 能量常数和基因范围也恢复成存档时的值，保证后续运行一致
+    ENERGY_PARAMS.clear()
+    ENERGY_PARAMS.update(meta["energy_params"])
+    GENE_RANGES.clear()
+    GENE_RANGES.update({param: tuple(bounds) for param, bounds in meta["gene_ranges"].items()})
+
+    if env is None:
+        from 批量运行 import make_environment
+        env = make_environment(meta["engine"], meta["width"], meta["height"])
+        stats_meta = meta["stats"]
+        env.stats = PopulationStats(capacity=stats_meta["capacity"],
+                                    track_genes=stats_meta["track_genes"],
+                                    track_energy=stats_meta["track_energy"],
+                                    energy_bins=stats_meta["energy_bins"])
+    env.width, env.height = meta["width"], meta["height"]
+    env.tick = meta["tick"]
+
+    env.obstacles = [Rock(x=x, y=y, radius=int(r)) for x, y, r in arrays["obstacles"].tolist()]
+    env.rebuild_obstacle_map()
+
+    for name, cls in SPECIES_CLASSES.items():
+        columns = {column: arrays[f"{name}.{column}"] for column in
+                   ("x", "y", "vx", "vy", "energy", "age", "genes")}
+        species = getattr(env, name)
+        if hasattr(species, "genes"):
+            for column, values in columns.items():
+                setattr(species, column, values.copy())
+        else:
+            setattr(env, name, _build_individuals(cls, columns))
+    if "plants.touched" in arrays:
+        schedule = env.plant_schedule
+        schedule.now = meta["plant_clock"]
+        for plant, energy, touched in zip(env.plants, arrays["plants.base_energy"].tolist(),
+                                          arrays["plants.touched"].tolist()):
+            plant.clock = schedule
+            plant._energy = energy
+            plant.touched = touched
+        env.rebuild_plant_schedule()
+
+    # 统计：按时间顺序写回缓冲区
+    stats = env.stats
+    rows = arrays["stats.rows"]
+    if rows.shape[1] != len(stats.columns):
+        raise ValueError("存档的统计列与当前环境的统计设置不一致")
+    stats.ticks = meta["stats"]["ticks"]
+    stats._flushed = stats.ticks  # 存档前的数据视为已处理，之后的新数据才会写盘
+    keep = rows[-stats.capacity:]
+    stats._data[np.arange(stats.ticks - len(keep), stats.ticks) % stats.capacity] = keep
+
+    env.rng.bit_generator.state = meta["rng"]
+    env.random._buffer = arrays["random.buffer"].tolist()
+    env.random._pos = meta["random_pos"]
+    return env
+
+
+def _build_individuals(cls, columns):
+    """由列数据重建个体对象（基因原样使用，不再变异）"""
+    individuals = []
+    for x, y, vx, vy, energy, age, genes in zip(
+            columns["x"].tolist(), columns["y"].tolist(), columns["vx"].tolist(),
+            columns["vy"].tolist(), columns["energy"].tolist(), columns["age"].tolist(),
+            columns["genes"].tolist()):
+        ind = cls(x, y, genes, mutate=False)
+        ind.vx, ind.vy = vx, vy
+        ind.energy = energy
+        ind.age = age
+        individuals.append(ind)
+    return individuals
+
+
+class AutoCheckpoint:
+    """定期自动存档：每every帧把环境写到path（覆盖上一次）"""
+
+    def __init__(self, path, every=1000):
+        self.path = path
+        self.every = every
+
+    def __call__(self, env):
+        if env.tick % self.every == 0:
+            save_checkpoint(env, self.path)
@@ -0,0 +1,195 @@
+"""帧预算调度：植物或被捕食者爆发时每帧耗时会无限增长，交互窗口随之卡死。
+FrameBudget挂在Environment上（Environment.enable_governor开启），每帧记录update()的耗时
+（加上主循环报告的绘制耗时），每window帧按平均耗时与预算比较，逐级降级：
+
+    1 render    降低绘制频率（主循环用should_render()决定本显示帧画不画）
+    2 schedule  拥挤的动物物种改用细节层次调度（只对支持LOD的对象模型；其他情况记录后跳过）
+    3 cull      拥挤物种按承载量随机剔除（capacity可配置，没给的按耗时超出的比例估算），
+                仍然超预算时每个窗口继续按比例收紧，保证无人值守的长时间运行不会停滞
+
+平均耗时低于预算×recover时逐级恢复。每次升级、收紧和恢复都记一条日志
+（log列表，可选追加写入JSON Lines文件，或交给echo回调打印）。
+调度依据的是实际耗时，开启后的运行不能按种子逐位复现。
+
+用法示例：
+    governor = env.enable_governor(budget_ms=33, capacity={"plants": 20000}, log_path="budget.jsonl")
+    ...
+    if governor.should_render():
+        renderer.draw(env)
+"""
+import json
+from collections import deque
+
+from 基因与状态 import Predator, Prey
+from 统计 import SPECIES
+
+STAGES = ("normal", "render", "schedule", "cull")
+ANIMALS = {"predators": Predator, "prey": Prey}  # 可以改用细节层次调度的物种
+
+
+def parse_capacity(text):
+    """解析命令行的承载量，如 "plants=20000,prey=8000" -> {"plants": 20000, "prey": 8000}"""
+    capacity = {}
+    for item in filter(None, text.split(",")):
+        name, _, value = item.partition("=")
+        if name not in SPECIES or not value.isdigit():
+            raise ValueError(f"承载量应为 物种=数量（物种为{'/'.join(SPECIES)}）：{item}")
+        capacity[name] = int(value)
+    return capacity
+
+
+class FrameBudget:
+    """每帧耗时预算的分级降级调度器"""
+
+    def __init__(self, budget_ms=33.0, window=10, recover=0.6, render_every=4, crowd=0.5,
+                 capacity=None, min_population=50, log_path=None, echo=None):
+        self.budget_ms = budget_ms  # 每帧（update加上分摊的绘制）的目标耗时
+        self.window = window  # 每window帧按平均耗时决定一次升降级
+        self.recover = recover  # 平均耗时低于budget_ms×recover时恢复一级
+        self.degraded_render_every = render_every  # 降级后每多少个显示帧绘制一次（无界面运行为1）
+        self.crowd = crowd  # 数量达到最多物种的这个比例即视为拥挤
+        self.capacity = dict(capacity or {})  # 物种名 -> 承载量
+        self.min_population = min_population  # 剔除不会低于这个数量
+        self.echo = echo  # 每条日志的回调（如print）
+        self.stage = 0  # STAGES的下标
+        self.render_every = 1
+        self.limits = {}  # 剔除级正在执行的承载量：物种名 -> 上限
+        self.culled = {name: 0 for name in SPECIES}  # 累计剔除的个体数
+        self.log = []
+        self._costs = deque(maxlen=window)  # 当前窗口每帧的毫秒数
+        self._render_s = 0.0  # 上一帧之后报告的绘制耗时，计入下一帧
+        self._frames = 0  # should_render被调用的次数
+        self._lod = None  # 本调度器开启的LevelOfDetail，恢复时关掉
+        self._floored = False  # 承载量都已降到min_population（不再重复记录）
+        self._log_file = open(log_path, "a", encoding="utf-8") if log_path else None
+
+    def should_render(self):
+        """主循环每个显示帧调用一次：本帧是否绘制"""
+        self._frames += 1
+        return self._frames % self.render_every == 0
+
+    def record_render(self, seconds):
+        """主循环报告一次绘制的耗时（分摊进预算）"""
+        self._render_s += seconds
+
+    def end_tick(self, env, seconds):
+        """Environment.update()末尾调用：记录本帧耗时，执行承载量，到窗口末尾决定升降级"""
+        self._costs.append(1000 * (seconds + self._render_s))
+        self._render_s = 0.0
+        for name, cap in self.limits.items():
+            self.culled[name] += env.cull(name, cap)
+        if len(self._costs) < self.window:
+            return
+        average = sum(self._costs) / len(self._costs)
+        self._costs.clear()
+        if average > self.budget_ms:
+            self._escalate(env, average)
+        elif average < self.budget_ms * self.recover and self.stage > 0:
+            self._relax(env, average)
+
+    def _crowded(self, env):
+        """数量达到最多物种crowd倍的物种名"""
+        counts = {name: len(getattr(env, name)) for name in SPECIES}
+        most = max(counts.values())
+        return [name for name, n in counts.items() if most and n >= self.crowd * most]
+
+    def _escalate(self, env, average):
+        if self.stage == 0:
+            self.stage = 1
+            self.render_every = self.degraded_render_every
+            if self.render_every > 1:
+                self._record(env, average, f"绘制改为每{self.render_every}个显示帧一次")
+            else:
+                self._record(env, average, "没有绘制可降（无界面运行），跳过")
+        elif self.stage == 1:
+            self.stage = 2
+            classes = {ANIMALS[name] for name in self._crowded(env) if name in ANIMALS}
+            if not getattr(env, "LOD", False):
+                self._record(env, average, "该引擎不支持细节层次调度，跳过")
+            elif env.lod is not None:
+                self._record(env, average, "细节层次调度已开启，跳过")
+            elif not classes:
+                self._record(env, average, "拥挤的只有植物（已按帧数解析调度），跳过")
+            else:
+                self._lod = env.enable_lod()
+                self._lod.species = classes
+                names = ", ".join(name for name, cls in ANIMALS.items() if cls in classes)
+                self._record(env, average, f"{names}改用细节层次调度")
+        else:
+            tightening = self.stage == 3
+            self.stage = 3
+            scale = self.budget_ms / average
+            limits = dict(self.limits)
+            for name in self._crowded(env):
+                count = len(getattr(env, name))
+                if name in limits:
+                    cap = min(limits[name], count) * scale  # 已在剔除仍超预算：按比例收紧
+                else:
+                    cap = self.capacity.get(name, count * scale)
+                limits[name] = max(int(cap), self.min_population)
+            if tightening and limits == self.limits:
+                # 都已降到min_population：只记一次，之后维持现状不再刷日志
+                if not self._floored:
+                    self._floored = True
+                    self._record(env, average, f"承载量已降到最低数量{self.min_population}，维持")
+                return
+            self._floored = False
+            self.limits = limits
+            for name, cap in self.limits.items():
+                self.culled[name] += env.cull(name, cap)
+            text = ", ".join(f"{name}<={cap}" for name, cap in self.limits.items())
+            self._record(env, average, f"{'收紧' if tightening else '开始'}承载量剔除：{text}")
+
+    def _relax(self, env, average):
+        if self.stage == 3:
+            self.limits = {}
+            self._floored = False
+            self._record(env, average, "解除承载量剔除", stage=2)
+        elif self.stage == 2:
+            action = "退出schedule级"
+            if self._lod is not None and env.lod is self._lod:
+                env.disable_lod()
+                action = "恢复完整更新"
+            self._lod = None
+            self._record(env, average, action, stage=1)
+        else:
+            action = "恢复每帧绘制" if self.render_every > 1 else "退出render级"
+            self.render_every = 1
+            self._record(env, average, action, stage=0)
+
+    def _record(self, env, average, action, stage=None):
+        if stage is not None:
+            self.stage = stage
+        entry = {
+            "tick": env.tick,
+            "stage": STAGES[self.stage],
+            "action": action,
+            "tick_ms": round(average, 2),
+            "budget_ms": self.budget_ms,
+            "populations": {name: len(getattr(env, name)) for name in SPECIES},
+        }
+        self.log.append(entry)
+        if self._log_file is not None:
+            self._log_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._log_file.flush()  # 运行中崩溃也能看到之前的降级记录
+        if self.echo is not None:
+            self.echo(f"[budget] tick {entry['tick']} {entry['stage']}: {action} "
+                      f"({entry['tick_ms']:.1f} ms/帧, 预算 {self.budget_ms:g} ms)")
+
+    def release(self, env):
+        """关闭调度器：撤掉自己开启的细节层次调度，关闭日志文件"""
+        if self._lod is not None and env.lod is self._lod:
+            env.disable_lod()
+        self._lod = None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def report(self):
+        return {
+            "stage": STAGES[self.stage],
+            "render_every": self.render_every,
+            "limits": dict(self.limits),
+            "culled": dict(self.culled),
+            "steps": len(self.log),
+        }
@@ -0,0 +1,65 @@
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+class Profiler:
+    """运行时探针：每帧各阶段的耗时和计数器（距离计算、删除、碰撞检测、处理的个体数等）。
+    通过Environment.enable_profiling()挂到环境上；env.profiler为None时
+    update()和draw()不做任何记录，只多一次属性判断"""
+
+    def __init__(self, window=30):
+        self.window = window
+        self.ticks = 0
+        self._seconds = defaultdict(float)  # 当前帧累计中的阶段耗时
+        self._counters = defaultdict(int)  # 当前帧累计中的计数器
+        self.history = deque(maxlen=window)  # 最近window帧的 (阶段毫秒数, 计数器)
+
+    @contextmanager
+    def phase(self, name):
+        """给一个阶段计时：with profiler.phase("prey"): ..."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._seconds[name] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self._counters[name] += n
+
+    def end_tick(self):
+        """一帧结束：把当前累计的数据存入历史并清零"""
+        self.history.append(({name: 1000 * s for name, s in self._seconds.items()}, dict(self._counters)))
+        self._seconds.clear()
+        self._counters.clear()
+        self.ticks += 1
+
+    def last(self):
+        """最近一帧的数据 {"phase_ms": {...}, "counters": {...}}"""
+        if not self.history:
+            return {"phase_ms": {}, "counters": {}}
+        phase_ms, counters = self.history[-1]
+        return {"phase_ms": dict(phase_ms), "counters": dict(counters)}
+
+    def averages(self):
+        """最近window帧的每帧平均值，格式同last()"""
+        n = len(self.history)
+        phase_ms = defaultdict(float)
+        counters = defaultdict(float)
+        for phases, counts in self.history:
+            for name, ms in phases.items():
+                phase_ms[name] += ms / n
+            for name, value in counts.items():
+                counters[name] += value / n
+        return {"phase_ms": dict(phase_ms), "counters": dict(counters)}
+
+    def lines(self):
+        """屏幕叠加层用的文字行"""
+        report = self.averages()
+        phases = {name: ms for name, ms in report["phase_ms"].items() if name != "draw"}
+        result = [f"update: {sum(phases.values()):.2f} ms"]
+        result += [f"  {name}: {ms:.2f} ms" for name, ms in phases.items()]
+        if "draw" in report["phase_ms"]:
+            result.append(f"draw: {report['phase_ms']['draw']:.2f} ms")
+        result += [f"{name}: {value:.0f}" for name, value in sorted(report["counters"].items())]
+        return result
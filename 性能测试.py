@@ -0,0 +1,312 @@
+"""性能基准：在标准规模（100/1千/1万/10万个体、不同障碍物数量）下构建带种子的环境，
+分别计时update()的各阶段（植物、捕食者、被捕食者、帧末繁殖、统计）和绘制，
+报告ticks/s、各阶段每帧毫秒数和探针计数器、峰值RSS和每帧临时分配的内存，结果写成JSON。
+每个用例在单独的子进程里运行，峰值RSS互不影响。
+
+用法示例：
+    python 性能测试.py --output bench.json
+    python 性能测试.py --engines arrays --cases 10000:100,100000:1000 --output new.json --compare bench.json
+    python 性能测试.py --engines objects --lod both --output lod.json   # 细节层次调度开/关的加速比
+    python 性能测试.py --engines arrays --kernels both --output jit.json   # 编译内核与NumPy参考路径的加速比
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# (个体总数, 障碍物数)
+DEFAULT_CASES = [(100, 10), (1_000, 10), (1_000, 100), (10_000, 100), (10_000, 1_000), (100_000, 1_000)]
+OBJECT_LIMIT = 10_000  # 对象模型每帧耗时随规模增长很快，只测到这个规模
+RATIO = (10, 50, 70)  # 捕食者:被捕食者:植物（与批量运行的默认数量一致）
+BASE_SIZE = (1100, 600)  # 默认数量对应的世界大小，规模变大时按面积放大以保持密度
+SCREEN_SIZE = (1100, 600)  # 绘制计时用的画面大小
+
+
+def world_size(agents):
+    """与默认130个体的1100x600世界保持相同密度"""
+    scale = math.sqrt(max(agents / sum(RATIO), 1.0))
+    return BASE_SIZE[0] * scale, BASE_SIZE[1] * scale
+
+
+def populations(agents):
+    """按RATIO把个体总数分给三个物种"""
+    total = sum(RATIO)
+    counts = [agents * r // total for r in RATIO]
+    counts[1] += agents - sum(counts)
+    return counts
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # macOS单位是字节，Linux是KB
+
+
+def time_draw(env, frames):
+    """绘制计时：classic为Environment.draw逐个画，sprites/pixels为批量Renderer"""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    try:
+        import pygame
+        from 渲染 import Renderer
+    except ImportError:
+        return None
+    pygame.init()
+    screen = pygame.display.set_mode(SCREEN_SIZE)
+    painters = {"sprites": Renderer(screen, "sprites").draw, "pixels": Renderer(screen, "pixels").draw}
+    if isinstance(env.predators, list):  # 结构数组逐个画没有意义
+        painters["classic"] = lambda env: env.draw(screen)
+    result = {}
+    for name, paint in painters.items():
+        paint(env)  # 预热（建背景层等）
+        start = time.perf_counter()
+        for _ in range(frames):
+            paint(env)
+        result[name] = 1000 * (time.perf_counter() - start) / frames
+    pygame.quit()
+    return result
+
+
+def time_allocations(env, ticks):
+    """用tracemalloc测每帧update()过程中临时分配的峰值（与计时分开，避免干扰）"""
+    peaks = []
+    tracemalloc.start()
+    for _ in range(ticks):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        env.update()
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+    return float(np.mean(peaks)) / 1024 ** 2 if peaks else None
+
+
+def run_case(case):
+    """子进程入口：跑一个用例，返回结果字典"""
+    from 批量运行 import make_environment
+
+    engine, agents, obstacles = case["engine"], case["agents"], case["obstacles"]
+    width, height = world_size(agents)
+    n_predators, n_prey, n_plants = populations(agents)
+
+    start = time.perf_counter()
+    env = make_environment(engine, width, height, seed=case["seed"])
+    env.add_individuals(n_predators=n_predators, n_prey=n_prey, n_plants=n_plants, n_obstacles=obstacles)
+    build = time.perf_counter() - start
+    lod = env.enable_lod() if case.get("lod") else None
+    compile_s = None
+    if case.get("kernels"):
+        start = time.perf_counter()
+        if not env.enable_kernels():
+            raise RuntimeError("--kernels需要安装numba")
+        compile_s = time.perf_counter() - start  # 首次运行为JIT编译，之后为读磁盘缓存
+    for _ in range(case["warmup"]):
+        env.update()
+
+    # 各阶段耗时和计数器由环境自带的探针记录（分块引擎的阶段在工作进程里，只能整体计时）
+    profiler = env.enable_profiling(window=case["ticks"]) if hasattr(env, "enable_profiling") else None
+    ticks = 0
+    start = time.perf_counter()
+    while ticks < case["ticks"]:
+        env.update()
+        ticks += 1
+        if time.perf_counter() - start > case["max_seconds"]:
+            break
+    elapsed = time.perf_counter() - start
+    report = profiler.averages() if profiler is not None else {"phase_ms": {}, "counters": {}}
+    if profiler is not None:
+        env.disable_profiling()
+
+    result = dict(case)
+    result.update({
+        "width": width,
+        "height": height,
+        "build_s": build,
+        "ticks": ticks,
+        "elapsed_s": elapsed,
+        "ticks_per_s": ticks / elapsed if elapsed > 0 else None,
+        "phase_ms": report["phase_ms"],
+        "counters": report["counters"],
+        "final": {name: len(getattr(env, name)) for name in ("predators", "prey", "plants")},
+        "lod": lod.report() if lod is not None else None,
+        "kernels_compile_s": compile_s,
+    })
+    result["draw_ms"] = time_draw(env, case["draw_frames"]) if case["draw_frames"] else None
+    result["peak_rss_mb"] = peak_rss_mb()  # 在tracemalloc之前取，不含其开销
+    result["alloc_peak_mb_per_tick"] = time_allocations(env, case["alloc_ticks"])
+    if hasattr(env, "close"):
+        env.close()
+    return result
+
+
+def build_cases(args):
+    cases = DEFAULT_CASES
+    if args.cases:
+        cases = [tuple(int(v) for v in item.split(":")) for item in args.cases.split(",")]
+    modes = {"off": (False,), "on": (True,), "both": (False, True)}
+    lod_modes = modes[args.lod]
+    kernel_modes = modes[args.kernels]
+    result = []
+    for engine in args.engines.split(","):
+        for agents, obstacles in cases:
+            if engine == "objects" and agents > OBJECT_LIMIT and not args.cases:
+                continue
+            for lod in lod_modes:
+                if lod and engine != "objects":  # 细节层次调度只用于对象模型
+                    continue
+                for kernels in kernel_modes:
+                    if kernels and engine != "arrays":  # 编译内核只用于结构数组引擎
+                        continue
+                    result.append({"engine": engine, "agents": agents, "obstacles": obstacles,
+                                   "seed": args.seed, "ticks": args.ticks, "warmup": args.warmup,
+                                   "max_seconds": args.max_seconds,
+                                   "draw_frames": 0 if args.no_draw else args.draw_frames,
+                                   "alloc_ticks": args.alloc_ticks, "lod": lod, "kernels": kernels})
+    return result
+
+
+def environment_info():
+    """记录运行环境，便于比较不同版本/机器的结果"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import numba
+        numba_version = numba.__version__
+    except ImportError:
+        numba_version = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run_benchmarks(cases):
+    """逐个用例在新的子进程里运行（max_tasks_per_child=1保证峰值RSS独立）"""
+    results = []
+    for case in cases:
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as pool:
+            result = pool.submit(run_case, case).result()
+        results.append(result)
+        print(f"{result['engine']:>8} agents={result['agents']:<7} obstacles={result['obstacles']:<5} "
+              f"{'lod ' if result['lod'] else ''}{'jit ' if result.get('kernels') else ''}ticks/s={result['ticks_per_s']:.1f}  "
+              + "  ".join(f"{phase}={ms:.2f}ms" for phase, ms in result["phase_ms"].items()))
+    return results
+
+
+def case_key(result):
+    return (result["engine"], result["agents"], result["obstacles"], bool(result.get("lod")),
+            bool(result.get("kernels")))
+
+
+def lod_speedups(results):
+    """同一用例开/关细节层次调度的ticks/s之比"""
+    plain = {case_key(r)[:3]: r for r in results if not r.get("lod") and not r.get("kernels")}
+    speedups = []
+    for result in results:
+        base = plain.get(case_key(result)[:3])
+        if not result.get("lod") or base is None or not base["ticks_per_s"]:
+            continue
+        speedup = result["ticks_per_s"] / base["ticks_per_s"]
+        speedups.append({"engine": result["engine"], "agents": result["agents"],
+                         "obstacles": result["obstacles"], "speedup": speedup,
+                         "coasted_fraction": result["lod"]["coasted_fraction"]})
+        print(f"{result['engine']:>8} agents={result['agents']:<7} obstacles={result['obstacles']:<5} "
+              f"lod speedup {speedup:.2f}x ({100 * result['lod']['coasted_fraction']:.0f}% 个体·帧为廉价更新)")
+    return speedups
+
+
+def kernel_speedups(results):
+    """同一用例编译内核与NumPy参考路径的ticks/s之比，以及各阶段的加速比"""
+    plain = {case_key(r)[:3]: r for r in results if not r.get("lod") and not r.get("kernels")}
+    speedups = []
+    for result in results:
+        base = plain.get(case_key(result)[:3])
+        if not result.get("kernels") or base is None or not base["ticks_per_s"]:
+            continue
+        speedup = result["ticks_per_s"] / base["ticks_per_s"]
+        phases = {phase: base["phase_ms"][phase] / ms for phase, ms in result["phase_ms"].items()
+                  if ms > 0 and phase in base["phase_ms"]}
+        speedups.append({"engine": result["engine"], "agents": result["agents"],
+                         "obstacles": result["obstacles"], "speedup": speedup, "phase_speedups": phases,
+                         "compile_s": result["kernels_compile_s"]})
+        print(f"{result['engine']:>8} agents={result['agents']:<7} obstacles={result['obstacles']:<5} "
+              f"jit speedup {speedup:.2f}x  "
+              + "  ".join(f"{phase}={ratio:.2f}x" for phase, ratio in phases.items())
+              + f"  (编译/加载 {result['kernels_compile_s']:.2f}s)")
+    return speedups
+
+
+def compare(baseline, current, threshold=0.1):
+    """按 (引擎, 个体数, 障碍物数, 是否开启LOD, 是否用编译内核) 对比两次结果的ticks/s，返回变慢超过threshold的用例"""
+    old = {case_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = old.get(case_key(result))
+        if before is None or not before["ticks_per_s"] or not result["ticks_per_s"]:
+            continue
+        ratio = result["ticks_per_s"] / before["ticks_per_s"]
+        flag = ""
+        if ratio < 1 - threshold:
+            regressions.append(case_key(result))
+            flag = "  <-- 变慢"
+        print(f"{result['engine']:>8} agents={result['agents']:<7} obstacles={result['obstacles']:<5} "
+              f"{before['ticks_per_s']:.1f} -> {result['ticks_per_s']:.1f} ticks/s ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="种群模拟性能基准")
+    parser.add_argument("--engines", default="objects,arrays", help="逗号分隔：objects,arrays,tiled")
+    parser.add_argument("--cases", default=None, help="个体数:障碍物数，逗号分隔，如100:10,1000:100")
+    parser.add_argument("--ticks", type=int, default=50, help="每个用例计时的帧数")
+    parser.add_argument("--warmup", type=int, default=5, help="计时前预跑的帧数")
+    parser.add_argument("--max-seconds", type=float, default=20.0, help="单个用例计时的时间上限")
+    parser.add_argument("--draw-frames", type=int, default=10, help="绘制计时的帧数")
+    parser.add_argument("--no-draw", action="store_true", help="不测绘制（不需要pygame）")
+    parser.add_argument("--alloc-ticks", type=int, default=3, help="测内存分配的帧数")
+    parser.add_argument("--lod", choices=("off", "on", "both"), default="off",
+                        help="对象模型是否开启细节层次调度，both时两种都跑并报告加速比")
+    parser.add_argument("--kernels", choices=("off", "on", "both"), default="off",
+                        help="结构数组引擎是否用Numba编译内核，both时两种都跑并报告加速比")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", default=None, help="与之前的结果JSON对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="ticks/s下降超过该比例视为退化")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = {"environment": environment_info(), "results": run_benchmarks(build_cases(args))}
+    report["lod_speedups"] = lod_speedups(report["results"])
+    report["kernel_speedups"] = kernel_speedups(report["results"])
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"results -> {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""无界面批量运行：不导入pygame，不限帧率，尽可能快地推进Environment.update()，
+跑满指定帧数或物种灭绝后把env.stats写到文件
+
+用法示例：
+    python 批量运行.py --ticks 5000 --engine arrays --output stats.csv
+    python 批量运行.py --ticks 5000 --engine arrays --kernels   # 需要安装numba
+    python 批量运行.py --ticks 1000000 --budget-ms 50 --capacity plants=20000 --budget-log budget.jsonl
+"""
+import time
+
+_START = time.perf_counter()  # 用于统计启动耗时（含模块导入）
+
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+from 基因与状态 import GENE_PARAMS
+from 环境 import Environment
+from 帧预算 import parse_capacity
+from 统计 import PopulationStats, gene_matrix
+
+ENGINES = ("objects", "arrays", "tiled")
+
+
+def make_environment(engine="objects", width=1100, height=600, seed=None, **options):
+    """按名字创建环境：objects为对象模型，arrays为结构数组引擎，
+    tiled为多进程分块的大世界（options传给TiledWorld，如tiles、workers）"""
+    if engine == "arrays":
+        from 数组引擎 import ArrayEnvironment
+        return ArrayEnvironment(width, height, seed=seed)
+    if engine == "tiled":
+        from 分块并行 import TiledWorld
+        return TiledWorld(width, height, seed=seed, **options)
+    if engine != "objects":
+        raise ValueError(f"未知引擎: {engine}")
+    return Environment(width, height, seed=seed)
+
+
+def is_extinct(env):
+    """捕食者或被捕食者任一方灭绝即视为生态系统崩溃"""
+    return len(env.predators) == 0 or len(env.prey) == 0
+
+
+def run(env, max_ticks, stop_on_extinction=True):
+    """推进至多max_ticks帧，返回实际运行的帧数"""
+    for tick in range(max_ticks):
+        env.update()
+        if stop_on_extinction and is_extinct(env):
+            return tick + 1
+    return max_ticks
+
+
+def summarize(env, ticks):
+    """单次运行的摘要：灭绝帧、最终数量和各物种平均基因"""
+    summary = {
+        "ticks": ticks,
+        "extinction_tick": ticks if is_extinct(env) else None,
+        "predators": len(env.predators),
+        "prey": len(env.prey),
+        "plants": len(env.plants),
+    }
+    for name in ("predators", "prey"):
+        genes = gene_matrix(getattr(env, name))
+        means = genes.mean(axis=0) if len(genes) else np.full(len(GENE_PARAMS), np.nan)
+        for param, value in zip(GENE_PARAMS, means):
+            summary[f"{name}_{param}"] = float(value)
+    return summary
+
+
+def save_stats(stats, path):
+    """按扩展名把缓冲区内的种群统计写成JSON或CSV（每帧一行）"""
+    columns = {name: values.tolist() for name, values in stats.items()}
+    if path.endswith(".csv"):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(zip(*columns.values()))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(columns, f)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="无界面批量运行种群模拟")
+    parser.add_argument("--ticks", type=int, default=1000, help="最多运行的帧数")
+    parser.add_argument("--engine", choices=ENGINES, default="objects")
+    parser.add_argument("--width", type=float, default=1100)
+    parser.add_argument("--height", type=float, default=600)
+    parser.add_argument("--predators", type=int, default=10)
+    parser.add_argument("--prey", type=int, default=50)
+    parser.add_argument("--plants", type=int, default=70)
+    parser.add_argument("--obstacles", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+    parser.add_argument("--no-stop", action="store_true", help="物种灭绝后继续运行")
+    parser.add_argument("--output", default="stats.json", help="统计输出文件（.json或.csv）")
+    parser.add_argument("--stats-dir", default=None, help="运行中分块写出统计的目录（NPZ）")
+    parser.add_argument("--track-genes", action="store_true", help="统计基因均值/方差")
+    parser.add_argument("--track-energy", action="store_true", help="统计能量分布")
+    parser.add_argument("--checkpoint", default=None, help="定期自动存档的路径")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="自动存档间隔（帧）")
+    parser.add_argument("--resume", default=None, help="从存档继续运行（忽略初始数量参数）")
+    parser.add_argument("--tiles", default="2x2", help="tiled引擎的分块数，如4x4")
+    parser.add_argument("--workers", type=int, default=None, help="tiled引擎的工作进程数（默认CPU核数）")
+    parser.add_argument("--lod", action="store_true", help="细节层次调度：邻域为空的个体休眠（仅objects引擎）")
+    parser.add_argument("--lod-interval", type=int, default=8, help="休眠个体重新检查邻域的最大间隔（帧）")
+    parser.add_argument("--lod-drift", type=float, default=5.0, help="休眠允许的位置均方根偏差（像素）")
+    parser.add_argument("--record", default=None, help="事件与轨迹记录的目录（objects/arrays引擎）")
+    parser.add_argument("--record-every", type=int, default=10, help="记录位置帧的间隔（帧）")
+    parser.add_argument("--kernels", action="store_true",
+                        help="用Numba编译内核做空间查询、碰撞和随机运动（仅arrays引擎，没有numba时退回NumPy）")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="每帧耗时预算：持续超出时拥挤物种休眠、再按承载量剔除（objects/arrays引擎）")
+    parser.add_argument("--capacity", default=None,
+                        help="剔除级使用的承载量，如plants=20000,prey=8000（没给的物种按耗时估算）")
+    parser.add_argument("--budget-log", default=None, help="降级日志追加写入的JSON Lines文件")
+    args = parser.parse_args(argv)
+    try:
+        args.capacity = parse_capacity(args.capacity or "")
+    except ValueError as exc:
+        parser.error(str(exc))
+    if args.engine == "tiled" and (args.checkpoint or args.resume):
+        parser.error("tiled引擎暂不支持存档")
+    if args.lod and args.engine != "objects":
+        parser.error("--lod只适用于objects引擎")
+    if args.record and args.engine == "tiled":
+        parser.error("--record不适用于tiled引擎")
+    if args.budget_ms is not None and args.engine == "tiled":
+        parser.error("--budget-ms不适用于tiled引擎")
+    if args.kernels and args.engine != "arrays":
+        parser.error("--kernels只适用于arrays引擎")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.resume:
+        from 存档 import load_checkpoint
+        env = load_checkpoint(args.resume)
+    else:
+        options = {}
+        if args.engine == "tiled":
+            options = {"tiles": tuple(int(n) for n in args.tiles.split("x")), "workers": args.workers}
+        env = make_environment(args.engine, args.width, args.height, seed=args.seed, **options)
+    try:
+        if args.resume:
+            if args.stats_dir:
+                env.stats.open_writer(args.stats_dir)
+        else:
+            env.stats = PopulationStats(track_genes=args.track_genes, track_energy=args.track_energy,
+                                        output_dir=args.stats_dir)
+            env.add_individuals(n_predators=args.predators, n_prey=args.prey,
+                                n_plants=args.plants, n_obstacles=args.obstacles)
+        if args.checkpoint:
+            env.enable_autosave(args.checkpoint, args.checkpoint_every)
+        lod = env.enable_lod(args.lod_interval, args.lod_drift) if args.lod else None
+        kernels = env.enable_kernels() if args.kernels else False
+        governor = None
+        if args.budget_ms is not None:
+            # 无界面运行没有绘制，render_every=1让调度直接从细节层次调度开始降级
+            governor = env.enable_governor(args.budget_ms, render_every=1, capacity=args.capacity,
+                                           log_path=args.budget_log, echo=print)
+        if args.record:
+            env.enable_recording(args.record, args.record_every)
+        startup = time.perf_counter() - _START
+
+        begin = time.perf_counter()
+        ticks = run(env, args.ticks, stop_on_extinction=not args.no_stop)
+        elapsed = time.perf_counter() - begin
+        env.stats.close()
+        budget = governor.report() if governor is not None else None
+        if governor is not None:
+            env.disable_governor()
+        if args.record:
+            env.disable_recording()
+    finally:
+        if hasattr(env, "close"):
+            env.close()  # 分块引擎：出错或Ctrl-C时也结束工作进程、释放共享内存
+    save_stats(env.stats, args.output)
+
+    rate = ticks / elapsed if elapsed > 0 else float("inf")
+    print(f"startup: {startup:.3f}s")
+    print(f"ticks: {ticks}  elapsed: {elapsed:.3f}s  ticks/s: {rate:.1f}")
+    if args.kernels:
+        print(f"kernels: {'numba' if kernels else 'numpy（没有安装numba）'}")
+    print(f"final: predators={len(env.predators)} prey={len(env.prey)} plants={len(env.plants)}")
+    if lod is not None:
+        print(f"lod: {100 * lod.report()['coasted_fraction']:.0f}% 个体·帧为廉价更新")
+    if budget is not None:
+        culled = ", ".join(f"{name}={n}" for name, n in budget["culled"].items() if n)
+        print(f"budget: {budget['stage']}，降级记录{budget['steps']}条，剔除 {culled or '无'}")
+    print(f"stats -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
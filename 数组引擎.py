@@ -0,0 +1,405 @@
+import warnings
+from collections import namedtuple
+
+import numpy as np
+
+from 基因与状态 import ENERGY_PARAMS, GENE_PARAMS, Prey
+from 环境 import Environment
+from 事件记录 import ArrayEventRecorder, CULLED, EATEN
+import 空间索引
+
+# 迭代结构数组时返回的只读个体视图（兼容按对象访问x/y/energy的代码，如draw）
+AgentView = namedtuple("AgentView", ["x", "y", "vx", "vy", "energy", "age", "genes"])
+
+
+class SpeciesArrays:
+    """单个物种的结构数组：位置、速度、能量、年龄和每个基因各占一条连续数组"""
+    columns = ("x", "y", "vx", "vy", "energy", "age", "genes")  # 随个体一起压缩的数组
+
+    def __init__(self, radius=5, factor=1.0, energy_key="initial_energy"):
+        self.radius = radius  # 碰撞半径（同物种相同）
+        self.factor = factor  # 基因到实际属性的倍率（捕食者为1.5）
+        self.energy_key = energy_key  # 新个体初始能量在ENERGY_PARAMS中的键
+        self.x = np.empty(0)
+        self.y = np.empty(0)
+        self.vx = np.empty(0)
+        self.vy = np.empty(0)
+        self.energy = np.empty(0)
+        self.age = np.empty(0, dtype=np.int64)
+        self.genes = np.empty((0, len(GENE_PARAMS)))  # 列顺序与GENE_PARAMS一致
+
+    def __len__(self):
+        return self.x.size
+
+    def __iter__(self):
+        for i in range(self.x.size):
+            yield AgentView(self.x[i], self.y[i], self.vx[i], self.vy[i],
+                            self.energy[i], self.age[i], self.genes[i])
+
+    # 由基因决定的实际属性（与Individual.__init__一致）
+    @property
+    def max_speed(self):
+        return self.genes[:, 0] * self.factor
+
+    @property
+    def perception(self):
+        return self.genes[:, 1] * self.factor
+
+    @property
+    def aggression(self):
+        return self.genes[:, 2]
+
+    def add(self, x, y, genes, rng, parents=None):
+        """批量加入新个体：速度按各自最大速度随机初始化。
+        parents为繁殖时各后代的父代下标（供派生类继承附加列）"""
+        n = len(x)
+        if n == 0:
+            return
+        half = genes[:, 0] * self.factor / 2
+        self.x = np.concatenate([self.x, x])
+        self.y = np.concatenate([self.y, y])
+        self.vx = np.concatenate([self.vx, rng.uniform(-half, half)])
+        self.vy = np.concatenate([self.vy, rng.uniform(-half, half)])
+        self.energy = np.concatenate([self.energy, np.full(n, float(ENERGY_PARAMS[self.energy_key]))])
+        self.age = np.concatenate([self.age, np.zeros(n, dtype=np.int64)])
+        self.genes = np.concatenate([self.genes, genes])
+
+    def keep(self, mask):
+        """按布尔掩码一次性压缩所有数组（批量删除死亡个体）"""
+        if mask.all():
+            return
+        for name in self.columns:
+            setattr(self, name, getattr(self, name)[mask])
+
+
+class ArrayEnvironment(Environment):
+    """结构数组引擎：对外接口与Environment相同，
+    但每个物种的状态存成连续的NumPy数组，移动、碰撞、代谢和繁殖都整批计算。
+    同一阶段内的个体看到的是阶段开始时的快照，生态规则与对象模型保持一致
+    （捕食者和被捕食者同样在帧末的births阶段清理死亡个体后整批繁殖）"""
+    PHASES = ("plants", "predators", "prey", "births")
+    LOD = False  # 整批更新，没有逐个体的细节层次调度
+
+    def __init__(self, width=800, height=600, seed=None):
+        super().__init__(width, height, seed)
+        self.predators = SpeciesArrays(radius=11, factor=1.5)
+        self.prey = SpeciesArrays(radius=5)
+        self.plants = SpeciesArrays(radius=5, energy_key="plant_initial_energy")
+        self.kernels = None  # 编译内核模块（见enable_kernels），None时用NumPy参考路径
+
+    def add_individuals(self, n_predators=20, n_prey=50, n_plants=0, n_obstacles=10):
+        """初始化个体（分布与Environment.add_individuals一致）"""
+        rng = self.rng
+        self.predators = SpeciesArrays(radius=11, factor=1.5)
+        self.predators.add(rng.uniform(0, self.width, n_predators), rng.uniform(0, self.height, n_predators),
+                           self._random_gene_matrix(n_predators), rng)
+        self.prey = SpeciesArrays(radius=5)
+        self.prey.add(rng.uniform(0, self.width, n_prey), rng.uniform(0, self.height, n_prey),
+                      self._random_gene_matrix(n_prey), rng)
+        self.plants = SpeciesArrays(radius=5, energy_key="plant_initial_energy")
+        self.plants.add(rng.uniform(10, self.width - 10, n_plants), rng.uniform(10, self.height - 10, n_plants),
+                        self._random_gene_matrix(n_plants), rng)
+        self.obstacles = self._random_obstacles(n_obstacles)
+        self.rebuild_obstacle_map()
+
+    def enable_recording(self, directory, frame_every=10):
+        """同Environment.enable_recording；结构数组的行没有固定身份，
+        由ArrayEventRecorder维护与行对齐的编号"""
+        self.disable_recording()
+        self.recorder = ArrayEventRecorder(directory, self, frame_every)
+        return self.recorder
+
+    def enable_kernels(self):
+        """空间查询、触墙反弹、岩石碰撞和随机转向改用编译内核（编译内核.py），并预先编译。
+        没有安装numba时给出警告，继续用NumPy参考路径。返回是否启用"""
+        import 编译内核
+        if not 编译内核.AVAILABLE:
+            warnings.warn("没有安装numba，继续使用NumPy参考路径", RuntimeWarning, stacklevel=2)
+            return False
+        编译内核.warm_up()
+        self.kernels = 编译内核
+        return True
+
+    def disable_kernels(self):
+        self.kernels = None
+
+    @property
+    def spatial(self):
+        """空间查询函数所在的模块：编译内核或空间索引（两者的查询函数签名和结果相同）"""
+        return self.kernels if self.kernels is not None else 空间索引
+
+    def is_alive(self, individual):
+        """纯检查，不修改种群（结构数组在每个阶段开始时统一压缩）"""
+        return (
+            individual.energy > 0
+            and 0 <= individual.x <= self.width
+            and 0 <= individual.y <= self.height
+        )
+
+    def cull(self, name, capacity):
+        """承载量剔除：存活个体超过capacity时均匀随机移除多出的部分，返回移除的个数"""
+        species = getattr(self, name)
+        keep = self._alive_mask(species)
+        alive = np.flatnonzero(keep)
+        excess = alive.size - capacity
+        if excess <= 0:
+            return 0
+        keep[self.rng.choice(alive, excess, replace=False)] = False
+        self._keep(species, keep, CULLED)
+        return excess
+
+    def compact(self):
+        """按存活掩码压缩所有物种数组"""
+        for species in (self.predators, self.prey, self.plants):
+            self._drop_dead(species)
+
+    def _drop_dead(self, species):
+        """压缩掉能量耗尽或离开世界的个体"""
+        self._keep(species, self._alive_mask(species))
+
+    def _keep(self, species, mask, cause=None):
+        """按掩码压缩物种数组，记录事件时先记下被移除个体的死亡（cause为None时按能量区分饿死和出界）"""
+        if self.recorder is not None:
+            self.recorder.keep(self, species, mask, cause)
+        species.keep(mask)
+
+    def _born(self, species, parents):
+        """species.add之后调用：末尾parents.size行是新出生的后代"""
+        if self.recorder is not None:
+            self.recorder.births(self, species, parents)
+
+    def _alive_mask(self, species):
+        return ((species.energy > 0)
+                & (species.x >= 0) & (species.x <= self.width)
+                & (species.y >= 0) & (species.y <= self.height))
+
+    def _check_wall_collision(self, sp):
+        """触墙反弹（对应Individual._check_wall_collision）"""
+        r = sp.radius
+        if self.kernels is not None:
+            self.kernels.bounce_walls(sp.x, sp.y, sp.vx, sp.vy, r, self.width, self.height)
+            return
+        sp.vx[(sp.x - r < 0) | (sp.x + r > self.width)] *= -1
+        sp.vy[(sp.y - r < 0) | (sp.y + r > self.height)] *= -1
+        sp.x = np.clip(sp.x, r, self.width - r)
+        sp.y = np.clip(sp.y, r, self.height - r)
+
+    def _collide(self, sp, next_x, next_y):
+        """前进后碰到岩石的个体下标，及所碰岩石的圆心坐标"""
+        obstacle_map = self.obstacle_map
+        checks = obstacle_map.checks
+        if self.kernels is not None:
+            obs = self.kernels.first_collision_many(obstacle_map, next_x, next_y, sp.radius)
+        else:
+            obs = obstacle_map.first_collision_many(next_x, next_y, sp.radius)
+        if self.profiler is not None:
+            self.profiler.count("collision_checks", obstacle_map.checks - checks)  # 实际精确检测的岩石数
+        hit = np.flatnonzero(obs >= 0)
+        o = obs[hit]
+        return hit, obstacle_map.obstacle_x[o], obstacle_map.obstacle_y[o]
+
+    def _handle_collision(self, sp):
+        """按速度前进一步，撞到障碍物则沿法线反弹（对应handle_collision）"""
+        next_x = sp.x + sp.vx
+        next_y = sp.y + sp.vy
+        hit, obstacle_x, obstacle_y = self._collide(sp, next_x, next_y)
+        sp.x, sp.y = next_x, next_y
+        if hit.size:
+            dx = next_x[hit] - obstacle_x
+            dy = next_y[hit] - obstacle_y
+            distance = np.hypot(dx, dy)
+            normal_x = -dx / distance
+            normal_y = -dy / distance
+            # 法线分量反向、切线分量保留：v' = v - 2(v·n)n
+            v_normal = sp.vx[hit] * normal_x + sp.vy[hit] * normal_y
+            sp.vx[hit] -= 2 * v_normal * normal_x
+            sp.vy[hit] -= 2 * v_normal * normal_y
+            sp.x[hit] = next_x[hit] - normal_x * sp.radius * 0.1
+            sp.y[hit] = next_y[hit] - normal_y * sp.radius * 0.1
+
+    def _uniform(self, sp, idx, low, high):
+        """给物种sp里下标为idx的个体各抽一个[low, high)均匀随机数"""
+        return self.rng.uniform(low, high, idx.size)
+
+    def _mutate_rows(self, sp, idx):
+        """下标为idx的个体的基因变异后的副本（后代的基因）"""
+        return self._mutate(sp.genes[idx])
+
+    def _groups(self, a, b, a_idx=None):
+        """空间查询的分组参数：单个世界不分组（集合引擎按世界编号分组）"""
+        return {}
+
+    def _random_move(self, sp, idx, clip):
+        """平滑随机运动：方向小幅随机偏转，保持速率（对应_random_move）"""
+        if idx.size == 0:
+            return
+        max_turn = 0.1
+        turns = self._uniform(sp, idx, -max_turn, max_turn)
+        if self.kernels is not None:
+            self.kernels.random_move(sp.x, sp.y, sp.vx, sp.vy, idx, turns, clip, self.width, self.height)
+            return
+        angle = np.arctan2(sp.vy[idx], sp.vx[idx]) + turns
+        speed = np.hypot(sp.vx[idx], sp.vy[idx])
+        sp.vx[idx] = np.cos(angle) * speed
+        sp.vy[idx] = np.sin(angle) * speed
+        sp.x[idx] += sp.vx[idx]
+        sp.y[idx] += sp.vy[idx]
+        if clip:  # 被捕食者随机运动后限制在世界范围内
+            sp.x[idx] = np.clip(sp.x[idx], 0, self.width)
+            sp.y[idx] = np.clip(sp.y[idx], 0, self.height)
+
+    def _step_towards(self, sp, idx, dx, dy, speed):
+        """沿(dx, dy)方向前进min(speed, 距离)"""
+        dist = np.hypot(dx, dy)
+        with np.errstate(divide="ignore", invalid="ignore"):  # 重合时与对象模型一样得到nan并在下一阶段死亡
+            step = np.minimum(speed, dist) / dist
+        sp.x[idx] += dx * step
+        sp.y[idx] += dy * step
+
+    def _metabolize(self, sp):
+        """基础代谢、年龄增长（对应Individual.update）"""
+        sp.energy -= ENERGY_PARAMS["metabolism"]
+        sp.age += 1
+
+    def _reproduce(self, sp):
+        """能量超过繁殖阈值的个体分裂出一个后代（对应Environment._reproduce）"""
+        parents = np.flatnonzero(sp.energy > ENERGY_PARAMS["reproduce_energy"])
+        if parents.size:
+            sp.energy[parents] /= 2
+            sp.add(sp.x[parents] + self._uniform(sp, parents, -1, 1),
+                   sp.y[parents] + self._uniform(sp, parents, -1, 1),
+                   self._mutate_rows(sp, parents), self.rng, parents)
+            self._born(sp, parents)
+
+    def _update_plants(self):
+        """光合作用增长能量，达到阈值的植物在附近无障碍处播种"""
+        plants = self.plants
+        self._drop_dead(plants)
+        if self.profiler is not None:
+            self.profiler.count("plants_processed", len(plants))
+        plants.energy = np.minimum(plants.energy + ENERGY_PARAMS["plant_growth"], ENERGY_PARAMS["plant_max_energy"])
+        parents = np.flatnonzero(plants.energy >= ENERGY_PARAMS["plant_reproduce_energy"])
+        if parents.size == 0:
+            return
+        plants.energy[parents] /= 2
+        # 与Plant.update相同：从障碍物栅格预先算好的空闲格子里直接抽播种点
+        seeds_parent, seeds_x, seeds_y = [], [], []
+        for i, x, y in zip(parents.tolist(), plants.x[parents].tolist(), plants.y[parents].tolist()):
+            spot = self.obstacle_map.sample_free_near(x, y, 50, self.random)
+            if spot is not None:
+                seeds_parent.append(i)
+                seeds_x.append(spot[0])
+                seeds_y.append(spot[1])
+        if seeds_parent:
+            seeds_parent = np.array(seeds_parent)
+            plants.add(np.array(seeds_x), np.array(seeds_y),
+                       self._mutate(plants.genes[seeds_parent]), self.rng, seeds_parent)
+            self._born(plants, seeds_parent)
+
+    def _update_predators(self):
+        """捕食者阶段：追捕、代谢，全部移动完后一次结算捕获"""
+        predators, prey = self.predators, self.prey
+        self._drop_dead(predators)
+        self._drop_dead(prey)
+        if self.profiler is not None:
+            self.profiler.count("predators_processed", len(predators))
+        self._move_predators()
+        self._metabolize(predators)
+        self._hunt()
+
+    def _move_predators(self):
+        """触墙、碰撞，感知范围内有猎物则追击，否则随机探索（只读猎物的位置）"""
+        predators, prey = self.predators, self.prey
+        self._check_wall_collision(predators)
+        self._handle_collision(predators)
+
+        # 感知范围内有猎物则追击，否则随机探索
+        target, _ = self.spatial.nearest_within(predators.x, predators.y, predators.perception, prey.x, prey.y,
+                                                **self._groups(predators, prey))
+        chase = np.flatnonzero(target >= 0)
+        t = target[chase]
+        self._step_towards(predators, chase, prey.x[t] - predators.x[chase], prey.y[t] - predators.y[chase],
+                           (predators.max_speed * predators.aggression)[chase])
+        self._random_move(predators, np.flatnonzero(target < 0), clip=False)
+
+    def _hunt(self):
+        """捕获：每个捕食者至多吃一只猎物，每只猎物至多被吃一次"""
+        predators, prey = self.predators, self.prey
+        hunter, caught = self.spatial.match_within(predators.x, predators.y, prey.x, prey.y, 1.0,
+                                                   **self._groups(predators, prey))
+        predators.energy[hunter] += ENERGY_PARAMS["hunt_gain"]
+        eaten = np.zeros(len(prey), dtype=bool)
+        eaten[caught] = True
+        if self.profiler is not None:
+            self.profiler.count("kills", caught.size)
+        if self.recorder is not None:
+            self.recorder.hunt(self, hunter, caught)
+        self._keep(prey, ~eaten, EATEN)
+
+    def _update_prey(self):
+        """被捕食者阶段：逃跑或觅食、代谢，全部移动完后一次结算取食"""
+        prey, predators, plants = self.prey, self.predators, self.plants
+        self._drop_dead(prey)
+        self._drop_dead(predators)
+        if self.profiler is not None:
+            self.profiler.count("prey_processed", len(prey))
+        self._move_prey()
+        self._metabolize(prey)
+        self._graze()
+
+    def _move_prey(self, any_predators=None):
+        """触墙、碰撞，逃离最近的捕食者，没有威胁时走向附近的植物（只读捕食者和植物的位置）。
+        any_predators为整个世界是否还有捕食者（分块时predators只含附近的，默认按len(predators)判断）"""
+        prey, predators, plants = self.prey, self.predators, self.plants
+        self._check_wall_collision(prey)
+        self._handle_collision(prey)
+
+        if not (len(predators) > 0 if any_predators is None else any_predators):
+            # 没有捕食者时随机移动（与Prey.move一致）
+            self._random_move(prey, np.arange(len(prey)), clip=True)
+        else:
+            threat, threat_dist = self.spatial.nearest_within(prey.x, prey.y, prey.perception,
+                                                              predators.x, predators.y,
+                                                              **self._groups(prey, predators))
+            flee = np.flatnonzero((threat >= 0) & (threat_dist >= 1e-6))
+            t = threat[flee]
+            self._step_towards(prey, flee, prey.x[flee] - predators.x[t], prey.y[flee] - predators.y[t],
+                               (prey.max_speed * prey.aggression)[flee])
+            self._random_move(prey, np.flatnonzero((threat >= 0) & (threat_dist < 1e-6)), clip=True)
+
+            # 没有威胁时寻找取食范围内最近的植物
+            calm = np.flatnonzero(threat < 0)
+            food, _ = self.spatial.nearest_within(prey.x[calm], prey.y[calm], Prey.eating_range,
+                                                  plants.x, plants.y, **self._groups(prey, plants, calm))
+            seek = calm[food >= 0]
+            f = food[food >= 0]
+            self._step_towards(prey, seek, plants.x[f] - prey.x[seek], plants.y[f] - prey.y[seek],
+                               prey.max_speed[seek])
+            self._random_move(prey, calm[food < 0], clip=True)
+
+    def _graze(self):
+        """取食：每只猎物吃1.0范围内列表最靠前的植物，
+        同一植物按猎物顺序依次被啃，能量耗尽后后面的猎物吃不到"""
+        prey, plants = self.prey, self.plants
+        bite = ENERGY_PARAMS["graze_bite"]
+        eater, plant = self.spatial.graze_within(prey.x, prey.y, plants.x, plants.y, plants.energy, bite, 1.0,
+                                                 **self._groups(prey, plants))
+        if eater.size:
+            prey.energy[eater] += ENERGY_PARAMS["graze_gain"]
+            np.subtract.at(plants.energy, plant, bite)
+            if self.recorder is not None:
+                self.recorder.graze(self, eater, plant)
+            self._keep(plants, plants.energy > 0, EATEN)
+
+    def _update_births(self):
+        """帧末：清理死亡个体，捕食者和被捕食者整批繁殖"""
+        size = len(self.predators) + len(self.prey) + len(self.plants)
+        self.compact()
+        if self.profiler is not None:
+            self.profiler.count("removed", size - len(self.predators) - len(self.prey) - len(self.plants))
+            born = len(self.predators) + len(self.prey)
+        self._reproduce(self.predators)
+        self._reproduce(self.prey)
+        if self.profiler is not None:
+            self.profiler.count("animal_births", len(self.predators) + len(self.prey) - born)
+
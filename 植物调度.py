@@ -0,0 +1,48 @@
+import heapq
+import itertools
+
+
+class PlantSchedule:
+    """植物的事件调度：植物不动，能量随时间线性增长（由Plant.energy按now解析计算），
+    所以一株植物只在能量达到繁殖阈值的那一帧才需要处理。小顶堆按唤醒帧排队，
+    每帧只弹出到期的植物，植物阶段的开销与事件数成正比而不是与植物总数成正比。
+    被啃食或繁殖后能量变化，重新排期即可，堆里的旧条目出堆时按plant.wake惰性作废"""
+
+    def __init__(self, now=0):
+        self.now = now  # 已经进行的植物阶段数（植物的时钟）
+        self._heap = []  # (唤醒帧, x, y, 序号, 植物)：同一帧到期的按位置排序，读档后顺序不变
+        self._seq = itertools.count()  # 位置也相同时按入堆顺序，保证不比较植物对象
+
+    def __len__(self):
+        return len(self._heap)
+
+    def clear(self):
+        self._heap = []
+
+    def add(self, plant):
+        """接管一株植物：挂上时钟（能量按当前值在本帧结算）并排期"""
+        if plant.clock is not self:
+            energy = plant.energy
+            plant.clock = self
+            plant.energy = energy
+        plant.wake = None
+        self.schedule(plant)
+
+    def schedule(self, plant):
+        """按植物当前能量重新计算唤醒帧"""
+        wake = plant.ready_tick()
+        if wake is not None and wake != plant.wake:  # 唤醒帧没变时原条目仍然有效
+            heapq.heappush(self._heap, (wake, plant.x, plant.y, next(self._seq), plant))
+        plant.wake = wake
+
+    def advance(self):
+        """进入下一个植物阶段，返回本帧到期的植物（跳过已死亡或已重新排期的旧条目）"""
+        self.now += 1
+        heap = self._heap
+        due = []
+        while heap and heap[0][0] <= self.now:
+            wake, _, _, _, plant = heapq.heappop(heap)
+            if not plant.dead and plant.wake == wake:
+                plant.wake = None
+                due.append(plant)
+        return due
@@ -0,0 +1,317 @@
+import numpy as np
+import pygame
+
+PREDATOR_COLOR = (255, 0, 0)
+PREY_COLOR = (0, 0, 255)
+PLANT_COLOR = (0, 255, 0)
+BACKGROUND_COLOR = (0, 0, 0)
+COLORS = {"predators": PREDATOR_COLOR, "prey": PREY_COLOR, "plants": PLANT_COLOR}
+SPECIES_NAMES = ("predators", "prey", "plants")
+HEAT_CHANNELS = {"predators": 0, "prey": 2, "plants": 1}  # 热力图里各物种占用的颜色通道
+HEAT_BIN = 4  # 热力图每格的屏幕像素
+
+
+def positions(species):
+    """取出一个物种的坐标数组 (x, y)，兼容对象列表、结构数组和回放的位置帧"""
+    if hasattr(species, "x"):
+        xs, ys = species.x, species.y
+    else:
+        n = len(species)
+        xs = np.fromiter((ind.x for ind in species), dtype=float, count=n)
+        ys = np.fromiter((ind.y for ind in species), dtype=float, count=n)
+    finite = np.isfinite(xs) & np.isfinite(ys)  # 结构数组引擎里尚未清理的nan个体不画
+    return xs[finite], ys[finite]
+
+
+def draw_rocks(surface, obstacles, camera=None):
+    """绘制岩石（与Environment.draw的样式一致）；给了镜头时按镜头换算位置和半径（可见性由调用者筛选）"""
+    if camera is None:
+        for rock in obstacles:
+            pygame.draw.circle(surface, (150, 150, 150), (int(rock.x), int(rock.y)), rock.radius)
+            pygame.draw.circle(surface, (100, 100, 100), (int(rock.x)+3, int(rock.y)-2), rock.radius//3)
+            pygame.draw.circle(surface, rock.color, (int(rock.x)-2, int(rock.y)+2), rock.radius//2)
+        return
+    zoom = camera.zoom
+    for rock in obstacles:
+        sx, sy = camera.to_screen(rock.x, rock.y)
+        sx, sy = int(sx), int(sy)
+        radius = max(1, int(rock.radius * zoom))
+        pygame.draw.circle(surface, (150, 150, 150), (sx, sy), radius)
+        pygame.draw.circle(surface, (100, 100, 100), (sx + int(3 * zoom), sy - int(2 * zoom)), radius // 3)
+        pygame.draw.circle(surface, rock.color, (sx - int(2 * zoom), sy + int(2 * zoom)), radius // 2)
+
+
+def visible(env, name, view):
+    """某物种在可见矩形view = (x0, y0, x1, y1)内的坐标。对象模型用环境的空间索引只查这块区域
+    （Environment.region）；结构数组、回放帧和后台快照本身就是坐标数组，直接向量化筛选"""
+    species = getattr(env, name)
+    x0, y0, x1, y1 = view
+    if not hasattr(species, "x") and hasattr(env, "region"):
+        return env.region(name, x0, y0, x1, y1)
+    xs, ys = positions(species)
+    inside = (xs >= x0) & (xs < x1) & (ys >= y0) & (ys < y1)
+    return xs[inside], ys[inside]
+
+
+def density_points(env, name, view):
+    """热力图的输入 (xs, ys, 权重)：对象模型用空间索引里可见格子的个体数（开销与格子数成正比），
+    坐标数组直接逐个体计数"""
+    species = getattr(env, name)
+    if not hasattr(species, "x") and hasattr(env, "density"):
+        return env.density(name, *view)
+    xs, ys = positions(species)
+    return xs, ys, None
+
+
+class Camera:
+    """镜头：世界坐标里可见区域的左上角(x, y)和缩放zoom（每个世界单位对应的屏幕像素）。
+    世界大小与窗口无关；zoom低于heatmap_below时远景按密度热力图绘制，不再逐个体绘制"""
+
+    MAX_ZOOM = 8.0
+
+    def __init__(self, screen_size, world_size, zoom=1.0, heatmap_below=0.5):
+        self.width, self.height = screen_size
+        self.world_width, self.world_height = world_size
+        self.heatmap_below = heatmap_below
+        self.x = 0.0
+        self.y = 0.0
+        self.zoom = min(max(zoom, self.min_zoom), self.MAX_ZOOM)
+        self.clamp()
+
+    @property
+    def min_zoom(self):
+        """整个世界正好放进窗口时的缩放"""
+        return min(self.width / self.world_width, self.height / self.world_height)
+
+    @property
+    def heatmap(self):
+        return self.zoom < self.heatmap_below
+
+    def view(self):
+        """可见区域 (x0, y0, x1, y1)，世界坐标"""
+        return (self.x, self.y, self.x + self.width / self.zoom, self.y + self.height / self.zoom)
+
+    def to_screen(self, xs, ys):
+        return (xs - self.x) * self.zoom, (ys - self.y) * self.zoom
+
+    def to_world(self, sx, sy):
+        return self.x + sx / self.zoom, self.y + sy / self.zoom
+
+    def clamp(self):
+        """不让镜头移出世界；可见区域比世界还大时居中"""
+        span_x = self.width / self.zoom
+        span_y = self.height / self.zoom
+        if span_x >= self.world_width:
+            self.x = (self.world_width - span_x) / 2
+        else:
+            self.x = min(max(self.x, 0.0), self.world_width - span_x)
+        if span_y >= self.world_height:
+            self.y = (self.world_height - span_y) / 2
+        else:
+            self.y = min(max(self.y, 0.0), self.world_height - span_y)
+
+    def pan(self, dx, dy):
+        """按屏幕像素平移"""
+        self.x += dx / self.zoom
+        self.y += dy / self.zoom
+        self.clamp()
+
+    def zoom_at(self, factor, sx=None, sy=None):
+        """以屏幕点(sx, sy)（默认窗口中心）为不动点缩放"""
+        if sx is None:
+            sx, sy = self.width / 2, self.height / 2
+        wx, wy = self.to_world(sx, sy)
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.MAX_ZOOM)
+        self.x = wx - sx / self.zoom
+        self.y = wy - sy / self.zoom
+        self.clamp()
+
+    def fit(self):
+        """缩放到能看到整个世界"""
+        self.zoom = self.min_zoom
+        self.clamp()
+
+    def handle_event(self, event):
+        """处理镜头相关的pygame事件（滚轮缩放、右键或中键拖动平移、Home看全图），处理了返回True"""
+        if event.type == pygame.MOUSEWHEEL:
+            sx, sy = pygame.mouse.get_pos()
+            self.zoom_at(1.25 ** event.y, sx, sy)
+            return True
+        if event.type == pygame.MOUSEMOTION and (event.buttons[1] or event.buttons[2]):
+            self.pan(-event.rel[0], -event.rel[1])
+            return True
+        if event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                self.zoom_at(1.25)
+                return True
+            if event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                self.zoom_at(0.8)
+                return True
+            if event.key == pygame.K_HOME:
+                self.fit()
+                return True
+        return False
+
+    def update(self, keys, dt):
+        """按住方向键连续平移（dt为秒，速度与缩放无关，按屏幕像素计）"""
+        step = 600 * dt
+        dx = (keys[pygame.K_RIGHT] - keys[pygame.K_LEFT]) * step
+        dy = (keys[pygame.K_DOWN] - keys[pygame.K_UP]) * step
+        if dx or dy:
+            self.pan(dx, dy)
+
+
+class Renderer:
+    """批量渲染：障碍物预先画在缓存的透明图层上，每帧整块贴出，
+    个体用预渲染的小精灵通过Surface.blits一次性贴出（sprites模式），
+    或直接按坐标数组写像素（pixels模式，适合上万个体）。
+    绘制顺序与Environment.draw相同：捕食者、被捕食者、岩石、植物"""
+
+    def __init__(self, screen, mode="sprites"):
+        self.screen = screen
+        self.mode = mode
+        self._rock_layer = None
+        self._obstacle_key = None
+        self._rocks = None  # 镜头绘制用的岩石坐标和半径数组：(键, xs, ys, rs)
+        # 精灵：与Environment.draw相同的半径4圆点和2x5植物条
+        self.sprites = {
+            "predators": self._dot_sprite(COLORS["predators"]),
+            "prey": self._dot_sprite(COLORS["prey"]),
+            "plants": self._rect_sprite(COLORS["plants"]),
+        }
+        self.offsets = {"predators": 4, "prey": 4, "plants": 0}  # 精灵左上角相对个体坐标的偏移
+
+    @staticmethod
+    def _dot_sprite(color):
+        sprite = pygame.Surface((9, 9))
+        sprite.fill(BACKGROUND_COLOR)
+        sprite.set_colorkey(BACKGROUND_COLOR)
+        pygame.draw.circle(sprite, color, (4, 4), 4)
+        return sprite
+
+    @staticmethod
+    def _rect_sprite(color):
+        sprite = pygame.Surface((2, 5))
+        sprite.fill(color)
+        return sprite
+
+    def invalidate(self):
+        """障碍物变化后调用，下一帧重建岩石图层"""
+        self._rock_layer = None
+
+    def _get_rock_layer(self, env, camera=None):
+        # 障碍物列表被替换（重新初始化/读档）或镜头移动、缩放时重建；背景色设为透明色，贴在动物之上。
+        # 镜头不动时（交互窗口的大多数帧）每帧只是整块贴图
+        view = None if camera is None else (camera.x, camera.y, camera.zoom, camera.heatmap)
+        key = (id(env.obstacles), len(env.obstacles), self.screen.get_size(), view)
+        if self._rock_layer is None or key != self._obstacle_key:
+            self._rock_layer = pygame.Surface(self.screen.get_size()).convert()
+            self._rock_layer.fill(BACKGROUND_COLOR)
+            if camera is None:
+                draw_rocks(self._rock_layer, env.obstacles)
+            else:
+                # 远景里只画屏幕上至少2像素的岩石
+                min_radius = 2 / camera.zoom if camera.heatmap else 0.0
+                draw_rocks(self._rock_layer, self._visible_rocks(env, camera.view(), min_radius), camera)
+            self._rock_layer.set_colorkey(BACKGROUND_COLOR)
+            self._obstacle_key = key
+        return self._rock_layer
+
+    def _visible_rocks(self, env, view, min_radius=0.0):
+        """与可见区域相交、且屏幕半径不小于min_radius的岩石（坐标数组缓存起来，向量化筛选）"""
+        key = (id(env.obstacles), len(env.obstacles))
+        if self._rocks is None or self._rocks[0] != key:
+            rocks = env.obstacles
+            self._rocks = (key, np.array([rock.x for rock in rocks], dtype=float),
+                           np.array([rock.y for rock in rocks], dtype=float),
+                           np.array([rock.radius for rock in rocks], dtype=float))
+        _, xs, ys, rs = self._rocks
+        x0, y0, x1, y1 = view
+        hit = (xs + rs >= x0) & (xs - rs <= x1) & (ys + rs >= y0) & (ys - rs <= y1) & (rs >= min_radius)
+        return [env.obstacles[i] for i in np.flatnonzero(hit).tolist()]
+
+    def draw(self, env, camera=None):
+        """绘制一帧：按物种批量贴个体，岩石图层贴在动物和植物之间（环境开启了探针时计入draw阶段）。
+        给了镜头时只绘制可见区域，远景画成密度热力图"""
+        profiler = getattr(env, "profiler", None)
+        draw = self._draw if camera is None else self._draw_camera
+        args = (env,) if camera is None else (env, camera)
+        if profiler is not None:
+            with profiler.phase("draw"):
+                draw(*args)
+        else:
+            draw(*args)
+
+    def _draw(self, env):
+        self.screen.fill(BACKGROUND_COLOR)
+        for name in SPECIES_NAMES:
+            if name == "plants":
+                self.screen.blit(self._get_rock_layer(env), (0, 0))
+            xs, ys = positions(getattr(env, name))
+            if len(xs) == 0:
+                continue
+            if self.mode == "pixels":
+                self._draw_pixels(name, xs, ys)
+            else:
+                self._draw_sprites(name, xs, ys)
+
+    def _draw_camera(self, env, camera):
+        """镜头绘制：只画可见区域；岩石图层按镜头位置和缩放缓存，镜头移动后才重建"""
+        view = camera.view()
+        if camera.heatmap:
+            self._draw_heatmap(env, camera)
+            self.screen.blit(self._get_rock_layer(env, camera), (0, 0))
+            return
+        self.screen.fill(BACKGROUND_COLOR)
+        for name in SPECIES_NAMES:
+            if name == "plants":
+                self.screen.blit(self._get_rock_layer(env, camera), (0, 0))
+            xs, ys = visible(env, name, view)
+            if len(xs) == 0:
+                continue
+            xs, ys = camera.to_screen(xs, ys)
+            if self.mode == "pixels":
+                self._draw_pixels(name, xs, ys)
+            else:
+                self._draw_sprites(name, xs, ys)
+
+    def _draw_heatmap(self, env, camera):
+        """远景：各物种的密度按对数缩放写进各自的颜色通道，每格HEAT_BIN像素，整张放大贴到屏幕"""
+        width, height = self.screen.get_size()
+        bins = (max(1, width // HEAT_BIN), max(1, height // HEAT_BIN))
+        view = camera.view()
+        x0, y0, x1, y1 = view
+        rgb = np.zeros(bins + (3,), dtype=np.uint8)
+        for name in SPECIES_NAMES:
+            xs, ys, weights = density_points(env, name, view)
+            if len(xs) == 0:
+                continue
+            counts, _, _ = np.histogram2d(xs, ys, bins=bins, range=((x0, x1), (y0, y1)), weights=weights)
+            peak = counts.max()
+            if peak > 0:
+                rgb[:, :, HEAT_CHANNELS[name]] = (255 * np.log1p(counts) / np.log1p(peak)).astype(np.uint8)
+        heat = pygame.surfarray.make_surface(rgb)
+        self.screen.blit(pygame.transform.scale(heat, (bins[0] * HEAT_BIN, bins[1] * HEAT_BIN)), (0, 0))
+
+    def _draw_sprites(self, name, xs, ys):
+        sprite = self.sprites[name]
+        offset = self.offsets[name]
+        coords = zip((xs.astype(np.int64) - offset).tolist(), (ys.astype(np.int64) - offset).tolist())
+        self.screen.blits([(sprite, xy) for xy in coords], doreturn=False)
+
+    def _draw_pixels(self, name, xs, ys):
+        """直接写像素：每个个体画一个3x3的点"""
+        width, height = self.screen.get_size()
+        xs = xs.astype(np.int64)
+        ys = ys.astype(np.int64)
+        color = self.screen.map_rgb(COLORS[name])
+        pixels = pygame.surfarray.pixels2d(self.screen)
+        try:
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    px = xs + dx
+                    py = ys + dy
+                    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+                    pixels[px[inside], py[inside]] = color
+        finally:
+            del pixels  # 释放对screen的锁定
@@ -1,95 +1,432 @@
-from 基因与状态 import Predator, Prey,Plant,Rock  # 导入子类
+from 基因与状态 import Predator, Prey,Plant,Rock, ENERGY_PARAMS, GENE_PARAMS, GENE_RANGES  # 导入子类
+from 空间索引 import SpatialGrid, Snapshot, match_within
+from 随机数 import make_rng
+from 统计 import PopulationStats, gene_matrix
+from 障碍栅格 import ObstacleMap
+from 性能探针 import Profiler
+from 植物调度 import PlantSchedule
+from 细节层次 import LevelOfDetail
+from 事件记录 import EventRecorder, EATEN, CULLED
+from 帧预算 import FrameBudget
+import time
 import numpy as np
-import random
-import pygame
+
+
+def _coordinates(individuals):
+    """个体列表的坐标数组 (xs, ys)，下标与列表一致"""
+    n = len(individuals)
+    return (np.fromiter((ind.x for ind in individuals), dtype=float, count=n),
+            np.fromiter((ind.y for ind in individuals), dtype=float, count=n))
+
 
 class Environment:
-    def __init__(self, width=800, height=600):
+    PHASES = ("plants", "predators", "prey", "births")  # update()依次调用的 _update_<阶段> 方法
+    # 被捕食者快照建好之后它们又移动了一次，区域查询向外放宽这么多再按当前坐标精确筛选
+    REGION_MARGIN = 20.0
+    LOD = True  # 各阶段是否使用self.lod（帧预算调度据此决定能否让拥挤物种休眠）
+    
+    def __init__(self, width=800, height=600, seed=None):
         self.width = width
         self.height = height
+        # 环境自己的随机数：rng为NumPy Generator（批量抽样），random为其标量缓冲流，
+        # 所有个体都从这里取随机数，同一种子可逐位复现
+        self.seed = seed
+        self.rng, self.random = make_rng(seed)
         self.predators = []
         self.prey = []
         self.plants = []  # 新增植物列表
         self.obstacles = []
-        self.stats = {"predators": [], "prey": [],"plants":[]}  # 记录每代数量
+        self.rebuild_obstacle_map()
+        self.stats = self._new_stats()  # 每帧种群数量（固定大小的环形缓冲区）
+        self.tick = 0  # 已完成的帧数
+        self.autosave = None  # 定期自动存档（见enable_autosave）
+        self.profiler = None  # 运行时探针（见enable_profiling），None时不做任何记录
+        self.lod = None  # 细节层次调度（见enable_lod），None时所有个体每帧完整更新
+        self.recorder = None  # 事件与轨迹记录（见enable_recording）
+        self.governor = None  # 帧预算调度（见enable_governor），None时不计时也不降级
+        # 每个阶段的存活个体快照（带空间索引）：格子边长不大于最小的感知/取食半径，
+        # 最近邻查询只访问附近格子
+        self.cell_size = 10.0
+        self.predator_view = Snapshot((), self.cell_size)
+        self.prey_view = Snapshot((), self.cell_size)
+        # 植物不动：空间索引常驻，出生时插入、死亡时移除，不必每帧重建；
+        # 调度器只在植物需要繁殖的那一帧唤醒它（见植物调度.py）
+        self.plant_view = SpatialGrid(self.cell_size)
+        self.plant_schedule = PlantSchedule()
+        self._scheduled_plants = None  # 调度器接管的植物列表，列表被整体替换时重建
+        self._plant_order = {}  # 植物 -> 加入列表的序号（序号的先后就是列表顺序，取食按它选植物）
+        self._plant_count = 0
+        self._plant_deaths = 0  # 本帧死亡的植物数，为0时帧末不必压缩植物列表
     
     def add_individuals(self, n_predators=20, n_prey=50,n_plants=0,n_obstacles=10):
-        """初始化个体"""
-        self.predators = [Predator(random.uniform(0, self.width), random.uniform(0, self.height)) 
-                          for _ in range(n_predators)]
-        self.prey = [Prey(random.uniform(0, self.width), random.uniform(0, self.height)) 
-                     for _ in range(n_prey)]
-        self.plants = [Plant(random.uniform(10, self.width - 10), random.uniform(10, self.height- 10)) 
-                           for _ in range(n_plants)]  # 初始化植物
-        self.obstacles = [Rock(
-                x=random.uniform(20, self.width-20),
-                y=random.uniform(20, self.height-20),
-                radius=random.randint(10, 50)
-            )
-            for _ in range(n_obstacles)
-        ]
+        """初始化个体（位置和基因整批抽样）"""
+        rng = self.rng
+        self.predators = [Predator(x, y, genes, rng=self.random, mutate=False)
+                          for x, y, genes in zip(rng.uniform(0, self.width, n_predators),
+                                                 rng.uniform(0, self.height, n_predators),
+                                                 self._random_genes(n_predators))]
+        self.prey = [Prey(x, y, genes, rng=self.random, mutate=False)
+                     for x, y, genes in zip(rng.uniform(0, self.width, n_prey),
+                                            rng.uniform(0, self.height, n_prey),
+                                            self._random_genes(n_prey))]
+        self.plants = [Plant(x, y, genes, rng=self.random, mutate=False)
+                       for x, y, genes in zip(rng.uniform(10, self.width - 10, n_plants),
+                                              rng.uniform(10, self.height - 10, n_plants),
+                                              self._random_genes(n_plants))]  # 初始化植物
+        self.obstacles = self._random_obstacles(n_obstacles)
+        self.rebuild_obstacle_map()
+        # 第一帧之前也能按区域查询（绘制用）
+        self.predator_view = Snapshot(self.predators, self.cell_size)
+        self.prey_view = Snapshot(self.prey, self.cell_size)
+    
+    def rebuild_obstacle_map(self):
+        """障碍物或世界尺寸变化后重新栅格化（障碍物静止，平时不需要调用）"""
+        self.obstacle_map = ObstacleMap(self.obstacles, self.width, self.height,
+                                        Plant.min_obstacle_distance, Plant.border_buffer)
+    
+    def _new_stats(self):
+        """新建环境时的种群统计（集合引擎改为按世界记录）"""
+        return PopulationStats()
+    
+    def _ensure_obstacle_map(self):
+        if not self.obstacle_map.matches(self.obstacles, self.width, self.height):
+            self.rebuild_obstacle_map()
+    
+    def rebuild_plant_schedule(self):
+        """植物列表被整体替换（初始化、读档）后重建调度队列和植物索引"""
+        self.plant_schedule.clear()
+        self.plant_view = SpatialGrid(self.cell_size)
+        self._plant_order = {}
+        self._plant_count = 0
+        for plant in self.plants:
+            self.plant_schedule.add(plant)
+            self.plant_view.insert(plant)
+            self._number_plant(plant)
+        self._scheduled_plants = self.plants
+
+    def _number_plant(self, plant):
+        # 植物只会追加到列表末尾、压缩时保持相对顺序，所以递增的序号与列表下标同序
+        self._plant_order[plant] = self._plant_count
+        self._plant_count += 1
+    
+    def _ensure_plant_schedule(self):
+        if self.plants is not self._scheduled_plants:
+            self.rebuild_plant_schedule()
+    
+    def _random_gene_matrix(self, n):
+        """按GENE_RANGES一次抽出n个个体的基因，形状 (n, 基因数)"""
+        low = np.array([GENE_RANGES[param][0] for param in GENE_PARAMS], dtype=float)
+        high = np.array([GENE_RANGES[param][1] for param in GENE_PARAMS], dtype=float)
+        return self.rng.uniform(low, high, size=(n, len(GENE_PARAMS)))
+    
+    def _mutate(self, genes):
+        """批量基因变异：每个基因5%概率波动±20%"""
+        mask = self.rng.random(genes.shape) < 0.05
+        factor = np.where(mask, self.rng.uniform(0.8, 1.2, genes.shape), 1.0)
+        return genes * factor
+    
+    def _random_genes(self, n):
+        return self._random_gene_matrix(n).tolist()  # 每行按GENE_PARAMS顺序
+    
+    def _random_obstacles(self, n):
+        return [Rock(x=x, y=y, radius=r)
+                for x, y, r in zip(self.rng.uniform(20, self.width - 20, n).tolist(),
+                                   self.rng.uniform(20, self.height - 20, n).tolist(),
+                                   self.rng.integers(10, 51, n).tolist())]
     
    
     
     def is_alive(self, individual):
-        """扩展存活检查：覆盖植物"""
-        alive = (
-            individual.energy > 0
+        """扩展存活检查：覆盖植物（纯检查，不修改种群列表）"""
+        return (
+            not individual.dead
+            and individual.energy > 0
             and 0 <= individual.x <= self.width
             and 0 <= individual.y <= self.height
         )
-        if not alive:
-            # 根据类型移除死亡个体
-            if isinstance(individual, Predator):
-                self.predators.remove(individual)
-            elif isinstance(individual, Prey):
-                self.prey.remove(individual)
-            elif isinstance(individual, Plant):
-                self.plants.remove(individual)
-        return alive
-    
-    def remove_individual(self, individual):
-        """移除死亡个体"""
-        if individual in self.predators:
-            self.predators.remove(individual)
-        elif individual in self.prey:
-            self.prey.remove(individual)
+    
+    def remove_individual(self, individual, cause=EATEN):
+        """标记个体死亡，实际移除推迟到本帧结束时统一压缩"""
+        individual.dead = True
+        if self.profiler is not None:
+            self.profiler.count("kills" if cause == EATEN else "culled")
+        if self.recorder is not None:
+            self.recorder.death(individual, cause)
+        if isinstance(individual, Predator):
+            self.predator_view.discard(individual)
+        elif isinstance(individual, Prey):
+            self.prey_view.discard(individual)
+        elif isinstance(individual, Plant):
+            self.plant_view.remove(individual)
+            self._plant_order.pop(individual, None)
+            self._plant_deaths += 1
+    
+    def cull(self, name, capacity):
+        """承载量剔除：物种name（predators/prey/plants）的存活个体超过capacity时，
+        用环境的随机数均匀抽出多出的部分移除（事件记录里死因为CULLED），返回移除的个数"""
+        alive = [ind for ind in getattr(self, name) if self.is_alive(ind)]
+        excess = len(alive) - capacity
+        if excess <= 0:
+            return 0
+        for i in np.sort(self.rng.choice(len(alive), excess, replace=False)).tolist():
+            self.remove_individual(alive[i], CULLED)
+        self.compact()
+        return excess
+    
+    def compact(self):
+        """一次性移除所有死亡个体（每帧结束时调用，代替逐个list.remove）"""
+        if self.recorder is not None:
+            self.recorder.sweep(self)
+        self.predators = [p for p in self.predators if self.is_alive(p)]
+        self.prey = [p for p in self.prey if self.is_alive(p)]
+        if self._plant_deaths:
+            # 植物只会因被吃掉而死亡（都经过remove_individual），没有死亡时整个列表原样保留
+            self.plants = [p for p in self.plants if not p.dead]
+            self._scheduled_plants = self.plants
+            self._plant_deaths = 0
     
     def update(self):
-        """更新所有个体状态"""
-        for plant in self.plants[:]:  # 遍历副本避免修改原列表
-            if self.is_alive(plant):
-                # 植物更新：返回None或新个体（繁殖的后代）
-                new_plant = plant.update(self)
-                if new_plant:
-                    self.plants.append(new_plant)
-            else:
-                self.plants.remove(plant)
+        """更新所有个体状态：植物、捕食者、被捕食者依次更新，帧末统一清理和繁殖"""
+        self._ensure_obstacle_map()  # 外部直接替换了obstacles时兜底重建
+        start = time.perf_counter() if self.governor is not None else None
+        profiler = self.profiler
+        if profiler is None:
+            for phase in self.PHASES:
+                getattr(self, "_update_" + phase)()
+            self.stats.record(self)  # 记录当前种群数量
+        else:
+            for phase in self.PHASES:
+                with profiler.phase(phase):
+                    getattr(self, "_update_" + phase)()
+            with profiler.phase("stats"):
+                self.stats.record(self)
+            profiler.end_tick()
+        if self.recorder is not None:
+            self.recorder.end_tick(self)
+        self.tick += 1
+        if self.governor is not None:
+            self.governor.end_tick(self, time.perf_counter() - start)
+        if self.autosave:
+            self.autosave(self)
+    
+    def enable_profiling(self, window=30):
+        """开启运行时探针，返回Profiler（各阶段耗时和计数器取最近window帧平均）"""
+        self.profiler = Profiler(window)
+        return self.profiler
+    
+    def disable_profiling(self):
+        self.profiler = None
+    
+    def enable_recording(self, directory, frame_every=10):
+        """把出生、死亡、捕食、取食事件和每frame_every帧的位置写进directory（见事件记录.py），
+        返回EventRecorder"""
+        self.disable_recording()
+        self.recorder = EventRecorder(directory, self, frame_every)
+        return self.recorder
+    
+    def disable_recording(self):
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+    
+    def enable_lod(self, interval=8, max_drift=5.0):
+        """开启细节层次调度：邻域内没有其他个体的捕食者/被捕食者休眠，用廉价直线运动更新，
+        最多每interval帧重新检查一次邻域；max_drift为允许的位置均方根偏差。返回LevelOfDetail"""
+        self.lod = LevelOfDetail(interval, max_drift)
+        return self.lod
+    
+    def disable_lod(self):
+        self.lod = None
+    
+    def enable_governor(self, budget_ms=33.0, **options):
+        """开启帧预算调度：每帧耗时持续超过budget_ms时依次降低绘制频率、让拥挤的物种改用
+        细节层次调度、按承载量剔除，耗时回落后逐级恢复（见帧预算.py）。返回FrameBudget"""
+        self.governor = FrameBudget(budget_ms, **options)
+        return self.governor
+    
+    def disable_governor(self):
+        if self.governor is not None:
+            self.governor.release(self)
+            self.governor = None
+    
+    def _update_plants(self):
+        """植物阶段：能量按帧数解析计算，只唤醒本帧达到繁殖阈值的植物播种"""
+        self._ensure_plant_schedule()
+        schedule = self.plant_schedule
+        due = schedule.advance()
+        # 新生个体先放进born，阶段结束后再加入列表，本帧不参与更新
+        born = []
+        parents = []
+        for plant in due:
+            # 植物更新：返回None或新个体（繁殖的后代）
+            new_plant = plant.update(self)
+            schedule.schedule(plant)
+            if new_plant:
+                born.append(new_plant)
+                parents.append(plant)
+        if self.recorder is not None:
+            self.recorder.births(born, parents)
+        for plant in born:
+            schedule.add(plant)
+            self.plant_view.insert(plant)
+            self._number_plant(plant)
+        self.plants.extend(born)
+        if self.profiler is not None:
+            self.profiler.count("plants_processed", len(due))
+            self.profiler.count("plant_births", len(born))
+    
+    def _update_predators(self):
+        """捕食者阶段：追捕、代谢，全部移动完后一次结算捕获"""
+        # 每个阶段开始时建一次存活快照，所有个体共用
+        self.prey_view = Snapshot([p for p in self.prey if self.is_alive(p)], self.cell_size)
         # 更新捕食者
-        for predator in self.predators[:]:
-            if self.is_alive(predator):
-                predator.move(self)
-                predator.check_hunt(self)
-                predator.update()
-                if predator.can_reproduce():
-                    self.predators.append(predator.reproduce())
-        
-        # 更新被捕食者
-        for prey in self.prey[:]:
-            if self.is_alive(prey):
-                prey.move(self)
-                prey.eat_plants(self)
-                prey.update()
-                if prey.can_reproduce():
-                    self.prey.append(prey.reproduce())
+        checks = self.obstacle_map.checks
+        hunters = [p for p in self.predators if self.is_alive(p)]
+        active, idle = hunters, ()
+        if self.lod is not None:
+            active, idle = self.lod.split(self, hunters, [(self.prey_view.individuals, None)])
+        for predator in active:
+            predator.move(self, self.prey_view)
+            predator.update()
+        for predator in idle:
+            predator.coast(self)
+            predator.update()
+        self._resolve_hunting(hunters, self.prey_view.individuals)
+        if self.profiler is not None:
+            # 每个捕食者找猎物的nearest查询（捕获结算的候选配对在_resolve_hunting里计入）
+            self.profiler.count("spatial_queries", self.prey_view.index.queries)
+            self.profiler.count("distance_checks", self.prey_view.index.checks)
+            self.profiler.count("predators_processed", len(hunters))
+            self.profiler.count("lod_sleeping", len(idle))
+            self.profiler.count("collision_checks", self.obstacle_map.checks - checks)  # 实际精确检测的岩石数
+    
+    def _update_prey(self):
+        """被捕食者阶段：逃跑或觅食、取食、代谢"""
+        self.predator_view = Snapshot([p for p in self.predators if self.is_alive(p)], self.cell_size)
+        checks = self.obstacle_map.checks
+        plant_queries, plant_checks = self.plant_view.queries, self.plant_view.checks
+        grazers = [p for p in self.prey if self.is_alive(p)]
+        active, idle = grazers, ()
+        if self.lod is not None:
+            groups = [(self.predator_view.individuals, None)]
+            if len(self.predator_view):  # 没有捕食者时被捕食者只随机移动，不找植物
+                groups.append((self.plants, Prey.eating_range))
+            active, idle = self.lod.split(self, grazers, groups)
+        for prey in active:
+            prey.move(self, self.predator_view, self.plant_view)
+            prey.update()
+        for prey in idle:
+            prey.coast(self)
+            prey.update()
+        self._resolve_grazing(grazers)
+        if self.profiler is not None:
+            # 逃跑/觅食的nearest查询和取食结算的query_radius（植物索引常驻，按本阶段的增量计）
+            self.profiler.count("spatial_queries", self.predator_view.index.queries
+                                + self.plant_view.queries - plant_queries)
+            self.profiler.count("distance_checks", self.predator_view.index.checks
+                                + self.plant_view.checks - plant_checks)
+            self.profiler.count("prey_processed", len(grazers))
+            self.profiler.count("lod_sleeping", len(idle))
+            self.profiler.count("collision_checks", self.obstacle_map.checks - checks)
+    
+    def _resolve_hunting(self, hunters, prey):
+        """捕获结算：一次网格宽相位找出捕获距离内的所有配对，按捕食者顺序，
+        每个捕食者吃还没被吃掉的、列表最靠前的猎物（与逐个检查的结果一致）"""
+        hunter, caught = match_within(*_coordinates(hunters), *_coordinates(prey), 1.0, profiler=self.profiler)
+        gain = ENERGY_PARAMS["hunt_gain"]
+        for i, j in zip(hunter.tolist(), caught.tolist()):
+            hunters[i].energy += gain
+            if self.recorder is not None:
+                self.recorder.hunt(hunters[i], prey[j])
+            self.remove_individual(prey[j])
+        if self.profiler is not None:
+            self.profiler.count("contact_pairs", hunter.size)
+    
+    def _resolve_grazing(self, grazers):
+        """取食结算：按猎物顺序，每只猎物吃1.0范围内（在常驻植物索引里）列表最靠前的、
+        还没被前面的猎物吃光的植物（与逐个检查的结果一致）；每株植物被啃的总量一次性be_eaten，
+        能量耗尽的植物移除，其余按新能量重新排期。开销只与猎物数有关，与植物总数无关"""
+        bite = ENERGY_PARAMS["graze_bite"]
+        gain = ENERGY_PARAMS["graze_gain"]
+        order = self._plant_order
+        bites = {}  # 植物 -> 本帧被啃的口数（按猎物顺序累计）
+        for prey in grazers:
+            found = self.plant_view.query_radius(prey.x, prey.y, 1.0)
+            if len(found) > 1:
+                found.sort(key=order.__getitem__)
+            for plant in found:
+                # 第n口之前已被啃掉bite*n，能量仍大于0才吃得到，否则换下一株
+                n = bites.get(plant, 0)
+                if plant.energy - bite * n > 0:
+                    bites[plant] = n + 1
+                    prey.energy += gain
+                    if self.recorder is not None:
+                        self.recorder.graze(prey, plant)
+                    break
+        for plant, n in bites.items():
+            if plant.be_eaten(amount=bite * n):
+                self.remove_individual(plant)
+            else:
+                self.plant_schedule.schedule(plant)
+        if self.profiler is not None:
+            self.profiler.count("contact_pairs", sum(bites.values()))
+    
+    def _update_births(self):
+        """帧末：清理死亡个体，捕食者和被捕食者整批繁殖"""
+        # 本帧死亡的个体统一压缩掉
+        size = len(self.predators) + len(self.prey) + len(self.plants)
+        self.compact()
+        removed = size - len(self.predators) - len(self.prey) - len(self.plants)
         
-        # 记录当前种群数量
-        self.stats["predators"].append(len(self.predators))
-        self.stats["prey"].append(len(self.prey))
-        self.stats["plants"].append(len(self.plants))
+        # 繁殖放在帧末整批进行
+        predator_born = self._reproduce(self.predators, Predator)
+        prey_born = self._reproduce(self.prey, Prey)
+        self.predators.extend(predator_born)
+        self.prey.extend(prey_born)
+        for child in predator_born:
+            self.predator_view.add(child)
+        for child in prey_born:
+            self.prey_view.add(child)
+        if self.profiler is not None:
+            self.profiler.count("removed", removed)
+            self.profiler.count("animal_births", len(predator_born) + len(prey_born))
+    
+    def _reproduce(self, species, cls):
+        """能量超过繁殖阈值的个体各分裂出一个后代：位置偏移、变异掩码和
+        波动系数都整批抽样，返回新个体列表（由调用者追加到种群）"""
+        parents = [ind for ind in species if ind.can_reproduce()]
+        if not parents:
+            return []
+        n = len(parents)
+        xs = np.empty(n)
+        ys = np.empty(n)
+        for i, parent in enumerate(parents):
+            parent.energy /= 2  # 繁殖消耗能量
+            xs[i] = parent.x
+            ys[i] = parent.y
+        xs += self.rng.uniform(-1, 1, n)  # 后代出生在附近
+        ys += self.rng.uniform(-1, 1, n)
+        genes = self._mutate(gene_matrix(parents))
+        children = cls.spawn(xs, ys, genes, self.rng)
+        if self.recorder is not None:
+            self.recorder.births(children, parents)
+        return children
+    
+    def enable_autosave(self, path, every=1000):
+        """每every帧自动把完整状态存档到path，崩溃后可用load_checkpoint恢复"""
+        from 存档 import AutoCheckpoint
+        self.autosave = AutoCheckpoint(path, every)
     
     def draw(self, screen):
         """绘制所有个体"""
+        if self.profiler is not None:
+            with self.profiler.phase("draw"):
+                self._draw(screen)
+        else:
+            self._draw(screen)
+    
+    def _draw(self, screen):
+        import pygame  # 只有绘制时才需要pygame，无界面运行不会导入
         screen.fill((0, 0, 0))  # 黑色背景
         # 绘制捕食者（红色）
         for predator in self.predators:
@@ -105,9 +442,28 @@ class Environment:
             pygame.draw.rect(screen, (0, 255, 0), (int(plant.x), int(plant.y), 2, 5))
             
     
+    def _region_index(self, name):
+        """绘制查询用的空间索引和放宽距离：植物用常驻索引，动物用本帧的快照"""
+        if name == "plants":
+            self._ensure_plant_schedule()
+            return self.plant_view, 0.0
+        if name == "predators":
+            return self.predator_view.index, 0.0  # 捕食者快照建于它们移动之后
+        return self.prey_view.index, self.REGION_MARGIN
+    
+    def region(self, name, x0, y0, x1, y1):
+        """某物种落在矩形[x0, x1)×[y0, y1)内的存活个体坐标 (xs, ys)。
+        只查空间索引覆盖这块区域的格子，开销与区域内的个体数成正比，与总数无关"""
+        index, margin = self._region_index(name)
+        found = [ind for ind in index.query_rect(x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+                 if x0 <= ind.x < x1 and y0 <= ind.y < y1 and self.is_alive(ind)]
+        return _coordinates(found)
+    
+    def density(self, name, x0, y0, x1, y1):
+        """某物种在矩形区域内按空间索引格子聚合的 (格子中心x, 格子中心y, 个体数)，给远景热力图用"""
+        index, _ = self._region_index(name)
+        return index.cell_counts(x0, y0, x1, y1)
+    
     def check_collision_with_obstacle(self, x, y, radius):
         """检查个体当前位置是否与障碍物碰撞"""
-        for obs in self.obstacles:
-            if obs.collides_with(x, y, radius):
-                return True
-        return False
\ No newline at end of file
+        return self.obstacle_map.first_collision(x, y, radius) is not None
\ No newline at end of file
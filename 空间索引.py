@@ -0,0 +1,324 @@
+import itertools
+import math
+
+import numpy as np
+
+
+class SpatialGrid:
+    """均匀网格空间索引：按坐标把个体分到边长为cell_size的格子里，
+    最近邻查询只检查查询半径覆盖到的那几个格子"""
+
+    def __init__(self, cell_size=10.0):
+        self.cell_size = cell_size
+        self.cells = {}  # (格子列, 格子行) -> 个体列表
+        self.count = 0
+        self.queries = 0  # 累计的nearest/query_radius调用次数（性能探针按阶段取差值）
+        self.checks = 0  # 累计计算过的距离个数
+
+    def __len__(self):
+        return self.count
+
+    def _key(self, x, y):
+        return (int(x // self.cell_size), int(y // self.cell_size))
+
+    def build(self, individuals):
+        """按个体当前位置重建索引（每帧每个阶段开始时调用一次）"""
+        self.cells = {}
+        for ind in individuals:
+            self.insert(ind)
+
+    def insert(self, individual):
+        key = self._key(individual.x, individual.y)
+        bucket = self.cells.get(key)
+        if bucket is None:
+            self.cells[key] = [individual]
+        else:
+            bucket.append(individual)
+        self.count += 1
+
+    def remove(self, individual):
+        """移除个体（要求个体入索引后没有移动过）"""
+        bucket = self.cells.get(self._key(individual.x, individual.y))
+        if bucket is None or individual not in bucket:
+            return False
+        bucket.remove(individual)
+        self.count -= 1
+        return True
+
+    def nearest(self, x, y, radius):
+        """查找距离严格小于radius的最近个体，返回(个体, 距离)，找不到时个体为None"""
+        size = self.cell_size
+        cells = self.cells
+        best = None
+        best_dist = radius
+        checks = 0
+        for cx in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for cy in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket:
+                    continue
+                checks += len(bucket)
+                for ind in bucket:
+                    dist = math.hypot(ind.x - x, ind.y - y)
+                    if dist < best_dist:
+                        best = ind
+                        best_dist = dist
+        self.queries += 1
+        self.checks += checks
+        return best, best_dist
+
+    def query_radius(self, x, y, radius):
+        """返回距离严格小于radius的所有个体"""
+        size = self.cell_size
+        cells = self.cells
+        found = []
+        checks = 0
+        for cx in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for cy in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                bucket = cells.get((cx, cy))
+                if not bucket:
+                    continue
+                checks += len(bucket)
+                for ind in bucket:
+                    if math.hypot(ind.x - x, ind.y - y) < radius:
+                        found.append(ind)
+        self.queries += 1
+        self.checks += checks
+        return found
+
+    def _cells_in(self, x0, y0, x1, y1):
+        """矩形[x0, x1)×[y0, y1)覆盖到的非空格子 (键, 个体列表)。
+        覆盖的格子比非空格子还多时（矩形很大），改为遍历非空格子"""
+        size = self.cell_size
+        cx0, cx1 = int(x0 // size), int(x1 // size)
+        cy0, cy1 = int(y0 // size), int(y1 // size)
+        cells = self.cells
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            return [(key, bucket) for key, bucket in cells.items()
+                    if bucket and cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1]
+        found = []
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.append(((cx, cy), bucket))
+        return found
+
+    def query_rect(self, x0, y0, x1, y1):
+        """矩形覆盖到的格子里的所有个体（候选，调用者再按坐标精确筛选）"""
+        found = []
+        for _, bucket in self._cells_in(x0, y0, x1, y1):
+            found.extend(bucket)
+        return found
+
+    def cell_counts(self, x0, y0, x1, y1):
+        """矩形覆盖到的非空格子的 (格子中心x, 格子中心y, 个体数) 三个数组，给热力图这类聚合显示用，
+        开销与格子数成正比而不是与个体数成正比"""
+        size = self.cell_size
+        cells = self.cells
+        n = len(cells)
+        if (int(x1 // size) - int(x0 // size) + 1) * (int(y1 // size) - int(y0 // size) + 1) <= n:
+            occupied = self._cells_in(x0, y0, x1, y1)
+            keys = np.array([key for key, _ in occupied], dtype=float).reshape(-1, 2)
+            counts = np.array([len(bucket) for _, bucket in occupied], dtype=float)
+        else:
+            # 大矩形：整张表一次性转成数组再向量化筛选
+            keys = np.fromiter(itertools.chain.from_iterable(cells), dtype=float, count=2 * n).reshape(n, 2)
+            counts = np.fromiter(map(len, cells.values()), dtype=float, count=n)
+            counts[(keys[:, 0] < x0 // size) | (keys[:, 0] > x1 // size)
+                   | (keys[:, 1] < y0 // size) | (keys[:, 1] > y1 // size)] = 0
+        xs = (keys[:, 0] + 0.5) * size
+        ys = (keys[:, 1] + 0.5) * size
+        keep = counts > 0
+        return xs[keep], ys[keep], counts[keep]
+
+
+class Snapshot:
+    """某个阶段开始时一个物种的存活个体快照：不可变元组 + 空间索引。
+    Environment.update每个阶段只建一次，传给所有个体共用；
+    阶段内死亡的个体只从索引中移除，元组本身不变"""
+
+    def __init__(self, individuals, cell_size=10.0):
+        self.individuals = tuple(individuals)
+        self.index = SpatialGrid(cell_size)
+        self.index.build(self.individuals)
+
+    def __len__(self):
+        """阶段内仍存活的个体数"""
+        return len(self.index)
+
+    def nearest(self, x, y, radius):
+        return self.index.nearest(x, y, radius)
+
+    def discard(self, individual):
+        self.index.remove(individual)
+
+    def add(self, individual):
+        """帧末新生的个体也放进索引，只供绘制时的区域查询（模拟的下一个阶段会重建快照）"""
+        self.index.insert(individual)
+
+
+def _cell_keys(cx, cy):
+    """把二维格子坐标编码成一个int64，便于排序和二分查找"""
+    return cx * (1 << 32) + cy
+
+
+def cell_ranges(ax, ay, bx, by, radius, a_group=None, b_group=None):
+    """pairs_within的格子部分（编译内核也用它）：b按格子键排序，a按格子排序后
+    对相邻三列各做一次二分查找。a或b为空时返回None，否则返回
+    (radius, a_order, start, end, order)：第k个a（原下标a_order[k]）在第j列的候选b为
+    order[start[j, k]:end[j, k]]，radius已展开成与a等长的数组"""
+    if ax.size == 0 or bx.size == 0:
+        return None
+    radius = np.broadcast_to(np.asarray(radius, dtype=float), ax.shape)
+    # 格子边长取最大查询半径，这样只需检查相邻的3x3个格子
+    cell = max(float(radius.max()), 1e-9)
+    bcx = np.floor(bx / cell).astype(np.int64)
+    acx = np.floor(ax / cell).astype(np.int64)
+    acy = np.floor(ay / cell).astype(np.int64)
+    if a_group is not None:
+        # 组号编进格子的x坐标（整数运算，不改变距离的计算），不同组的格子互不相邻
+        finite = np.concatenate([acx[np.isfinite(ax)], bcx[np.isfinite(bx)]])
+        if finite.size:
+            low = finite.min()
+            span = finite.max() - low + 3
+            acx = acx - low + np.asarray(a_group, dtype=np.int64) * span
+            bcx = bcx - low + np.asarray(b_group, dtype=np.int64) * span
+    b_keys = _cell_keys(bcx, np.floor(by / cell).astype(np.int64))
+    order = np.argsort(b_keys, kind="stable")
+    sorted_keys = b_keys[order]
+    # a也按格子排序：相邻格子的键是整体平移，仍然有序，二分查找按顺序访问快得多
+    a_keys = _cell_keys(acx, acy)
+    a_order = np.argsort(a_keys, kind="stable")
+    a_keys = a_keys[a_order]
+    # 同一列上下相邻的3个格子键值连续，一次二分查找就能取出整段
+    start = np.empty((3, ax.size), dtype=np.intp)
+    end = np.empty((3, ax.size), dtype=np.intp)
+    for j, ox in enumerate((-1, 0, 1)):
+        start[j] = np.searchsorted(sorted_keys, a_keys + _cell_keys(ox, -1), side="left")
+        end[j] = np.searchsorted(sorted_keys, a_keys + _cell_keys(ox, 1), side="right")
+    return radius, a_order, start, end, order
+
+
+def pairs_within(ax, ay, bx, by, radius, a_group=None, b_group=None, profiler=None):
+    """向量化的网格宽相位：找出所有距离严格小于radius的(a, b)配对
+    radius可以是标量，也可以是与a等长的数组（每个a自己的查询半径）
+    a_group/b_group为每个点所属的组（如集合引擎里的世界编号），给出时只配对同组的点
+    给出profiler时把计算过距离的候选配对数计入distance_checks
+    返回 (a下标, b下标, 距离) 三个数组"""
+    ax, ay = np.asarray(ax, dtype=float), np.asarray(ay, dtype=float)
+    bx, by = np.asarray(bx, dtype=float), np.asarray(by, dtype=float)
+    empty = (np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp), np.empty(0))
+    cells = cell_ranges(ax, ay, bx, by, radius, a_group, b_group)
+    if cells is None:
+        return empty
+    radius, a_order, starts, ends, order = cells
+
+    a_parts, b_parts = [], []
+    for start, end in zip(starts, ends):
+        counts = end - start
+        total = counts.sum()
+        if total == 0:
+            continue
+        # 把每个a的候选区间[start, end)展开成一维配对
+        a_idx = np.repeat(a_order, counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        a_parts.append(a_idx)
+        b_parts.append(order[np.repeat(start, counts) + offsets])
+    if not a_parts:
+        return empty
+    a_idx = np.concatenate(a_parts)
+    b_idx = np.concatenate(b_parts)
+    dist = np.hypot(bx[b_idx] - ax[a_idx], by[b_idx] - ay[a_idx])
+    if profiler is not None:
+        profiler.count("distance_checks", dist.size)
+    hit = dist < radius[a_idx]
+    return a_idx[hit], b_idx[hit], dist[hit]
+
+
+def nearest_within(ax, ay, radius, bx, by, a_group=None, b_group=None):
+    """对每个a找半径内最近的b，返回 (b下标, 距离)，找不到的位置为 -1 / inf"""
+    n = len(ax)
+    target = np.full(n, -1, dtype=np.intp)
+    best = np.full(n, np.inf)
+    a_idx, b_idx, dist = pairs_within(ax, ay, bx, by, radius, a_group, b_group)
+    if a_idx.size:
+        order = np.lexsort((b_idx, dist, a_idx))
+        a_idx, b_idx, dist = a_idx[order], b_idx[order], dist[order]
+        first = np.r_[True, a_idx[1:] != a_idx[:-1]]
+        target[a_idx[first]] = b_idx[first]
+        best[a_idx[first]] = dist[first]
+    return target, best
+
+
+def first_within(ax, ay, bx, by, radius, a_group=None, b_group=None):
+    """对每个a找半径内下标最小的b（对应逐个遍历列表时最先碰到的那个）
+    返回 (a下标, b下标)，只包含找到了的a，按a下标升序"""
+    a_idx, b_idx, _ = pairs_within(ax, ay, bx, by, radius, a_group, b_group)
+    if a_idx.size == 0:
+        return a_idx, b_idx
+    order = np.lexsort((b_idx, a_idx))
+    a_idx, b_idx = a_idx[order], b_idx[order]
+    first = np.r_[True, a_idx[1:] != a_idx[:-1]]
+    return a_idx[first], b_idx[first]
+
+
+def serial_claims(a_idx, b_idx, energy, bite, n_a):
+    """按a的下标依次认领：每个a取自己的候选b里下标最小、此时还没被吃光的那个，
+    每次认领使b的能量减少bite（第r口之前已被啃掉bite*r，能量仍大于0才吃得到）。
+    结果与逐个遍历a的列表完全相同，但按轮整批计算：每轮每个a提议剩下的第一个候选，
+    若某个b还是更靠前的a的后备候选（那个a可能在它的前几个候选被吃光后转来），
+    比它靠后的提议要等下一轮；其余提议按 (b, a) 排序后一次结算。
+    (a_idx, b_idx)为候选配对，energy为每个b当前的能量。返回成功认领的 (a下标, b下标)，按 (b, a) 排序"""
+    energy = np.asarray(energy, dtype=float)
+    live = energy[b_idx] > 0
+    order = np.lexsort((b_idx[live], a_idx[live]))
+    a_idx, b_idx = a_idx[live][order], b_idx[live][order]
+    bites = np.zeros(energy.size, dtype=np.int64)  # 每个b已被啃的口数
+    resolved = np.zeros(n_a, dtype=bool)
+    claimed_a, claimed_b = [], []
+    last = np.iinfo(np.intp).max
+    while a_idx.size:
+        first = np.r_[True, a_idx[1:] != a_idx[:-1]]
+        # 每个b的后备候选里最靠前的a：只有比它靠前的提议可以结算
+        blocker = np.full(energy.size, last, dtype=np.intp)
+        np.minimum.at(blocker, b_idx[~first], a_idx[~first])
+        pa, pb = a_idx[first], b_idx[first]
+        ready = pa < blocker[pb]
+        pa, pb = pa[ready], pb[ready]
+        order = np.lexsort((pa, pb))
+        pa, pb = pa[order], pb[order]
+        group_start = np.r_[0, np.flatnonzero(pb[1:] != pb[:-1]) + 1]
+        rank = np.arange(pb.size) - np.repeat(group_start, np.diff(np.r_[group_start, pb.size]))
+        ok = energy[pb] - bite * (bites[pb] + rank) > 0
+        claimed_a.append(pa[ok])
+        claimed_b.append(pb[ok])
+        np.add.at(bites, pb[ok], 1)
+        resolved[pa[ok]] = True
+        # 认领了的a和被吃光的b退出；没吃到的a下一轮提议下一个候选
+        exhausted = energy - bite * bites <= 0
+        keep = ~resolved[a_idx] & ~exhausted[b_idx]
+        a_idx, b_idx = a_idx[keep], b_idx[keep]
+    if not claimed_a:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    a_idx = np.concatenate(claimed_a)
+    b_idx = np.concatenate(claimed_b)
+    order = np.lexsort((a_idx, b_idx))
+    return a_idx[order], b_idx[order]
+
+
+def match_within(ax, ay, bx, by, radius, a_group=None, b_group=None, profiler=None):
+    """半径内的一对一匹配：按a的下标依次，每个a取半径内还没被占用的下标最小的b
+    （与逐个遍历a、各自在b的列表里找第一个的结果相同）。返回 (a下标, b下标)，按a下标升序"""
+    a_idx, b_idx, _ = pairs_within(ax, ay, bx, by, radius, a_group, b_group, profiler)
+    a_idx, b_idx = serial_claims(a_idx, b_idx, np.ones(len(bx)), 1.0, len(ax))
+    order = np.argsort(a_idx, kind="stable")
+    return a_idx[order], b_idx[order]
+
+
+def graze_within(ax, ay, bx, by, energy, bite, radius, a_group=None, b_group=None):
+    """取食结算：按a的下标依次，每个a吃半径内下标最小的、还没被吃光的b，每口减少bite
+    （对应逐个遍历时植物被吃光后从列表中移除，后面的a改吃下一株）。
+    energy为每个b当前的能量。返回成功取食的 (a下标, b下标)，按 (b, a) 排序"""
+    a_idx, b_idx, _ = pairs_within(ax, ay, bx, by, radius, a_group, b_group)
+    return serial_claims(a_idx, b_idx, energy, bite, len(ax))
@@ -0,0 +1,135 @@
+import math
+
+import numpy as np
+
+from 基因与状态 import MAX_SPEED, PERCEPTION, AGGRESSION
+from 空间索引 import nearest_within
+from 统计 import gene_matrix
+
+
+def max_step(genes, is_predator):
+    """每个个体单帧的最大位移上界：一次按速度移动（|v|不超过max_speed），
+    再加一次追逐/逃跑（max_speed×aggression）或随机移动（|v|）"""
+    speed = genes[:, MAX_SPEED] * (1.5 if is_predator else 1.0)
+    return speed * (1 + np.maximum(genes[:, AGGRESSION], 1.0))
+
+
+class LevelOfDetail:
+    """细节层次（LOD）调度：感知范围内没有任何相关个体（捕食者看猎物，被捕食者看捕食者和植物）
+    的个体进入休眠，每帧用Individual.coast做廉价的直线运动代替完整决策，
+    只在休眠结束时重新检查邻域，有个体进入范围就恢复完整精度。
+
+    误差界：
+      - 休眠帧数受最近目标距离限制：按双方单帧最大位移之和估算，休眠期间不会有个体进入感知范围
+        （休眠期间新播种在附近的植物除外，被捕食者最多晚interval帧才去吃它）；
+      - 休眠期间省略的逐帧随机转向，在醒来时一次性补上一个方差相同的转向；
+        休眠帧数按各自速率选取，使省略转向造成的位置均方根偏差不超过max_drift。
+    通过Environment.enable_lod()开启，只用于对象模型"""
+
+    TURN = 0.1  # 与_random_move每帧最大转向一致
+
+    def __init__(self, interval=8, max_drift=5.0):
+        self.interval = interval  # 最长休眠帧数（也是邻域检查的最大间隔）
+        self.max_drift = max_drift  # 允许的位置均方根偏差（像素）
+        self.species = None  # 只让这些物种类休眠（如帧预算调度只降级拥挤的物种），None为全部
+        self.asleep = {}  # 物种类 -> {个体: (醒来的帧, 休眠帧数)}
+        self.full_updates = 0  # 累计完整更新的个体·帧
+        self.coasted = 0  # 累计廉价更新的个体·帧
+        self._steps = {}  # 物种类 -> (统计时的帧, 单帧最大位移)
+        self._plants = (None, 0, np.empty(0), np.empty(0))  # 植物坐标缓存：(列表, 长度, xs, ys)
+        # 休眠k帧省略的随机转向造成的横向偏差（每帧位移1时的均方根）：
+        # 每帧转向方差TURN²/3，第i帧的转向影响之后的k-i+1帧
+        ks = np.arange(1, interval + 1)
+        self._spread = self.TURN / math.sqrt(3) * np.sqrt(ks * (ks + 1) * (2 * ks + 1) / 6)
+
+    def split(self, env, agents, groups):
+        """把本阶段要更新的agents分成 (完整更新, 廉价更新) 两个列表，各自保持原顺序。
+        groups为 [(目标个体列表, 基准半径), ...]，基准半径为None时用各自的感知半径；
+        任何一组在检查半径内有个体就不能休眠"""
+        if not agents:
+            return agents, []
+        now = env.tick
+        cls = type(agents[0])
+        if self.species is not None and cls not in self.species:
+            self.asleep.pop(cls, None)  # 被移出名单的物种全部恢复完整更新
+            self.full_updates += len(agents)
+            return agents, []
+        asleep = self.asleep.get(cls, {})
+        if now % self.interval == 0:
+            # 顺带清掉已经死亡/被移除的个体
+            asleep = {a: asleep[a] for a in agents if a in asleep}
+        self.asleep[cls] = asleep
+        due = [a for a in agents if asleep.get(a, (0, 0))[0] <= now]
+        sleeps = self._plan(env, due, groups).tolist()
+        for agent, k in zip(due, sleeps):
+            entry = asleep.pop(agent, None)
+            if entry is not None:
+                # 补上刚结束的那段休眠里省略的随机转向（k个U(-TURN, TURN)之和的方差）
+                agent.turn(env.random.uniform(-self.TURN, self.TURN) * math.sqrt(entry[1]))
+            if k:
+                asleep[agent] = (now + k, k)
+        active = [a for a in agents if a not in asleep]
+        idle = [a for a in agents if a in asleep]
+        self.full_updates += len(active)
+        self.coasted += len(idle)
+        return active, idle
+
+    def _plan(self, env, due, groups):
+        """每个待检查个体可以休眠的帧数，0表示本帧需要完整更新"""
+        n = len(due)
+        if not n:
+            return np.zeros(0, dtype=int)
+        xs = np.fromiter((a.x for a in due), dtype=float, count=n)
+        ys = np.fromiter((a.y for a in due), dtype=float, count=n)
+        speed = np.fromiter((math.hypot(a.vx, a.vy) for a in due), dtype=float, count=n)
+        genes = gene_matrix(due)
+        is_predator = due[0].is_predator
+        # 廉价更新每帧移动两次|v|，偏差不超过max_drift的最长休眠
+        sleep = np.count_nonzero(2 * speed[:, None] * self._spread[None, :] <= self.max_drift, axis=1)
+        step = max_step(genes, is_predator)
+        perception = genes[:, PERCEPTION] * (1.5 if is_predator else 1.0)
+        for targets, reach in groups:
+            if not len(targets) or not sleep.any():
+                continue
+            bx, by, target_step = self._targets(env, targets)
+            base = perception if reach is None else reach
+            closing = step + target_step
+            # 最近目标距离为d时，第j帧（从0起）双方最多靠近j×closing，
+            # 休眠k帧要求 d - (k-1)×closing 仍不小于感知半径；范围外没有目标时不受限
+            _, dist = nearest_within(xs, ys, base + (self.interval - 1) * closing, bx, by)
+            allowed = np.where(dist >= base, np.floor((dist - base) / closing) + 1, 0)
+            sleep = np.minimum(sleep, allowed).astype(int)
+        return sleep
+
+    def _targets(self, env, targets):
+        """目标的坐标和单帧最大位移。植物不动：坐标缓存起来，列表只追加时只补新的部分"""
+        if targets is env.plants:
+            cached, count, xs, ys = self._plants
+            if cached is not targets or len(targets) < count:
+                cached, count, xs, ys = targets, 0, np.empty(0), np.empty(0)
+            if len(targets) > count:
+                tail = targets[count:]
+                xs = np.concatenate([xs, np.fromiter((p.x for p in tail), dtype=float, count=len(tail))])
+                ys = np.concatenate([ys, np.fromiter((p.y for p in tail), dtype=float, count=len(tail))])
+            self._plants = (targets, len(targets), xs, ys)
+            return xs, ys, 0.0
+        n = len(targets)
+        xs = np.fromiter((t.x for t in targets), dtype=float, count=n)
+        ys = np.fromiter((t.y for t in targets), dtype=float, count=n)
+        # 物种的最大位移每interval帧按当前基因重新统计一次（突变会慢慢改变它）
+        cls = type(targets[0])
+        tick, step = self._steps.get(cls, (None, 0.0))
+        if tick is None or env.tick - tick >= self.interval:
+            step = float(max_step(gene_matrix(targets), cls.is_predator).max())
+            self._steps[cls] = (env.tick, step)
+        return xs, ys, step
+
+    def report(self):
+        """累计的个体·帧中廉价更新所占比例（实测加速比见 性能测试.py --lod both）"""
+        total = self.full_updates + self.coasted
+        return {
+            "full_updates": self.full_updates,
+            "coasted": self.coasted,
+            "sleeping": sum(len(asleep) for asleep in self.asleep.values()),
+            "coasted_fraction": self.coasted / total if total else 0.0,
+        }
@@ -0,0 +1,211 @@
+import csv
+import glob
+import os
+import queue
+import threading
+
+import numpy as np
+
+from 基因与状态 import GENE_PARAMS
+
+SPECIES = ("predators", "prey", "plants")
+COUNT_COLUMNS = ("tick",) + SPECIES
+
+
+def gene_matrix(species):
+    """把一个物种的基因整理成 (个体数, 基因数) 的矩阵，兼容对象列表和结构数组"""
+    genes = getattr(species, "genes", None)
+    if genes is not None:
+        return genes
+    # 个体的基因是array('d')，直接拼接底层字节
+    return np.frombuffer(b"".join([ind.genes for ind in species]), dtype=float).reshape(-1, len(GENE_PARAMS))
+
+
+def energy_vector(species):
+    energy = getattr(species, "energy", None)
+    if energy is not None:
+        return energy
+    return np.fromiter((ind.energy for ind in species), dtype=float, count=len(species))
+
+
+class _ChunkWriter(threading.Thread):
+    """后台写盘线程：从有界队列取出数据块写成列式文件，不阻塞模拟主循环。
+    写盘出错时线程记下异常后退出，主线程下一次交数据块（或close）时重新抛出，不会在满队列上卡死"""
+
+    def __init__(self, directory, columns, fmt):
+        super().__init__(daemon=True)
+        self.directory = directory
+        self.columns = columns
+        self.fmt = fmt
+        self.queue = queue.Queue(maxsize=4)  # 有界：写盘跟不上时主循环等待，内存不会涨
+        os.makedirs(directory, exist_ok=True)
+        # 续写已有目录（例如从存档恢复后）时接着编号，不覆盖旧数据块
+        self.chunks_written = len(glob.glob(os.path.join(directory, "chunk_*.npz")))
+        self.error = None  # 写盘线程里发生的异常
+
+    def run(self):
+        while True:
+            block = self.queue.get()
+            if block is None:
+                break
+            try:
+                self._write(block)
+            except Exception as exc:
+                self.error = exc
+                break
+            self.chunks_written += 1
+
+    def put(self, block):
+        """把数据块（或结束标记None）交给写盘线程；线程已出错退出时抛出它的异常"""
+        while True:
+            self.check()
+            try:
+                self.queue.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def _write(self, block):
+        if self.fmt == "npz":
+            path = os.path.join(self.directory, f"chunk_{self.chunks_written:06d}.npz")
+            np.savez(path, **_split_columns(self.columns, block))
+        else:
+            path = os.path.join(self.directory, "stats.csv")
+            new_file = not os.path.exists(path)
+            with open(path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.columns)
+                for row in block.tolist():
+                    writer.writerow([int(v) if name in COUNT_COLUMNS else v
+                                     for name, v in zip(self.columns, row)])
+
+
+def _split_columns(columns, block):
+    data = {}
+    for i, name in enumerate(columns):
+        data[name] = block[:, i].astype(np.int64) if name in COUNT_COLUMNS else block[:, i]
+    return data
+
+
+class PopulationStats:
+    """有界的种群统计：每帧一行写进预分配的环形缓冲区，内存大小固定。
+    可选记录各物种基因的均值/方差和能量分布；指定output_dir时，
+    每满chunk_size帧就把这一块交给后台线程写成NPZ或CSV文件。
+    stats["prey"]等按列名取出缓冲区内的历史（按时间顺序）"""
+
+    def __init__(self, capacity=100_000, track_genes=False, track_energy=False,
+                 energy_bins=np.linspace(0, 400, 17), output_dir=None, chunk_size=10_000, fmt="npz"):
+        self.capacity = capacity
+        self.track_genes = track_genes
+        self.track_energy = track_energy
+        self.energy_bins = np.asarray(energy_bins, dtype=float)
+        self.columns = list(COUNT_COLUMNS)
+        if track_genes:
+            for name in ("predators", "prey"):
+                for param in GENE_PARAMS:
+                    self.columns += [f"{name}_{param}_mean", f"{name}_{param}_var"]
+        if track_energy:
+            for name in SPECIES:
+                self.columns += [f"{name}_energy_mean", f"{name}_energy_std"]
+                self.columns += [f"{name}_energy_bin{i}" for i in range(len(self.energy_bins) - 1)]
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        self._data = np.zeros((capacity, len(self.columns)))
+        self.ticks = 0  # 累计记录的帧数
+        self.chunk_size = min(chunk_size, capacity)
+        self._writer = None
+        self._flushed = 0  # 已交给写盘线程的帧数
+        if output_dir is not None:
+            self.open_writer(output_dir, fmt)
+
+    def open_writer(self, output_dir, fmt="npz"):
+        """启动后台写盘线程，之后记录的数据每满chunk_size帧写出一块"""
+        self._writer = _ChunkWriter(output_dir, self.columns, fmt)
+        self._writer.start()
+        self._flushed = self.ticks
+
+    def __len__(self):
+        """缓冲区内保留的帧数"""
+        return min(self.ticks, self.capacity)
+
+    def __getitem__(self, name):
+        return self.history()[name]
+
+    def keys(self):
+        return list(self.columns)
+
+    def items(self):
+        return self.history().items()
+
+    def _rows(self, start, stop):
+        """取出第start到stop帧（不含）在环形缓冲区里的行，按时间顺序"""
+        idx = np.arange(start, stop) % self.capacity
+        return self._data[idx]
+
+    def history(self):
+        """缓冲区内保留的全部历史，{列名: 数组}"""
+        return _split_columns(self.columns, self._rows(self.ticks - len(self), self.ticks))
+
+    def latest(self, name):
+        if not self.ticks:
+            return None
+        return self._data[(self.ticks - 1) % self.capacity, self._index[name]]
+
+    def record(self, env):
+        """记录当前帧（Environment.update末尾调用）"""
+        row = self._data[self.ticks % self.capacity]
+        row[:] = 0
+        row[0] = self.ticks
+        for i, name in enumerate(SPECIES, 1):
+            row[i] = len(getattr(env, name))
+        if self.track_genes:
+            for name in ("predators", "prey"):
+                genes = gene_matrix(getattr(env, name))
+                if len(genes):
+                    for param, mean, var in zip(GENE_PARAMS, genes.mean(axis=0), genes.var(axis=0)):
+                        row[self._index[f"{name}_{param}_mean"]] = mean
+                        row[self._index[f"{name}_{param}_var"]] = var
+        if self.track_energy:
+            for name in SPECIES:
+                energy = energy_vector(getattr(env, name))
+                if len(energy):
+                    row[self._index[f"{name}_energy_mean"]] = energy.mean()
+                    row[self._index[f"{name}_energy_std"]] = energy.std()
+                    hist, _ = np.histogram(energy, bins=self.energy_bins)
+                    start = self._index[f"{name}_energy_bin0"]
+                    row[start:start + hist.size] = hist
+        self.ticks += 1
+        if self._writer is not None and self.ticks - self._flushed >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """把尚未写盘的帧复制一份交给后台线程"""
+        if self._writer is None or self.ticks == self._flushed:
+            return
+        self._writer.put(self._rows(self._flushed, self.ticks))  # 花式索引得到的是副本
+        self._flushed = self.ticks
+
+    def close(self):
+        """写出剩余数据并等待写盘线程结束；写盘出错时抛出该异常"""
+        if self._writer is None:
+            return
+        try:
+            self.flush()
+            self._writer.put(None)
+            self._writer.join()
+            self._writer.check()
+        finally:
+            self._writer = None
+
+
+def load_chunks(directory):
+    """读回output_dir下的NPZ数据块并按时间拼接，{列名: 数组}"""
+    paths = sorted(glob.glob(os.path.join(directory, "chunk_*.npz")))
+    parts = [np.load(path) for path in paths]
+    if not parts:
+        return {}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0].files}
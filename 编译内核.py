@@ -0,0 +1,378 @@
+"""可选的编译内核：用Numba把结构数组引擎里最热的逐个体循环编译成机器码——
+半径内最近邻/最先碰到的目标、按列表顺序的捕获匹配和取食结算、触墙反弹、岩石碰撞和随机转向。
+函数与空间索引/障碍栅格里的NumPy参考实现签名相同、结果逐位相同（内核里只用加减乘除、比较和
+math.hypot，与NumPy的舍入一致；Numba的三角函数与NumPy可能差最后一位，随机转向的角度仍用NumPy计算），
+但格子用计数排序一次建好（不做argsort和二分查找），也不需要展开成候选配对数组或多轮排序。
+
+没有安装numba时jit退化为原样返回函数，这些循环仍能以纯Python运行（很慢，而且Python的
+math.hypot与NumPy的舍入略有不同，只适合调试），ArrayEnvironment.enable_kernels()
+会给出警告并继续使用NumPy参考路径。
+编译结果缓存在磁盘上（cache=True，写在本模块旁的__pycache__里），只有第一次运行需要等编译。
+
+用法示例：
+    env = ArrayEnvironment(6000, 4000, seed=1)
+    env.enable_kernels()
+    python 性能测试.py --engines arrays --kernels both   # 与NumPy参考路径的加速比
+"""
+import math
+import time
+
+import numpy as np
+
+from 障碍栅格 import SLACK
+
+try:
+    import numba
+except ImportError:  # numba是可选依赖
+    numba = None
+
+AVAILABLE = numba is not None
+GRID_CELLS_PER_POINT = 2  # 格子数约为b的个数的这么多倍（格子不小于查询半径）
+GRID_MAX_SIDE = 4096  # 每个方向最多的格子数（所有b挤在一条线上时限制格子总数）
+
+
+def jit(func):
+    """有numba时编译（不开fastmath，保证与NumPy相同的浮点运算顺序），否则原样返回"""
+    if numba is None:
+        return func
+    return numba.njit(cache=True)(func)
+
+
+@jit
+def _clip(value, low, high):
+    # 与np.clip相同，nan原样保留（nan个体在下一阶段被清理）
+    if value < low:
+        return low
+    if value > high:
+        return high
+    return value
+
+
+@jit
+def _maybe_within(dx, dy, limit):
+    # 平方距离明显超过limit的候选不用再算hypot：余量远大于两者的舍入误差，筛选结果与hypot相同
+    return dx * dx + dy * dy <= limit * limit * (1 + 1e-9)
+
+
+@jit
+def _grid_ranges(ax, ay, a_group, bx, by, b_group, x0, y0, cell, cols, rows, groups, start, end):
+    """按格子对b做计数排序，返回排好的b下标；并对每个a填好上中下三行相邻三格的候选区间：
+    第a个点在第j行的候选b为order[start[j, a]:end[j, a]]（同组同一行的格子连续存放）"""
+    counts = np.zeros(groups * rows * cols + 1, dtype=np.int64)
+    keys = np.full(bx.size, -1, dtype=np.int64)
+    for b in range(bx.size):
+        if math.isfinite(bx[b]) and math.isfinite(by[b]):
+            c = min(int((bx[b] - x0) / cell), cols - 1)
+            r = min(int((by[b] - y0) / cell), rows - 1)
+            keys[b] = (b_group[b] * rows + r) * cols + c
+            counts[keys[b] + 1] += 1
+    cell_start = np.cumsum(counts)
+    fill = cell_start[:-1].copy()
+    order = np.empty(cell_start[-1], dtype=np.int64)
+    for b in range(bx.size):
+        if keys[b] >= 0:
+            order[fill[keys[b]]] = b
+            fill[keys[b]] += 1
+    for a in range(ax.size):
+        for j in range(3):
+            start[j, a] = 0
+            end[j, a] = 0
+        g = a_group[a]
+        if not (math.isfinite(ax[a]) and math.isfinite(ay[a])) or g < 0 or g >= groups:
+            continue
+        fc = math.floor((ax[a] - x0) / cell)
+        fr = math.floor((ay[a] - y0) / cell)
+        if fc < -1 or fc > cols or fr < -1 or fr > rows:  # 离所有b都超过一格
+            continue
+        c, r = int(fc), int(fr)
+        c0, c1 = max(c - 1, 0), min(c + 1, cols - 1)
+        if c0 > c1:
+            continue
+        for j in range(3):
+            rr = r + j - 1
+            if 0 <= rr < rows:
+                base = (g * rows + rr) * cols
+                start[j, a] = cell_start[base + c0]
+                end[j, a] = cell_start[base + c1 + 1]
+    return order
+
+
+@jit
+def _nearest_loop(ax, ay, sx, sy, radius, a_order, start, end, order, target, best):
+    for k in range(a_order.size):
+        a = a_order[k]
+        for j in range(3):
+            for s in range(start[j, k], end[j, k]):
+                dx, dy = sx[s] - ax[a], sy[s] - ay[a]
+                if not _maybe_within(dx, dy, min(radius[a], best[a])):
+                    continue
+                b = order[s]
+                d = math.hypot(dx, dy)
+                # 距离相同取下标小的b（与nearest_within的排序一致）
+                if d < radius[a] and (d < best[a] or (d == best[a] and b < target[a])):
+                    best[a] = d
+                    target[a] = b
+
+
+@jit
+def _first_loop(ax, ay, sx, sy, radius, a_order, start, end, order, target):
+    for k in range(a_order.size):
+        a = a_order[k]
+        for j in range(3):
+            for s in range(start[j, k], end[j, k]):
+                b = order[s]
+                if target[a] >= 0 and b > target[a]:
+                    continue
+                dx, dy = sx[s] - ax[a], sy[s] - ay[a]
+                if _maybe_within(dx, dy, radius[a]) and math.hypot(dx, dy) < radius[a]:
+                    target[a] = b
+
+
+@jit
+def _candidate_lists(ax, ay, sx, sy, radius, a_order, start, end, order):
+    """每个a半径内的b，按a分段、段内按b升序：a的候选为candidates[offsets[a]:offsets[a + 1]]"""
+    n = ax.size
+    counts = np.zeros(n + 1, dtype=np.int64)
+    for k in range(a_order.size):
+        a = a_order[k]
+        for j in range(3):
+            for s in range(start[j, k], end[j, k]):
+                dx, dy = sx[s] - ax[a], sy[s] - ay[a]
+                if _maybe_within(dx, dy, radius[a]) and math.hypot(dx, dy) < radius[a]:
+                    counts[a + 1] += 1
+    offsets = np.cumsum(counts)
+    candidates = np.empty(offsets[n], dtype=np.int64)
+    fill = offsets[:n].copy()
+    for k in range(a_order.size):
+        a = a_order[k]
+        for j in range(3):
+            for s in range(start[j, k], end[j, k]):
+                dx, dy = sx[s] - ax[a], sy[s] - ay[a]
+                if _maybe_within(dx, dy, radius[a]) and math.hypot(dx, dy) < radius[a]:
+                    candidates[fill[a]] = order[s]
+                    fill[a] += 1
+    for a in range(n):
+        candidates[offsets[a]:offsets[a + 1]] = np.sort(candidates[offsets[a]:offsets[a + 1]])
+    return offsets, candidates
+
+
+@jit
+def _claim_loop(offsets, candidates, energy, bite, partner):
+    # 按a的下标依次认领候选里第一个还没被吃光的b（第r口之前已被啃掉bite*r）
+    bites = np.zeros(energy.size, dtype=np.int64)
+    for a in range(offsets.size - 1):
+        for p in range(offsets[a], offsets[a + 1]):
+            b = candidates[p]
+            if energy[b] - bite * bites[b] > 0:
+                partner[a] = b
+                bites[b] += 1
+                break
+
+
+@jit
+def _bounce_loop(x, y, vx, vy, radius, width, height):
+    for i in range(x.size):
+        if x[i] - radius < 0 or x[i] + radius > width:
+            vx[i] = -vx[i]
+        if y[i] - radius < 0 or y[i] + radius > height:
+            vy[i] = -vy[i]
+        x[i] = _clip(x[i], radius, width - radius)
+        y[i] = _clip(y[i], radius, height - radius)
+
+
+@jit
+def _first_hit(x, y, radius, candidates, obstacle_x, obstacle_y, obstacle_r):
+    # candidates按岩石顺序排列，返回第一块碰到的是第几个候选，没碰到为 -1
+    for k in range(candidates.size):
+        o = candidates[k]
+        if math.hypot(obstacle_x[o] - x, obstacle_y[o] - y) < obstacle_r[o] + radius:
+            return k
+    return -1
+
+
+@jit
+def _collision_loop(xs, ys, radius, distance, owner, crowd_start, crowd_rocks, threshold, cell_size,
+                    exhaustive, obstacle_x, obstacle_y, obstacle_r, result):
+    # 返回做过的精确检测次数（岩石数）
+    rows, cols = distance.shape
+    everything = np.arange(obstacle_x.size)
+    single = np.empty(1, dtype=np.int64)
+    checks = 0
+    for i in range(xs.size):
+        x, y = xs[i], ys[i]
+        if not (math.isfinite(x) and math.isfinite(y)):
+            continue
+        if exhaustive:
+            candidates = everything
+        else:
+            col = min(max(int(math.floor(x / cell_size)), 0), cols - 1)
+            row = min(max(int(math.floor(y / cell_size)), 0), rows - 1)
+            o = owner[row, col]
+            if distance[row, col] >= threshold or o == -1:
+                continue
+            if o >= 0:
+                single[0] = o
+                candidates = single
+            else:
+                slot = -2 - o
+                candidates = crowd_rocks[crowd_start[slot]:crowd_start[slot + 1]]
+        k = _first_hit(x, y, radius, candidates, obstacle_x, obstacle_y, obstacle_r)
+        if k >= 0:
+            result[i] = candidates[k]
+            checks += k + 1
+        else:
+            checks += candidates.size
+    return checks
+
+
+@jit
+def _advance_loop(x, y, vx, vy, idx, clip, width, height):
+    for k in range(idx.size):
+        i = idx[k]
+        x[i] += vx[i]
+        y[i] += vy[i]
+        if clip:
+            x[i] = _clip(x[i], 0.0, width)
+            y[i] = _clip(y[i], 0.0, height)
+
+
+def _as_float(*arrays):
+    return [np.asarray(a, dtype=float) for a in arrays]
+
+
+def _grid(ax, ay, bx, by, radius, a_group, b_group):
+    """编译版的空间索引.cell_ranges：返回 (radius, a_order, start, end, order, sx, sy)，
+    前五项含义相同（a不排序，a_order为顺序下标），sx/sy为按order排好的b坐标（连续访问）。
+    格子边长不小于最大查询半径，按b的数量放粗，只覆盖b所在的范围"""
+    if ax.size == 0 or bx.size == 0:
+        return None
+    radius = np.ascontiguousarray(np.broadcast_to(np.asarray(radius, dtype=float), ax.shape))
+    finite = np.isfinite(bx) & np.isfinite(by)
+    if not finite.any():
+        return None
+    fx, fy = bx[finite], by[finite]
+    x0, y0 = float(fx.min()), float(fy.min())
+    width, height = float(fx.max()) - x0, float(fy.max()) - y0
+    if a_group is None:
+        a_group = np.zeros(ax.size, dtype=np.int64)
+        b_group = np.zeros(bx.size, dtype=np.int64)
+    else:
+        a_group = np.asarray(a_group, dtype=np.int64)
+        b_group = np.asarray(b_group, dtype=np.int64)
+    groups = int(b_group.max()) + 1
+    per_group = max(GRID_CELLS_PER_POINT * bx.size / groups, 1.0)
+    cell = max(float(radius.max()), math.sqrt(width * height / per_group),
+               width / GRID_MAX_SIDE, height / GRID_MAX_SIDE, 1e-9)
+    cols = int(width / cell) + 1
+    rows = int(height / cell) + 1
+    start = np.empty((3, ax.size), dtype=np.int64)
+    end = np.empty((3, ax.size), dtype=np.int64)
+    order = _grid_ranges(ax, ay, a_group, bx, by, b_group, x0, y0, cell, cols, rows, groups, start, end)
+    return radius, np.arange(ax.size), start, end, order, bx[order], by[order]
+
+
+def nearest_within(ax, ay, radius, bx, by, a_group=None, b_group=None):
+    """同空间索引.nearest_within：对每个a找半径内最近的b，返回 (b下标, 距离)，找不到为 -1 / inf"""
+    ax, ay, bx, by = _as_float(ax, ay, bx, by)
+    target = np.full(ax.size, -1, dtype=np.intp)
+    best = np.full(ax.size, np.inf)
+    cells = _grid(ax, ay, bx, by, radius, a_group, b_group)
+    if cells is not None:
+        radius, a_order, start, end, order, sx, sy = cells
+        _nearest_loop(ax, ay, sx, sy, radius, a_order, start, end, order, target, best)
+    return target, best
+
+
+def first_within(ax, ay, bx, by, radius, a_group=None, b_group=None):
+    """同空间索引.first_within：返回 (a下标, b下标)，只包含找到了的a，按a下标升序"""
+    target = _first_targets(ax, ay, bx, by, radius, a_group, b_group)
+    found = np.flatnonzero(target >= 0)
+    return found, target[found]
+
+
+def _first_targets(ax, ay, bx, by, radius, a_group, b_group):
+    ax, ay, bx, by = _as_float(ax, ay, bx, by)
+    target = np.full(ax.size, -1, dtype=np.intp)
+    cells = _grid(ax, ay, bx, by, radius, a_group, b_group)
+    if cells is not None:
+        radius, a_order, start, end, order, sx, sy = cells
+        _first_loop(ax, ay, sx, sy, radius, a_order, start, end, order, target)
+    return target
+
+
+def _claims(ax, ay, bx, by, energy, bite, radius, a_group, b_group):
+    """每个a按下标依次认领到的b（空间索引.serial_claims的逐个遍历版），没有为 -1"""
+    ax, ay, bx, by = _as_float(ax, ay, bx, by)
+    partner = np.full(ax.size, -1, dtype=np.intp)
+    cells = _grid(ax, ay, bx, by, radius, a_group, b_group)
+    if cells is not None:
+        radius, a_order, start, end, order, sx, sy = cells
+        offsets, candidates = _candidate_lists(ax, ay, sx, sy, radius, a_order, start, end, order)
+        _claim_loop(offsets, candidates, energy, float(bite), partner)
+    return partner
+
+
+def match_within(ax, ay, bx, by, radius, a_group=None, b_group=None):
+    """同空间索引.match_within：按a的下标依次取半径内还没被占用的下标最小的b，
+    返回 (a下标, b下标)，按a下标升序"""
+    partner = _claims(ax, ay, bx, by, np.ones(len(bx)), 1.0, radius, a_group, b_group)
+    found = np.flatnonzero(partner >= 0)
+    return found, partner[found]
+
+
+def graze_within(ax, ay, bx, by, energy, bite, radius, a_group=None, b_group=None):
+    """同空间索引.graze_within：按a的下标依次吃半径内下标最小的、还没被吃光的b。
+    返回成功取食的 (a下标, b下标)，按 (b, a) 排序"""
+    partner = _claims(ax, ay, bx, by, np.asarray(energy, dtype=float), bite, radius, a_group, b_group)
+    eater = np.flatnonzero(partner >= 0)
+    food = partner[eater]
+    order = np.lexsort((eater, food))  # 与参考实现相同，按 (b, a) 排序
+    return eater[order], food[order]
+
+
+def bounce_walls(x, y, vx, vy, radius, width, height):
+    """原地完成触墙反弹并把位置限制在墙内（同ArrayEnvironment._check_wall_collision）"""
+    _bounce_loop(x, y, vx, vy, float(radius), float(width), float(height))
+
+
+def first_collision_many(obstacle_map, xs, ys, radius):
+    """同ObstacleMap.first_collision_many：每个位置碰到的第一块岩石的下标，没碰到为 -1"""
+    result = np.full(len(xs), -1, dtype=np.intp)
+    if not obstacle_map.obstacles or len(xs) == 0:
+        return result
+    reach = radius + obstacle_map.half_diagonal + SLACK
+    # 距离场是float32，阈值也按float32比较（与NumPy参考路径相同）
+    checks = _collision_loop(xs, ys, float(radius), obstacle_map.distance, obstacle_map.owner,
+                             obstacle_map.crowd_start, obstacle_map.crowd_rocks,
+                             np.float32(reach), float(obstacle_map.cell_size), reach > obstacle_map.cap,
+                             obstacle_map.obstacle_x, obstacle_map.obstacle_y, obstacle_map.obstacle_r, result)
+    obstacle_map.checks += checks
+    return result
+
+
+def random_move(x, y, vx, vy, idx, turns, clip, width, height):
+    """原地做平滑随机运动：第k个个体idx[k]的方向偏转turns[k]（同ArrayEnvironment._random_move）。
+    Numba的atan2/cos/sin与NumPy的舍入不同，转向仍用NumPy整批计算，内核只做前进和限制范围"""
+    idx = np.asarray(idx, dtype=np.intp)
+    angle = np.arctan2(vy[idx], vx[idx]) + turns
+    speed = np.hypot(vx[idx], vy[idx])
+    vx[idx] = np.cos(angle) * speed
+    vy[idx] = np.sin(angle) * speed
+    _advance_loop(x, y, vx, vy, idx, bool(clip), float(width), float(height))
+
+
+def warm_up():
+    """用很小的输入把所有内核跑一遍，触发编译（或从磁盘缓存加载），返回耗时秒数"""
+    start = time.perf_counter()
+    xs = np.array([1.0, 2.0, 50.0])
+    ys = np.array([1.0, 2.5, 50.0])
+    nearest_within(xs, ys, 5.0, xs[::-1].copy(), ys[::-1].copy())
+    match_within(xs, ys, xs.copy(), ys.copy(), 5.0)
+    graze_within(xs, ys, xs.copy(), ys.copy(), np.ones(3), 0.5, 5.0)
+    vx, vy = np.ones(3), np.ones(3)
+    bounce_walls(xs.copy(), ys.copy(), vx, vy, 5, 100.0, 100.0)
+    random_move(xs.copy(), ys.copy(), vx, vy, np.arange(3), np.zeros(3), True, 100.0, 100.0)
+    from 基因与状态 import Rock
+    from 障碍栅格 import ObstacleMap
+    first_collision_many(ObstacleMap([Rock(x=20, y=20, radius=10)], 100, 100), xs, ys, 5)
+    return time.perf_counter() - start
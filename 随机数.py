@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class RandomStream:
+    """带缓冲的标量随机数流：一次向NumPy Generator批量取一块[0,1)均匀数，
+    再逐个发给调用者，避免每个个体每帧都单独调用一次随机数函数。
+    同一个种子得到的序列完全一致，可用于逐位复现"""
+
+    def __init__(self, rng, block=4096):
+        self.rng = rng
+        self.block = block
+        self._buffer = []
+        self._pos = 0
+
+    def random(self):
+        """[0, 1)均匀分布"""
+        if self._pos >= len(self._buffer):
+            self._buffer = self.rng.random(self.block).tolist()
+            self._pos = 0
+        value = self._buffer[self._pos]
+        self._pos += 1
+        return value
+
+    def uniform(self, low, high):
+        return low + (high - low) * self.random()
+
+    def randint(self, low, high):
+        """[low, high]闭区间内的整数（与random.randint一致）"""
+        return low + int((high - low + 1) * self.random())
+
+
+def make_rng(seed=None):
+    """由种子（int、SeedSequence或None）创建Generator及其标量流"""
+    rng = np.random.default_rng(seed)
+    return rng, RandomStream(rng)
+
+
+def spawn_seeds(seed, n):
+    """把一个种子拆成n个互相独立的子种子（用于多进程各自的随机流）"""
+    return np.random.SeedSequence(seed).spawn(n)
+
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _splitmix64(z):
+    """SplitMix64的输出混合函数（uint64数组，溢出按2^64回绕）"""
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+class WorldStreams:
+    """K个世界各自独立的随机流，供集合引擎批量抽样：第k个世界的第n个数是SplitMix64(种子k, n)。
+    一次抽样给出每个样本所属的世界，样本按出现顺序依次消耗各自世界的计数器，
+    所以每个世界的结果只取决于它自己的种子和抽样次序，与同批里有多少别的世界无关"""
+
+    def __init__(self, seeds):
+        sequences = [seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+                     for seed in seeds]
+        self.keys = np.array([seq.generate_state(1, np.uint64)[0] for seq in sequences], dtype=np.uint64)
+        self.counters = np.zeros(len(self.keys), dtype=np.uint64)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def random(self, world):
+        """每个样本一个[0, 1)均匀数，world为各样本所属的世界编号"""
+        world = np.asarray(world, dtype=np.intp)
+        if world.size == 0:
+            return np.empty(world.shape)
+        flat = world.ravel()
+        # 每个样本在本世界的本次抽样里排第几
+        order = np.argsort(flat, kind="stable")
+        counts = np.bincount(flat, minlength=len(self.keys))
+        rank = np.empty(flat.size, dtype=np.uint64)
+        rank[order] = np.arange(flat.size, dtype=np.uint64) - np.repeat(
+            (np.cumsum(counts) - counts).astype(np.uint64), counts)
+        with np.errstate(over="ignore"):
+            state = self.keys[flat] + (self.counters[flat] + rank + np.uint64(1)) * _GOLDEN
+            bits = _splitmix64(state)
+        self.counters += counts.astype(np.uint64)
+        return ((bits >> np.uint64(11)) * (1.0 / (1 << 53))).reshape(world.shape)
+
+    def uniform(self, low, high, world):
+        return low + (high - low) * self.random(world)
+
+    def integers(self, low, high, world):
+        """[low, high)内的整数"""
+        return low + np.floor((high - low) * self.random(world)).astype(np.int64)
+
+
+# 不在任何Environment里创建个体时使用的默认随机流
+default_stream = make_rng()[1]
@@ -0,0 +1,189 @@
+import math
+
+import numpy as np
+
+SLACK = 1e-3  # 距离场是float32，查表排除时多留的余量（远大于舍入误差），保证不漏掉碰撞
+
+
+class ObstacleMap:
+    """障碍物栅格：把所有岩石一次性栅格化成距离场（每格中心到最近岩石表面的距离），
+    并为每格记下表面距离在cap以内的全部岩石（按列表顺序），碰撞检测变成查表加少量精确检测，
+    结果与按列表顺序逐块检测相同；再按植物的避让距离和边界缓冲
+    预先算出可播种的空闲格子，播种时直接从附近的空闲格子里抽样，不再盲目重试。
+
+    owner记录每格的候选岩石：-1为没有，>=0为唯一的那块，<=-2时候选为
+    crowd_rocks[crowd_start[s]:crowd_start[s + 1]]（s = -2 - owner，岩石互相重叠或挨得很近的格子）"""
+
+    def __init__(self, obstacles, width, height, clearance=20, border=10, cell_size=None):
+        self.width = width
+        self.height = height
+        self.clearance = clearance
+        self.border = border
+        if cell_size is None:
+            # 普通窗口大小用1像素格子；超大世界自动放粗，格子数控制在约400万以内
+            cell_size = max(1.0, math.sqrt(width * height / 4_000_000))
+        self.cell_size = cell_size
+        self.half_diagonal = cell_size * math.sqrt(2) / 2  # 格子内任一点到格子中心的最大距离
+        self.obstacle_x = np.array([obs.x for obs in obstacles], dtype=float)
+        self.obstacle_y = np.array([obs.y for obs in obstacles], dtype=float)
+        self.obstacle_r = np.array([obs.radius for obs in obstacles], dtype=float)
+        self.obstacles = list(obstacles)
+        self.checks = 0  # 累计做过的精确检测次数（岩石数），性能探针按阶段取差值
+
+        self.cols = int(math.ceil(width / cell_size))
+        self.rows = int(math.ceil(height / cell_size))
+        # 距离场只需要精确到“会不会碰到”的范围，更远的统一记为cap；
+        # 半径超过cap - half_diagonal的碰撞检测不查表，直接逐块检测
+        cap = clearance + 16 + self.half_diagonal
+        self.cap = cap
+        self.distance = np.full((self.rows, self.cols), cap, dtype=np.float32)
+        self.owner = np.full((self.rows, self.cols), -1, dtype=np.int32)
+        near_cells, near_rocks = [], []
+        for i, (ox, oy, r) in enumerate(zip(self.obstacle_x, self.obstacle_y, self.obstacle_r)):
+            cells = self._rasterize(ox, oy, r, cap)
+            near_cells.append(cells)
+            near_rocks.append(np.full(cells.size, i, dtype=np.intp))
+        self._index_candidates(near_cells, near_rocks)
+
+        # 可播种的格子：整格都满足与岩石表面距离 >= clearance，且在边界缓冲以内
+        centers_x = (np.arange(self.cols) + 0.5) * cell_size
+        centers_y = (np.arange(self.rows) + 0.5) * cell_size
+        half = cell_size / 2
+        inside_x = (centers_x - half >= border) & (centers_x + half <= width - border)
+        inside_y = (centers_y - half >= border) & (centers_y + half <= height - border)
+        self.free = ((self.distance >= clearance + self.half_diagonal)
+                     & inside_y[:, None] & inside_x[None, :])
+
+    def _rasterize(self, ox, oy, r, cap):
+        """只在岩石周围 r + cap 的窗口内更新距离场，返回表面距离小于cap的格子（展平下标）"""
+        size = self.cell_size
+        c0 = max(int((ox - r - cap) // size), 0)
+        c1 = min(int((ox + r + cap) // size) + 1, self.cols)
+        r0 = max(int((oy - r - cap) // size), 0)
+        r1 = min(int((oy + r + cap) // size) + 1, self.rows)
+        if c0 >= c1 or r0 >= r1:
+            return np.empty(0, dtype=np.int64)
+        cx = (np.arange(c0, c1) + 0.5) * size
+        cy = (np.arange(r0, r1) + 0.5) * size
+        exact = np.hypot(cx[None, :] - ox, cy[:, None] - oy) - r
+        dist = exact.astype(np.float32)
+        window = self.distance[r0:r1, c0:c1]
+        np.minimum(window, dist, out=window)
+        rows, cols = np.nonzero(exact < cap)
+        return (rows + r0) * self.cols + (cols + c0)
+
+    def _index_candidates(self, near_cells, near_rocks):
+        """把(格子, 岩石)对整理成owner和拥挤格子的候选列表（每格内按岩石的列表顺序）"""
+        self.crowd_start = np.zeros(1, dtype=np.int64)
+        self.crowd_rocks = np.empty(0, dtype=np.intp)
+        if not near_cells:
+            return
+        cells = np.concatenate(near_cells)
+        rocks = np.concatenate(near_rocks)
+        order = np.argsort(cells, kind="stable")  # 稳定排序：同一格内保持岩石顺序
+        cells, rocks = cells[order], rocks[order]
+        unique, first, counts = np.unique(cells, return_index=True, return_counts=True)
+        single = counts == 1
+        self.owner.flat[unique[single]] = rocks[first[single]]
+        crowded = ~single
+        self.owner.flat[unique[crowded]] = -2 - np.arange(np.count_nonzero(crowded), dtype=np.int32)
+        self.crowd_rocks = rocks[np.repeat(crowded, counts)]
+        self.crowd_start = np.concatenate(([0], np.cumsum(counts[crowded])))
+
+    def _candidates(self, o):
+        """owner值o对应的候选岩石下标（按列表顺序）"""
+        if o >= 0:
+            return (o,)
+        slot = -2 - o
+        return self.crowd_rocks[self.crowd_start[slot]:self.crowd_start[slot + 1]].tolist()
+
+    def matches(self, obstacles, width, height):
+        """障碍物列表或世界尺寸是否与栅格化时一致"""
+        return (width == self.width and height == self.height
+                and len(obstacles) == len(self.obstacles)
+                and all(a is b for a, b in zip(obstacles, self.obstacles)))
+
+    def _cell(self, x, y):
+        col = min(max(int(x // self.cell_size), 0), self.cols - 1)
+        row = min(max(int(y // self.cell_size), 0), self.rows - 1)
+        return row, col
+
+    def first_collision(self, x, y, radius):
+        """半径为radius的圆在(x, y)处碰到的第一块岩石（按列表顺序），没碰到返回None。
+        查距离场排除远处的点，近处只对这一格的候选岩石做精确检测"""
+        if not self.obstacles or x != x or y != y:  # nan位置视为不碰撞（与逐个比较的结果一致）
+            return None
+        reach = radius + self.half_diagonal + SLACK
+        if reach > self.cap:
+            candidates = range(len(self.obstacles))  # 超出候选列表的范围，逐块检测
+        else:
+            row, col = self._cell(x, y)
+            if self.distance[row, col] >= reach or self.owner[row, col] == -1:
+                return None
+            candidates = self._candidates(int(self.owner[row, col]))
+        for n, i in enumerate(candidates, 1):
+            obs = self.obstacles[i]
+            if math.hypot(obs.x - x, obs.y - y) < obs.radius + radius:
+                self.checks += n
+                return obs
+        self.checks += len(candidates)
+        return None
+
+    def first_collision_many(self, xs, ys, radius):
+        """向量化版本：返回每个位置碰到的第一块岩石的下标，没碰到为 -1"""
+        result = np.full(len(xs), -1, dtype=np.intp)
+        if not self.obstacles or len(xs) == 0:
+            return result
+        reach = radius + self.half_diagonal + SLACK
+        if reach > self.cap:
+            # 逐块检测（倒序覆盖，留下列表里最靠前的那块；nan的距离比较为False）
+            for i in range(len(self.obstacles) - 1, -1, -1):
+                hit = np.hypot(self.obstacle_x[i] - xs, self.obstacle_y[i] - ys) < self.obstacle_r[i] + radius
+                result[hit] = i
+            self.checks += len(xs) * len(self.obstacles)
+            return result
+        finite = np.isfinite(xs) & np.isfinite(ys)
+        cols = np.clip(np.floor(np.where(finite, xs, 0) / self.cell_size).astype(np.int64), 0, self.cols - 1)
+        rows = np.clip(np.floor(np.where(finite, ys, 0) / self.cell_size).astype(np.int64), 0, self.rows - 1)
+        owner = self.owner[rows, cols]
+        near = finite & (self.distance[rows, cols] < reach)
+        single = np.flatnonzero(near & (owner >= 0))
+        self.checks += single.size
+        if single.size:
+            o = owner[single]
+            dist = np.hypot(self.obstacle_x[o] - xs[single], self.obstacle_y[o] - ys[single])
+            hit = dist < self.obstacle_r[o] + radius
+            result[single[hit]] = o[hit]
+        crowded = np.flatnonzero(near & (owner <= -2))
+        if crowded.size:
+            # 展开拥挤格子的候选（每个点的候选按岩石顺序连续排列），取每个点第一块碰到的
+            slots = -2 - owner[crowded]
+            starts = self.crowd_start[slots]
+            counts = self.crowd_start[slots + 1] - starts
+            points = np.repeat(crowded, counts)
+            offsets = np.arange(points.size) - np.repeat(np.cumsum(counts) - counts, counts)
+            o = self.crowd_rocks[np.repeat(starts, counts) + offsets]
+            self.checks += o.size
+            dist = np.hypot(self.obstacle_x[o] - xs[points], self.obstacle_y[o] - ys[points])
+            hit = np.flatnonzero(dist < self.obstacle_r[o] + radius)
+            hit_points, first = np.unique(points[hit], return_index=True)
+            result[hit_points] = o[hit[first]]
+        return result
+
+    def sample_free_near(self, x, y, half_width, rng):
+        """在以(x, y)为中心、边长2*half_width的正方形内的空闲格子中均匀抽一个点，
+        没有空闲格子时返回None。rng为RandomStream"""
+        size = self.cell_size
+        c0 = max(int((x - half_width) // size), 0)
+        c1 = min(int((x + half_width) // size) + 1, self.cols)
+        r0 = max(int((y - half_width) // size), 0)
+        r1 = min(int((y + half_width) // size) + 1, self.rows)
+        if c0 >= c1 or r0 >= r1:
+            return None
+        candidates = np.flatnonzero(self.free[r0:r1, c0:c1])
+        if candidates.size == 0:
+            return None
+        k = int(candidates[int(rng.random() * candidates.size)])
+        row, col = divmod(k, c1 - c0)
+        return ((c0 + col + rng.random()) * size,
+                (r0 + row + rng.random()) * size)
@@ -0,0 +1,300 @@
+"""集合引擎：把K个同样大小的小世界放进同一组NumPy数组（每个个体多一列世界编号），
+一次批量update推进全部世界。几十个个体的小世界单独运行时，时间几乎都花在Python调用
+和进程启动上；合在一起后每个阶段对所有世界只做一次向量化计算。
+
+各世界之间互不影响：
+  - 空间查询按世界编号分组（空间索引里的a_group/b_group），不会跨世界配对；
+  - 每个世界有自己的障碍物（rock_x/rock_y/rock_r，形状为 (世界数, 每个世界的岩石数)）；
+  - 随机数来自随机数.WorldStreams，每个世界一条独立的流，
+    所以第k个世界的结果只取决于它自己的种子，与同批里有多少别的世界无关；
+  - stats为EnsembleStats，按世界分别记录每帧数量和灭绝帧。
+生态规则与结构数组引擎（ArrayEnvironment）相同；植物播种改为在母株附近拒绝采样空闲点
+（与障碍物栅格的空闲格子抽样同分布），随机流不同，所以与同种子的ArrayEnvironment统计等价而非逐位一致。
+
+用法示例：
+    ens = EnsembleEnvironment(1000, width=400, height=300, seed=0)
+    ens.add_individuals(n_predators=5, n_prey=25, n_plants=35, n_obstacles=3)
+    for _ in range(2000):
+        ens.update()
+    ens.stats["prey"]          # (帧数, 世界数)
+    ens.stats.world(7)         # 第7个世界的历史，与PopulationStats.history()相同的字典
+"""
+import numpy as np
+
+from 基因与状态 import ENERGY_PARAMS, GENE_PARAMS, GENE_RANGES, Plant
+from 数组引擎 import ArrayEnvironment, SpeciesArrays
+from 随机数 import WorldStreams, spawn_seeds
+from 统计 import SPECIES
+
+SEED_RANGE = 50  # 植物播种点离母株的最大距离（与Plant.update一致）
+SEED_ATTEMPTS = 8  # 每株植物每帧最多尝试的播种点数，都落在岩石附近时本帧不播种
+
+
+class EnsembleSpecies(SpeciesArrays):
+    """带世界编号的物种数组，新个体的初速度取自各自世界的随机流streams"""
+    columns = SpeciesArrays.columns + ("world",)
+
+    def __init__(self, streams, radius=5, factor=1.0, energy_key="initial_energy"):
+        super().__init__(radius, factor, energy_key)
+        self.streams = streams
+        self.world = np.empty(0, dtype=np.int64)
+
+    def add(self, x, y, genes, rng=None, parents=None, world=None):
+        """world为新个体所属的世界，繁殖时省略（后代随父代）。
+        rng只为与SpeciesArrays.add的调用方式兼容，不使用"""
+        n = len(x)
+        if n == 0:
+            return
+        world = self.world[parents] if world is None else np.asarray(world, dtype=np.int64)
+        half = genes[:, 0] * self.factor / 2
+        self.x = np.concatenate([self.x, x])
+        self.y = np.concatenate([self.y, y])
+        self.vx = np.concatenate([self.vx, self.streams.uniform(-half, half, world)])
+        self.vy = np.concatenate([self.vy, self.streams.uniform(-half, half, world)])
+        self.energy = np.concatenate([self.energy, np.full(n, float(ENERGY_PARAMS[self.energy_key]))])
+        self.age = np.concatenate([self.age, np.zeros(n, dtype=np.int64)])
+        self.genes = np.concatenate([self.genes, genes])
+        self.world = np.concatenate([self.world, world])
+
+    def counts(self, n_worlds):
+        """每个世界的个体数"""
+        return np.bincount(self.world, minlength=n_worlds)
+
+
+class EnsembleStats:
+    """按世界分别记录的种群统计：每帧一行 (世界数, 物种数) 写进固定大小的环形缓冲区；
+    extinction_tick记录每个世界捕食者或被捕食者第一次灭绝时已运行的帧数（-1为尚未灭绝）"""
+
+    def __init__(self, n_worlds, capacity=10_000):
+        self.n_worlds = n_worlds
+        self.capacity = capacity
+        self._data = np.zeros((capacity, n_worlds, len(SPECIES)), dtype=np.int64)
+        self._ticks = np.zeros(capacity, dtype=np.int64)
+        self.ticks = 0  # 累计记录的帧数
+        self.extinction_tick = np.full(n_worlds, -1, dtype=np.int64)
+
+    def __len__(self):
+        """缓冲区内保留的帧数"""
+        return min(self.ticks, self.capacity)
+
+    def record(self, env):
+        """记录当前帧（Environment.update末尾调用）"""
+        row = self.ticks % self.capacity
+        counts = self._data[row]
+        for i, name in enumerate(SPECIES):
+            counts[:, i] = getattr(env, name).counts(self.n_worlds)
+        self._ticks[row] = self.ticks
+        extinct = (counts[:, 0] == 0) | (counts[:, 1] == 0)
+        self.extinction_tick[extinct & (self.extinction_tick < 0)] = env.tick + 1
+        self.ticks += 1
+
+    def _rows(self):
+        idx = np.arange(self.ticks - len(self), self.ticks) % self.capacity
+        return self._ticks[idx], self._data[idx]
+
+    def __getitem__(self, name):
+        """"tick"为 (帧数,)，物种名为 (帧数, 世界数)，按时间顺序"""
+        ticks, data = self._rows()
+        if name == "tick":
+            return ticks
+        return data[:, :, SPECIES.index(name)]
+
+    def keys(self):
+        return ["tick"] + list(SPECIES)
+
+    def latest(self, name):
+        """最近一帧各世界的数量"""
+        if not self.ticks:
+            return None
+        return self._data[(self.ticks - 1) % self.capacity, :, SPECIES.index(name)]
+
+    def world(self, k):
+        """第k个世界缓冲区内的历史，{列名: 数组}（与PopulationStats.history()的计数列相同）"""
+        ticks, data = self._rows()
+        history = {"tick": ticks}
+        for i, name in enumerate(SPECIES):
+            history[name] = data[:, k, i]
+        return history
+
+
+class EnsembleEnvironment(ArrayEnvironment):
+    """K个互相独立的小世界组成的集合，接口与ArrayEnvironment相同（update、stats、
+    predators/prey/plants），物种数组里多一列world。seeds给出时为每个世界的种子
+    （int或SeedSequence，长度须为n_worlds），否则由seed派生"""
+
+    def __init__(self, n_worlds, width=1100, height=600, seed=None, seeds=None):
+        if seeds is None:
+            seeds = spawn_seeds(seed, n_worlds)
+        elif len(seeds) != n_worlds:
+            raise ValueError(f"seeds的长度({len(seeds)})与世界数({n_worlds})不一致")
+        self.n_worlds = n_worlds  # _new_stats需要，先于父类初始化设置
+        super().__init__(width, height, seed)
+        self.streams = WorldStreams(seeds)
+        self.predators = EnsembleSpecies(self.streams, radius=11, factor=1.5)
+        self.prey = EnsembleSpecies(self.streams, radius=5)
+        self.plants = EnsembleSpecies(self.streams, radius=5, energy_key="plant_initial_energy")
+        # 每个世界的岩石：(世界数, 岩石数)
+        self.rock_x = np.empty((n_worlds, 0))
+        self.rock_y = np.empty((n_worlds, 0))
+        self.rock_r = np.empty((n_worlds, 0))
+
+    def add_individuals(self, n_predators=20, n_prey=50, n_plants=0, n_obstacles=10):
+        """每个世界放入同样数量的个体和岩石（分布与ArrayEnvironment.add_individuals一致）"""
+        streams = self.streams
+        worlds = np.arange(self.n_worlds)
+        self.predators = EnsembleSpecies(self.streams, radius=11, factor=1.5)
+        self.prey = EnsembleSpecies(self.streams, radius=5)
+        self.plants = EnsembleSpecies(self.streams, radius=5, energy_key="plant_initial_energy")
+        for species, n, margin in ((self.predators, n_predators, 0), (self.prey, n_prey, 0),
+                                   (self.plants, n_plants, 10)):
+            world = np.repeat(worlds, n)
+            species.add(streams.uniform(margin, self.width - margin, world),
+                        streams.uniform(margin, self.height - margin, world),
+                        self._random_genes_for(world), world=world)
+        shape = (self.n_worlds, n_obstacles)
+        world = np.repeat(worlds, n_obstacles).reshape(shape)
+        self.rock_x = streams.uniform(20, self.width - 20, world)
+        self.rock_y = streams.uniform(20, self.height - 20, world)
+        self.rock_r = streams.integers(10, 51, world).astype(float)
+
+    def _random_genes_for(self, world):
+        """按GENE_RANGES给每个新个体抽一行基因，形状 (个体数, 基因数)"""
+        low = np.array([GENE_RANGES[param][0] for param in GENE_PARAMS], dtype=float)
+        high = np.array([GENE_RANGES[param][1] for param in GENE_PARAMS], dtype=float)
+        return self.streams.uniform(low, high, np.repeat(world, len(GENE_PARAMS)).reshape(-1, len(GENE_PARAMS)))
+
+    def _new_stats(self):
+        return EnsembleStats(self.n_worlds)
+
+    def rebuild_obstacle_map(self):
+        """岩石按世界存在rock_x/rock_y/rock_r里，没有单个世界的障碍物栅格"""
+        self.obstacle_map = None
+
+    def _ensure_obstacle_map(self):
+        pass
+
+    # ---- 不能按世界工作的功能 ----
+
+    def enable_autosave(self, path, every=1000):
+        """存档格式只描述单个世界"""
+        raise NotImplementedError("集合引擎不支持存档（enable_autosave）：存档格式只描述单个世界")
+
+    def enable_governor(self, budget_ms=33.0, **options):
+        """承载量剔除会把K个世界当成一个种群，批量实验也不需要交互帧率"""
+        raise NotImplementedError("集合引擎不支持帧预算调度（enable_governor）：承载量剔除不区分世界")
+
+    def enable_recording(self, directory, frame_every=10):
+        """事件日志和轨迹没有世界编号，K个世界的个体会混在一起"""
+        raise NotImplementedError("集合引擎不支持事件记录（enable_recording）：事件没有世界编号")
+
+    # ---- 按世界分流的随机数、障碍物和空间查询 ----
+
+    def _uniform(self, sp, idx, low, high):
+        return self.streams.uniform(low, high, sp.world[idx])
+
+    def _mutate_rows(self, sp, idx):
+        """与Environment._mutate相同：每个基因5%概率波动±20%，随机数取自各自世界的流"""
+        genes = sp.genes[idx]
+        world = np.repeat(sp.world[idx], genes.shape[1]).reshape(genes.shape)
+        mask = self.streams.random(world) < 0.05
+        factor = np.where(mask, self.streams.uniform(0.8, 1.2, world), 1.0)
+        return genes * factor
+
+    def _groups(self, a, b, a_idx=None):
+        return {"a_group": a.world if a_idx is None else a.world[a_idx], "b_group": b.world}
+
+    def _collide(self, sp, next_x, next_y):
+        """与障碍物栅格相同的判定：碰到的岩石里取本世界列表中最靠前的一块"""
+        n = len(next_x)
+        if n == 0 or self.rock_r.shape[1] == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0), np.empty(0)
+        rock_x = self.rock_x[sp.world]
+        rock_y = self.rock_y[sp.world]
+        touching = np.hypot(rock_x - next_x[:, None], rock_y - next_y[:, None]) < self.rock_r[sp.world] + sp.radius
+        if self.profiler is not None:
+            self.profiler.count("collision_checks", touching.size)  # 每个个体检测本世界的每块岩石
+        hit = np.flatnonzero(touching.any(axis=1))  # nan位置不碰撞
+        o = np.argmax(touching[hit], axis=1)
+        return hit, rock_x[hit, o], rock_y[hit, o]
+
+    def _seed_spots(self, plants, parents):
+        """在母株周围边长2×SEED_RANGE的正方形（不出边界缓冲）内拒绝采样离岩石足够远的点。
+        返回 (成功播种的母株下标, xs, ys)，按母株下标排序"""
+        border = Plant.border_buffer
+        found = []
+        pending = parents
+        for _ in range(SEED_ATTEMPTS):
+            if pending.size == 0:
+                break
+            world = plants.world[pending]
+            px, py = plants.x[pending], plants.y[pending]
+            x = self.streams.uniform(np.maximum(px - SEED_RANGE, border),
+                                     np.minimum(px + SEED_RANGE, self.width - border), world)
+            y = self.streams.uniform(np.maximum(py - SEED_RANGE, border),
+                                     np.minimum(py + SEED_RANGE, self.height - border), world)
+            gap = np.hypot(self.rock_x[world] - x[:, None], self.rock_y[world] - y[:, None]) - self.rock_r[world]
+            ok = (gap >= Plant.min_obstacle_distance).all(axis=1)
+            found.append((pending[ok], x[ok], y[ok]))
+            pending = pending[~ok]
+        if not found:
+            return parents[:0], np.empty(0), np.empty(0)
+        seeds, xs, ys = (np.concatenate(column) for column in zip(*found))
+        order = np.argsort(seeds, kind="stable")
+        return seeds[order], xs[order], ys[order]
+
+    def _update_plants(self):
+        """光合作用增长能量，达到阈值的植物在附近无障碍处播种"""
+        plants = self.plants
+        self._drop_dead(plants)
+        if self.profiler is not None:
+            self.profiler.count("plants_processed", len(plants))
+        plants.energy = np.minimum(plants.energy + ENERGY_PARAMS["plant_growth"], ENERGY_PARAMS["plant_max_energy"])
+        parents = np.flatnonzero(plants.energy >= ENERGY_PARAMS["plant_reproduce_energy"])
+        if parents.size == 0:
+            return
+        plants.energy[parents] /= 2
+        seeds, xs, ys = self._seed_spots(plants, parents)
+        if seeds.size:
+            plants.add(xs, ys, self._mutate_rows(plants, seeds), parents=seeds)
+            self._born(plants, seeds)
+
+    # ---- 按世界汇总 ----
+
+    def extinct(self):
+        """每个世界的捕食者或被捕食者是否已灭绝"""
+        return (self.predators.counts(self.n_worlds) == 0) | (self.prey.counts(self.n_worlds) == 0)
+
+    def retire(self, worlds):
+        """移除布尔掩码worlds选中的世界里的所有个体（例如灭绝后不再推进）"""
+        worlds = np.asarray(worlds, dtype=bool)
+        for name in SPECIES:
+            species = getattr(self, name)
+            self._keep(species, ~worlds[species.world])
+
+    def summaries(self, worlds=None):
+        """各世界的摘要（与批量运行.summarize相同的字段），worlds为世界编号列表，默认全部。
+        已灭绝的世界ticks和extinction_tick取灭绝时已运行的帧数"""
+        worlds = range(self.n_worlds) if worlds is None else worlds
+        counts = {name: getattr(self, name).counts(self.n_worlds) for name in SPECIES}
+        means = {}
+        for name in ("predators", "prey"):
+            species = getattr(self, name)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means[name] = [np.bincount(species.world, weights=species.genes[:, j], minlength=self.n_worlds)
+                               / counts[name] for j in range(len(GENE_PARAMS))]
+        extinction = self.stats.extinction_tick
+        result = []
+        for k in worlds:
+            ended = int(extinction[k]) if extinction[k] >= 0 else None
+            summary = {
+                "ticks": self.tick if ended is None else ended,
+                "extinction_tick": ended,
+                "predators": int(counts["predators"][k]),
+                "prey": int(counts["prey"][k]),
+                "plants": int(counts["plants"][k]),
+            }
+            for name in ("predators", "prey"):
+                for param, column in zip(GENE_PARAMS, means[name]):
+                    summary[f"{name}_{param}"] = float(column[k])
+            result.append(summary)
+        return result